@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Shared Bedrock gateway: pooled clients, multi-region routing, throttling
+retries and circuit breaking
+"""
+
+import os
+import json
+import time
+import random
+import threading
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Callable, List, Tuple, Union
+
+from bedrock_prompts import encode_request_body, usage_stats
+from deadline import RequestDeadline, DeadlineExceededError, deadline_stats
+from frame import Frame
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+
+# Error codes worth retrying; everything else (validation, access) fails immediately
+RETRYABLE_ERROR_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ServiceUnavailable',
+    'InternalServerException',
+    'ModelNotReadyException',
+    'ModelTimeoutException',
+}
+# Read timeouts are bucketed so each endpoint keeps a handful of clients
+# instead of one per distinct remaining budget
+READ_TIMEOUT_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 30.0)
+MIN_CALL_TIMEOUT = READ_TIMEOUT_BUCKETS[0]
+
+THROTTLING_ERROR_CODES = {'ThrottlingException', 'TooManyRequestsException'}
+RETRYABLE_EXCEPTION_NAMES = {
+    'ReadTimeoutError',
+    'ConnectTimeoutError',
+    'EndpointConnectionError',
+    'ConnectionClosedError',
+}
+
+
+class BedrockUnavailableError(Exception):
+    """Raised when Bedrock cannot serve a request and no fallback is available"""
+
+
+class CircuitOpenError(BedrockUnavailableError):
+    """Raised when the circuit breaker rejects a call"""
+
+
+@dataclass
+class ModelReply:
+    """Text returned by the model, or a last-known result while degraded"""
+    text: str
+    degraded: bool = False
+    latency: float = 0.0
+
+
+def get_error_code(error: Exception) -> Optional[str]:
+    """Extract the AWS error code from a botocore ClientError"""
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Check whether an invocation error is transient"""
+    return (
+        get_error_code(error) in RETRYABLE_ERROR_CODES
+        or type(error).__name__ in RETRYABLE_EXCEPTION_NAMES
+    )
+
+
+def get_timeout_bucket(timeout: float) -> float:
+    """Largest read timeout bucket that fits within `timeout`"""
+    fitting = [bucket for bucket in READ_TIMEOUT_BUCKETS if bucket <= timeout]
+    return fitting[-1] if fitting else READ_TIMEOUT_BUCKETS[0]
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker that fails fast while Bedrock is unhealthy"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected_calls = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Check whether a call may proceed, admitting one probe after the timeout"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+
+            self.rejected_calls += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+                self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'rejected_calls': self.rejected_calls
+            }
+
+
+def parse_endpoint_config(config: str) -> List[Tuple[str, Optional[str]]]:
+    """
+    Parse a comma-separated endpoint list.
+
+    Entries are either a region ("us-west-2") or a region with an explicit
+    endpoint URL ("us-west-2=https://bedrock-runtime.us-west-2.amazonaws.com").
+    """
+    endpoints = []
+    for entry in config.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        region, _, endpoint_url = entry.partition('=')
+        endpoints.append((region.strip(), endpoint_url.strip() or None))
+    return endpoints
+
+
+class Endpoint:
+    """A Bedrock runtime endpoint with its own client, breaker and health scores"""
+
+    def __init__(self, region: str, endpoint_url: Optional[str] = None, client: Any = None,
+                 breaker: Optional[CircuitBreaker] = None, ewma_alpha: float = 0.2):
+        self.region = region
+        self.endpoint_url = endpoint_url
+        self.name = endpoint_url or region
+        self.client = client
+        self.timeout_clients: Dict[float, Any] = {}
+        self.breaker = breaker or CircuitBreaker()
+        self.ewma_alpha = ewma_alpha
+        self.ewma_latency = 0.0
+        self.error_rate = 0.0
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, failed: bool) -> None:
+        """Fold one call into the latency and error-rate EWMAs"""
+        with self._lock:
+            self.calls += 1
+            if failed:
+                self.failures += 1
+
+            if self.calls == 1:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency += self.ewma_alpha * (latency - self.ewma_latency)
+            self.error_rate += self.ewma_alpha * ((1.0 if failed else 0.0) - self.error_rate)
+
+    def score(self) -> float:
+        """Routing score, lower is better; unmeasured endpoints sort first"""
+        if self.breaker.state == CircuitBreaker.OPEN:
+            return float('inf')
+        return self.ewma_latency / max(0.05, 1.0 - self.error_rate)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'region': self.region,
+                'endpoint_url': self.endpoint_url,
+                'ewma_latency_ms': round(self.ewma_latency * 1000, 1),
+                'error_rate': round(self.error_rate, 3),
+                'calls': self.calls,
+                'failures': self.failures,
+                'circuit_breaker': self.breaker.get_stats()
+            }
+
+
+class BedrockGateway:
+    """Single entry point for Bedrock model calls shared by all handlers"""
+
+    def __init__(self, region: Optional[str] = None, model_id: Optional[str] = None,
+                 client: Any = None, max_attempts: int = 3, base_backoff: float = 0.2,
+                 max_backoff: float = 2.0, connect_timeout: float = 2.0,
+                 read_timeout: Optional[float] = None, max_pool_connections: int = 10,
+                 breaker: Optional[CircuitBreaker] = None,
+                 endpoints: Optional[List[Endpoint]] = None, probe_rate: float = 0.05):
+        self.model_id = model_id or os.environ.get('BEDROCK_MODEL_ID', DEFAULT_MODEL_ID)
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout or float(os.environ.get('BEDROCK_READ_TIMEOUT', '20'))
+        self.max_pool_connections = max_pool_connections
+        self.probe_rate = probe_rate
+
+        if endpoints is None:
+            region = region or os.environ.get('BEDROCK_REGION', 'us-east-1')
+            config = os.environ.get('BEDROCK_ENDPOINTS')
+            if config and client is None:
+                endpoints = [Endpoint(r, url) for r, url in parse_endpoint_config(config)]
+            else:
+                endpoints = [Endpoint(region, client=client, breaker=breaker)]
+        self.endpoints = endpoints
+        self.region = endpoints[0].region
+
+        self._client_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._last_known: 'OrderedDict[str, str]' = OrderedDict()
+        self.max_last_known = 256
+
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.throttles = 0
+        self.failovers = 0
+        self.probes = 0
+        self.fallbacks_served = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        """Circuit breaker of the primary endpoint"""
+        return self.endpoints[0].breaker
+
+    def get_client(self, endpoint: Endpoint, read_timeout: Optional[float] = None) -> Any:
+        """Runtime client for an endpoint and read timeout bucket, created on first use"""
+        if endpoint.client is not None:
+            return endpoint.client
+
+        read_timeout = get_timeout_bucket(read_timeout or self.read_timeout)
+        client = endpoint.timeout_clients.get(read_timeout)
+        if client is None:
+            with self._client_lock:
+                client = endpoint.timeout_clients.get(read_timeout)
+                if client is None:
+                    client = self._create_client(endpoint, read_timeout)
+                    endpoint.timeout_clients[read_timeout] = client
+        return client
+
+    def _create_client(self, endpoint: Endpoint, read_timeout: float) -> Any:
+        import boto3
+        from botocore.config import Config
+
+        # Retries are handled here with jittered backoff, so botocore's own
+        # retry loop is disabled to avoid multiplying attempts.
+        config = Config(
+            connect_timeout=self.connect_timeout,
+            read_timeout=read_timeout,
+            max_pool_connections=self.max_pool_connections,
+            tcp_keepalive=True,
+            retries={'total_max_attempts': 1, 'mode': 'standard'}
+        )
+        return boto3.client(
+            'bedrock-runtime',
+            region_name=endpoint.region,
+            endpoint_url=endpoint.endpoint_url,
+            config=config
+        )
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def _increment(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def rank_endpoints(self) -> List[Endpoint]:
+        """Order endpoints by health score, occasionally promoting another one as a probe"""
+        ranked = sorted(self.endpoints, key=lambda endpoint: endpoint.score())
+        if len(ranked) > 1 and random.random() < self.probe_rate:
+            probe = random.choice(ranked[1:])
+            ranked.remove(probe)
+            ranked.insert(0, probe)
+            self._increment('probes')
+        return ranked
+
+    def _next_endpoint(self, ranked: List[Endpoint], failed: List[Endpoint]) -> Optional[Endpoint]:
+        """First admitted endpoint, preferring ones that have not failed this call"""
+        for candidates in ([e for e in ranked if e not in failed], failed):
+            for endpoint in candidates:
+                if endpoint.breaker.allow_request():
+                    return endpoint
+        return None
+
+    def _call_timeout(self, deadline: Optional[RequestDeadline], minimum: float = MIN_CALL_TIMEOUT) -> float:
+        """Read timeout for the next attempt, bounded by the request deadline"""
+        if deadline is None:
+            return self.read_timeout
+        return deadline.timeout_for(self.read_timeout, minimum=minimum, stage='bedrock')
+
+    def invoke(self, request_body: Union[bytes, Dict[str, Any]],
+               deadline: Optional[RequestDeadline] = None) -> Dict[str, Any]:
+        """
+        Invoke the model on the best healthy endpoint with retries and failover.
+
+        Accepts a pre-serialized body (see encode_request_body) or a dict.
+        """
+        call_timeout = self._call_timeout(deadline)
+        ranked = self.rank_endpoints()
+        endpoint = self._next_endpoint(ranked, [])
+        if endpoint is None:
+            raise CircuitOpenError("Bedrock circuit breaker is open for all endpoints")
+
+        self._increment('calls')
+        body = request_body if isinstance(request_body, bytes) else json.dumps(request_body)
+        failed: List[Endpoint] = []
+
+        with self._stats_lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        try:
+            attempt = 0
+            while True:
+                start_time = time.monotonic()
+                try:
+                    client = self.get_client(endpoint, call_timeout)
+                    response = client.invoke_model(modelId=self.model_id, body=body)
+                    response_body = json.loads(response['body'].read())
+                    endpoint.record(time.monotonic() - start_time, failed=False)
+                    break
+                except Exception as e:
+                    if get_error_code(e) in THROTTLING_ERROR_CODES:
+                        self._increment('throttles')
+
+                    attempt += 1
+                    if not is_retryable_error(e):
+                        # Bedrock answered, so the service itself is healthy
+                        endpoint.record(time.monotonic() - start_time, failed=False)
+                        endpoint.breaker.record_success()
+                        self._increment('failures')
+                        raise
+
+                    endpoint.record(time.monotonic() - start_time, failed=True)
+                    endpoint.breaker.record_failure()
+                    if endpoint not in failed:
+                        failed.append(endpoint)
+
+                    can_retry = attempt < self.max_attempts
+                    if can_retry and deadline is not None and not deadline.has_budget(MIN_CALL_TIMEOUT):
+                        # No time left for another attempt
+                        deadline_stats.record_miss('bedrock_retry')
+                        can_retry = False
+
+                    next_endpoint = self._next_endpoint(ranked, failed) if can_retry else None
+                    if next_endpoint is None:
+                        self._increment('failures')
+                        raise
+
+                    self._increment('retries')
+                    if next_endpoint in failed:
+                        # Nowhere else to go, back off before retrying
+                        delay = self._backoff_delay(attempt)
+                        if deadline is not None:
+                            delay = min(delay, max(0.0, deadline.remaining() - MIN_CALL_TIMEOUT))
+                        time.sleep(delay)
+                    else:
+                        self._increment('failovers')
+
+                    # Budget for the retry was checked before backing off
+                    call_timeout = self._call_timeout(deadline, minimum=0.0)
+                    endpoint = next_endpoint
+        finally:
+            with self._stats_lock:
+                self.in_flight -= 1
+
+        endpoint.breaker.record_success()
+        self._increment('successes')
+        usage_stats.record(response_body.get('usage'))
+        return response_body
+
+    def complete(self, prompt: str, frame: Union[Frame, str], generation_params: Dict[str, Any],
+                 fallback_key: str = 'default',
+                 deadline: Optional[RequestDeadline] = None) -> ModelReply:
+        """
+        Analyze a frame and return the model's text.
+
+        While Bedrock is unavailable the last known text for fallback_key is
+        served with degraded=True, as it is when the request deadline leaves
+        no time for a call; BedrockUnavailableError is raised if there is none.
+        """
+        start_time = time.time()
+        frame = Frame.coerce(frame)
+        request_body = encode_request_body(prompt, frame.base64, generation_params, frame.media_type)
+
+        try:
+            response_body = self.invoke(request_body, deadline)
+        except Exception as e:
+            if not isinstance(e, (BedrockUnavailableError, DeadlineExceededError)) and not is_retryable_error(e):
+                raise
+
+            last_known = self._last_known.get(fallback_key)
+            if last_known is None:
+                if isinstance(e, (BedrockUnavailableError, DeadlineExceededError)):
+                    raise
+                raise BedrockUnavailableError(f"Bedrock unavailable: {e}") from e
+
+            logger.warning(f"Serving last known result for {fallback_key}: {e}")
+            self._increment('fallbacks_served')
+            return ModelReply(text=last_known, degraded=True,
+                              latency=time.time() - start_time)
+
+        text = response_body['content'][0]['text']
+        with self._stats_lock:
+            self._last_known[fallback_key] = text
+            self._last_known.move_to_end(fallback_key)
+            if len(self._last_known) > self.max_last_known:
+                self._last_known.popitem(last=False)
+        return ModelReply(text=text, latency=time.time() - start_time)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get gateway counters, routing table, breaker state and pool usage"""
+        with self._stats_lock:
+            stats = {
+                'calls': self.calls,
+                'successes': self.successes,
+                'failures': self.failures,
+                'retries': self.retries,
+                'throttles': self.throttles,
+                'failovers': self.failovers,
+                'probes': self.probes,
+                'fallbacks_served': self.fallbacks_served,
+                'pool': {
+                    'in_flight': self.in_flight,
+                    'peak_in_flight': self.peak_in_flight,
+                    'max_pool_connections': self.max_pool_connections
+                }
+            }
+        stats['routing_table'] = [
+            endpoint.get_stats()
+            for endpoint in sorted(self.endpoints, key=lambda endpoint: endpoint.score())
+        ]
+        open_endpoints = sum(1 for e in self.endpoints if e.breaker.state == CircuitBreaker.OPEN)
+        stats['circuit_breaker'] = {
+            'state': CircuitBreaker.OPEN if open_endpoints == len(self.endpoints) else CircuitBreaker.CLOSED,
+            'open_endpoints': open_endpoints
+        }
+        return stats
+
+
+# Global gateway instance shared by all handlers in the container
+gateway = BedrockGateway()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Prompt templates, request bodies and response parsing for Bedrock sign language inference
+"""
+
+import os
+import json
+import string
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple, Union
+
+# Supported response formats
+RESPONSE_FORMAT_JSON = 'json'
+RESPONSE_FORMAT_COMPACT = 'compact'
+RESPONSE_FORMATS = (RESPONSE_FORMAT_JSON, RESPONSE_FORMAT_COMPACT)
+
+# Compact grammar: one line "GLOSS|CONFIDENCE|HAND" closed by a terminator.
+# The terminator doubles as the stop sequence, so generation ends right
+# after the last field instead of running on into explanations.
+COMPACT_TERMINATOR = '#'
+COMPACT_STOP_SEQUENCES = [COMPACT_TERMINATOR]
+COMPACT_MAX_TOKENS = 24
+COMPACT_NO_SIGN = 'NONE'
+NO_SIGN_TRANSLATION = 'No clear signs detected'
+COMPACT_MAX_GLOSS_LENGTH = 64
+
+# Shortest prefix Bedrock caches for Claude Sonnet models; a cache marker on
+# anything shorter is wasted (and not every model version accepts it)
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+COMPACT_PROMPT = """
+Analyze this image for American Sign Language (ASL) signs.
+
+Reply with exactly one line and nothing else:
+GLOSS|CONFIDENCE|HAND#
+
+GLOSS: the interpreted English words in capitals, or NONE if no clear sign
+CONFIDENCE: a number from 0.00 to 1.00
+HAND: 1 if a hand is visible, otherwise 0
+
+Example: HELLO|0.82|1#
+""".strip()
+
+
+# Cached prompt reads are billed at a fraction of normal input tokens
+CACHE_READ_COST_RATIO = 0.1
+
+
+def get_response_format(response_format: str = None) -> str:
+    """Resolve the response format, defaulting to the deployment setting"""
+    response_format = (response_format or os.environ.get('RESPONSE_FORMAT', RESPONSE_FORMAT_JSON)).lower()
+
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"Unknown response format: {response_format}")
+
+    return response_format
+
+
+def parse_compact_response(content: str) -> Dict[str, Any]:
+    """
+    Strictly parse a compact "GLOSS|CONFIDENCE|HAND" response.
+
+    Raises ValueError if the content does not follow the grammar.
+    """
+    line = content.strip()
+    if line.endswith(COMPACT_TERMINATOR):
+        line = line[:-1]
+
+    fields = line.split('|')
+    if len(fields) != 3:
+        raise ValueError(f"Expected 3 fields, got {len(fields)}")
+
+    gloss, confidence_text, hand_text = fields
+    gloss = gloss.strip()
+    if not gloss or len(gloss) > COMPACT_MAX_GLOSS_LENGTH or '\n' in gloss:
+        raise ValueError("Invalid gloss field")
+
+    confidence = float(confidence_text)
+    if not 0.0 <= confidence <= 1.0:
+        raise ValueError(f"Confidence out of range: {confidence}")
+
+    hand_text = hand_text.strip()
+    if hand_text not in ('0', '1'):
+        raise ValueError(f"Invalid hand field: {hand_text!r}")
+
+    if gloss.upper() == COMPACT_NO_SIGN:
+        gloss = NO_SIGN_TRANSLATION
+
+    return {
+        'translation': gloss,
+        'confidence': confidence,
+        'hand_detected': hand_text == '1'
+    }
+
+
+def parse_response(content: str, response_format: str) -> Dict[str, Any]:
+    """
+    Parse model output for the given response format.
+
+    Raises ValueError (json.JSONDecodeError for the JSON format) on malformed output
+    so callers can apply their own fallback.
+    """
+    if response_format == RESPONSE_FORMAT_COMPACT:
+        return parse_compact_response(content)
+
+    return json.loads(content)
+
+
+def get_generation_params(response_format: str, max_tokens: int) -> Dict[str, Any]:
+    """Get max_tokens and stop sequences for the response format"""
+    if response_format == RESPONSE_FORMAT_COMPACT:
+        return {
+            'max_tokens': COMPACT_MAX_TOKENS,
+            'stop_sequences': list(COMPACT_STOP_SEQUENCES)
+        }
+
+    return {'max_tokens': max_tokens}
+
+
+def get_prompt(json_prompt: str, response_format: str) -> str:
+    """Select the caller's JSON prompt or the shared compact prompt"""
+    if response_format == RESPONSE_FORMAT_COMPACT:
+        return COMPACT_PROMPT
+
+    return json_prompt
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about 4 characters per token for English/JSON)"""
+    return max(1, (len(text) + 3) // 4)
+
+
+def prompt_caching_enabled() -> bool:
+    """Check whether prompt caching is switched on (off unless PROMPT_CACHING is set)"""
+    return os.environ.get('PROMPT_CACHING', 'false').lower() in ('1', 'true', 'yes')
+
+
+def should_cache_prompt(prompt: str) -> bool:
+    """Check whether a prompt gets a cache marker: caching is on and it is long enough to be cached"""
+    return prompt_caching_enabled() and estimate_tokens(prompt) >= PROMPT_CACHE_MIN_TOKENS
+
+
+def build_request_body(prompt: str, frame_data: str, generation_params: Dict[str, Any],
+                       media_type: str = 'image/jpeg') -> Dict[str, Any]:
+    """
+    Build an Anthropic messages request with the instructions as a shared prefix.
+
+    The instruction prompt goes into the system block, so every request
+    shares an identical prefix and only the image in the user turn varies.
+    The block ends in a cache breakpoint only when PROMPT_CACHING is on and
+    the prompt reaches PROMPT_CACHE_MIN_TOKENS; the bundled prompts are far
+    shorter, so by default no marker is sent.
+    """
+    system_block = {"type": "text", "text": prompt}
+    if should_cache_prompt(prompt):
+        system_block["cache_control"] = {"type": "ephemeral"}
+
+    return {
+        "anthropic_version": "bedrock-2023-05-31",
+        **generation_params,
+        "system": [system_block],
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": media_type,
+                            "data": frame_data
+                        }
+                    }
+                ]
+            }
+        ]
+    }
+
+
+# Stands in for the image while a request template is serialized
+FRAME_PLACEHOLDER = '\x00frame\x00'
+FRAME_PLACEHOLDER_JSON = json.dumps(FRAME_PLACEHOLDER).encode('ascii')
+
+# Base64 characters never need escaping inside a JSON string
+BASE64_ALPHABET = (string.ascii_letters + string.digits + '+/=').encode('ascii')
+
+
+@lru_cache(maxsize=32)
+def _request_template(prompt: str, generation_params_json: str, media_type: str,
+                      caching: bool) -> Tuple[bytes, bytes]:
+    """Serialized request split around the image data, built once per prompt version"""
+    body = build_request_body(prompt, FRAME_PLACEHOLDER, json.loads(generation_params_json), media_type)
+    if not caching:
+        body['system'][0].pop('cache_control', None)
+
+    serialized = json.dumps(body).encode('utf-8')
+    if serialized.count(FRAME_PLACEHOLDER_JSON) != 1:
+        raise ValueError("Frame placeholder must appear exactly once in the request template")
+    prefix, _, suffix = serialized.partition(FRAME_PLACEHOLDER_JSON)
+    return prefix + b'"', b'"' + suffix
+
+
+def encode_request_body(prompt: str, frame_data: Union[str, bytes], generation_params: Dict[str, Any],
+                        media_type: str = 'image/jpeg') -> bytes:
+    """
+    Serialized request body with the base64 image spliced into a cached template.
+
+    Equivalent to json.dumps(build_request_body(...)), but the prompt and
+    parameters are serialized once per prompt version and the image is
+    copied once instead of being escape-scanned by the JSON encoder.
+    """
+    template_prefix, template_suffix = _request_template(
+        prompt, json.dumps(generation_params, sort_keys=True), media_type, prompt_caching_enabled()
+    )
+
+    try:
+        data = frame_data if isinstance(frame_data, bytes) else frame_data.encode('ascii')
+    except UnicodeEncodeError:
+        data = b'\x00'
+    if data.translate(None, BASE64_ALPHABET):
+        # Anything outside the alphabet could break out of the JSON string
+        raise ValueError("Frame data contains non-base64 characters")
+    return b''.join((template_prefix, data, template_suffix))
+
+
+@dataclass
+class TokenUsageStats:
+    """Accumulated token usage reported by Bedrock responses"""
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, usage: Optional[Dict[str, Any]]) -> None:
+        """Add the usage block of one model response"""
+        if not usage:
+            return
+
+        with self._lock:
+            self.requests += 1
+            self.input_tokens += usage.get('input_tokens', 0) or 0
+            self.output_tokens += usage.get('output_tokens', 0) or 0
+            self.cache_read_input_tokens += usage.get('cache_read_input_tokens', 0) or 0
+            self.cache_creation_input_tokens += usage.get('cache_creation_input_tokens', 0) or 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get usage totals and prompt cache effectiveness"""
+        with self._lock:
+            prompt_tokens = (
+                self.input_tokens + self.cache_read_input_tokens + self.cache_creation_input_tokens
+            )
+            cached_ratio = self.cache_read_input_tokens / prompt_tokens * 100 if prompt_tokens else 0
+
+            return {
+                'requests': self.requests,
+                'input_tokens': self.input_tokens,
+                'output_tokens': self.output_tokens,
+                'cache_read_input_tokens': self.cache_read_input_tokens,
+                'cache_creation_input_tokens': self.cache_creation_input_tokens,
+                'cached_prompt_ratio': f"{cached_ratio:.1f}%",
+                'input_tokens_saved': int(self.cache_read_input_tokens * (1 - CACHE_READ_COST_RATIO))
+            }
+
+
+# Global usage tracker shared by all handlers in the container
+usage_stats = TokenUsageStats()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark the batch endpoint against N sequential single-frame requests
+
+Both paths run the optimized handler against a fake Bedrock endpoint. The
+sequential path pays one simulated API Gateway round trip per frame; the
+batch path pays one for the whole batch and sends cache misses to the model
+on a bounded worker pool.
+"""
+
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault('RESPONSE_FORMAT', 'compact')
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+sys.path.append(os.path.join(os.path.dirname(BENCH_DIR), 'lambda'))
+sys.path.append(BENCH_DIR)
+import optimized_handler
+from bench_frame_copies import make_jpeg
+from bedrock_gateway import BedrockGateway, Endpoint
+from fake_bedrock import FakeBedrockClient, LatencyProfile
+
+
+def make_frames(count: int, size_kb: int) -> list:
+    return [base64.b64encode(make_jpeg(size_kb * 1024)).decode('ascii') for _ in range(count)]
+
+
+def run_sequential(frames: list, device_id: str, rtt: float) -> dict:
+    start_time = time.perf_counter()
+    ok = 0
+    for frame_data in frames:
+        time.sleep(rtt)
+        response = optimized_handler.process_sign_optimized(
+            {'body': json.dumps({'frame_data': frame_data, 'device_id': device_id})}, None
+        )
+        ok += response['statusCode'] == 200 and 'error' not in json.loads(response['body'])
+    return {'total_ms': round((time.perf_counter() - start_time) * 1000, 1), 'succeeded': ok}
+
+
+def run_batch(frames: list, device_id: str, rtt: float) -> dict:
+    start_time = time.perf_counter()
+    time.sleep(rtt)
+    response = optimized_handler.process_batch({'body': json.dumps({
+        'device_id': device_id,
+        'frames': [{'frame_data': frame_data, 'timestamp': str(i)} for i, frame_data in enumerate(frames)]
+    })}, None)
+    body = json.loads(response['body'])
+    return {'total_ms': round((time.perf_counter() - start_time) * 1000, 1), 'succeeded': body['succeeded']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=16)
+    parser.add_argument('--size-kb', type=int, default=100)
+    parser.add_argument('--model-ms', type=float, default=300, help='Fake model latency')
+    parser.add_argument('--rtt-ms', type=float, default=40, help='Simulated API Gateway round trip')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    profile = LatencyProfile(latency=args.model_ms / 1000, jitter=args.model_ms / 10000)
+    optimized_handler.gateway = BedrockGateway(endpoints=[Endpoint('fake', client=FakeBedrockClient(profile))])
+
+    sequential, batch = [], []
+    for repeat in range(args.repeats):
+        # Fresh frames and devices so every run misses the cache and rate limiter
+        sequential.append(run_sequential(make_frames(args.frames, args.size_kb), f"seq-{repeat}", args.rtt_ms / 1000))
+        batch.append(run_batch(make_frames(args.frames, args.size_kb), f"batch-{repeat}", args.rtt_ms / 1000))
+
+    sequential_ms = statistics.median(run['total_ms'] for run in sequential)
+    batch_ms = statistics.median(run['total_ms'] for run in batch)
+    print(json.dumps({
+        'frames': args.frames,
+        'sequential': {'total_ms_p50': sequential_ms, 'succeeded': sequential[-1]['succeeded']},
+        'batch': {'total_ms_p50': batch_ms, 'succeeded': batch[-1]['succeeded']},
+        'speedup': round(sequential_ms / batch_ms, 2)
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
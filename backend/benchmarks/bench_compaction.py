@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark result compaction against a local bucket stand-in
+
+Seeds a temporary directory with small legacy result objects
+(results/{device_id}/{timestamp}.json) and partitioned JSON Lines batches,
+compacts them and reports object counts, bytes and the cost of reading one
+hour of results before and after.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compact_results import COMPACTED_PREFIX, LocalStorage, compact
+from result_store import RESULTS_PREFIX, partition_prefix
+
+START_EPOCH = 1750507200  # 2025-06-21T12:00:00Z
+
+
+def seed(storage: LocalStorage, devices: int, frames: int) -> None:
+    rng = random.Random(7)
+    for i in range(frames):
+        device_id = f"device-{i % devices}"
+        epoch = START_EPOCH + i * 2
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(epoch)) + f".{i % 1000:03d}Z"
+        result = {'text': rng.choice(['HELLO', 'THANK YOU', 'No clear signs detected']),
+                  'confidence': round(rng.random(), 2), 'timestamp': timestamp, 'device_id': device_id}
+        if i % 4:
+            storage.put(f"{RESULTS_PREFIX}{device_id}/{timestamp}.json", json.dumps(result).encode(), 'application/json')
+        else:
+            key = f"{RESULTS_PREFIX}{partition_prefix(device_id, epoch)}/batch-{i}.jsonl"
+            storage.put(key, (json.dumps(result) + '\n').encode(), 'application/x-ndjson')
+
+
+def read_hour(storage: LocalStorage, prefix: str) -> dict:
+    """Objects and time needed to read every record of one device-hour"""
+    start = time.perf_counter()
+    objects = [stored.key for stored in storage.list(prefix)]
+    for key in objects:
+        storage.get(key)
+    return {'objects': len(objects), 'read_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', type=int, default=5)
+    parser.add_argument('--frames', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        storage = LocalStorage(root)
+        seed(storage, args.devices, args.frames)
+
+        source_objects = list(storage.list(RESULTS_PREFIX))
+        legacy_hour = [stored.key for stored in source_objects if stored.key.startswith(f"{RESULTS_PREFIX}device-0/")]
+
+        summary = compact(storage, workers=args.workers, delete_sources=True)
+        hour_prefix = f"{COMPACTED_PREFIX}{partition_prefix('device-0', START_EPOCH)}/"
+
+        report = {
+            'before': {
+                'objects': len(source_objects),
+                'bytes': sum(stored.size for stored in source_objects),
+                'device_0_objects': len(legacy_hour)
+            },
+            'after': {
+                'objects': len(list(storage.list(COMPACTED_PREFIX))),
+                'bytes': sum(stored.size for stored in storage.list(COMPACTED_PREFIX)),
+                'device_0_first_hour': read_hour(storage, hour_prefix)
+            },
+            'compaction': summary
+        }
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark session fan-out to many fake WebSocket connections
+
+Compares posting a translation to every viewer one at a time (serializing
+the message for each) with MessageDelivery.broadcast, which serializes once
+and keeps a bounded window of posts in flight on the delivery pool. A share
+of the viewers are gone and must be pruned from the room.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from connection_registry import ConnectionRegistry, MemoryConnectionStore
+from websocket_delivery import MessageDelivery
+
+ENDPOINT_URL = 'https://fake.execute-api.local/prod'
+
+
+class GoneException(Exception):
+    response = {'Error': {'Code': 'GoneException'}}
+
+
+class FakeManagementClient:
+    """post_to_connection with a fixed latency; ids in `gone` answer 410"""
+
+    def __init__(self, latency: float, gone: set):
+        self.latency = latency
+        self.gone = gone
+
+    def post_to_connection(self, ConnectionId: str, Data: bytes) -> None:
+        time.sleep(self.latency)
+        if ConnectionId in self.gone:
+            raise GoneException(ConnectionId)
+
+
+def make_result() -> dict:
+    return {
+        'type': 'session_translation',
+        'session_id': 'classroom-1',
+        'translation': 'HELLO',
+        'confidence': 0.92,
+        'description': 'Open palm moving away from the forehead',
+        'timestamp': time.time()
+    }
+
+
+def make_room(viewers: int, gone_ratio: float) -> tuple:
+    registry = ConnectionRegistry(MemoryConnectionStore())
+    connection_ids = [f"viewer-{i}" for i in range(viewers)]
+    for connection_id in connection_ids:
+        registry.connect(connection_id)
+        registry.subscribe(connection_id, 'classroom-1')
+    gone = set(random.sample(connection_ids, int(viewers * gone_ratio)))
+    return registry, gone
+
+
+def run_sequential(viewers: int, gone_ratio: float, latency: float) -> dict:
+    registry, gone = make_room(viewers, gone_ratio)
+    client = FakeManagementClient(latency, gone)
+    result = make_result()
+
+    start_time = time.perf_counter()
+    delivered = 0
+    for connection_id in registry.subscribers('classroom-1'):
+        try:
+            client.post_to_connection(ConnectionId=connection_id, Data=json.dumps(result).encode('utf-8'))
+            delivered += 1
+        except GoneException:
+            registry.disconnect(connection_id)
+    return {'total_ms': round((time.perf_counter() - start_time) * 1000, 1), 'delivered': delivered,
+            'remaining_viewers': len(registry.subscribers('classroom-1'))}
+
+
+def run_broadcast(viewers: int, gone_ratio: float, latency: float, workers: int) -> dict:
+    registry, gone = make_room(viewers, gone_ratio)
+    delivery = MessageDelivery(workers, client_factory=lambda url: FakeManagementClient(latency, gone))
+    delivery.on_gone.append(registry.disconnect)
+    delivery.executor  # start the pool outside the timed section
+
+    start_time = time.perf_counter()
+    delivered = delivery.broadcast(ENDPOINT_URL, registry.subscribers('classroom-1'), make_result())
+    return {'total_ms': round((time.perf_counter() - start_time) * 1000, 1), 'delivered': delivered,
+            'remaining_viewers': len(registry.subscribers('classroom-1'))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--viewers', type=int, default=500)
+    parser.add_argument('--gone-ratio', type=float, default=0.05)
+    parser.add_argument('--post-ms', type=float, default=15, help='Simulated post_to_connection latency')
+    parser.add_argument('--workers', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    latency = args.post_ms / 1000
+    sequential = [run_sequential(args.viewers, args.gone_ratio, latency) for _ in range(args.repeats)]
+    sequential_ms = statistics.median(run['total_ms'] for run in sequential)
+
+    report = {
+        'viewers': args.viewers,
+        'gone': int(args.viewers * args.gone_ratio),
+        'sequential': {'total_ms_p50': sequential_ms, 'delivered': sequential[-1]['delivered']},
+        'broadcast': {}
+    }
+    for workers in args.workers:
+        runs = [run_broadcast(args.viewers, args.gone_ratio, latency, workers) for _ in range(args.repeats)]
+        broadcast_ms = statistics.median(run['total_ms'] for run in runs)
+        report['broadcast'][f"workers_{workers}"] = {
+            'total_ms_p50': broadcast_ms,
+            'delivered': runs[-1]['delivered'],
+            'remaining_viewers': runs[-1]['remaining_viewers'],
+            'speedup': round(sequential_ms / broadcast_ms, 2)
+        }
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
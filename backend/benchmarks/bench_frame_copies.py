@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-request frame handling: repeated decoding vs the shared Frame
+
+The legacy path decodes the full base64 payload for validation, re-derives the
+size from the string, hashes a sample for the cache key and re-serializes the
+request body around the string again. The Frame path validates from the image
+header, computes the size arithmetically and keeps one base64 string for the
+cache key and the request body. Reports CPU time and peak allocation per frame.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import statistics
+import struct
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bedrock_prompts import encode_request_body
+from frame import Frame
+
+SIZES_KB = [100, 500, 1000, 2000]
+
+
+def make_jpeg(size_bytes: int, width: int = 640, height: int = 480) -> bytes:
+    """Synthetic JPEG: SOI, APP0, SOF0 with dimensions, random scan payload, EOI"""
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+    sof0 = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, height, width, 1) + b'\x01\x11\x00'
+    header = b'\xff\xd8' + app0 + sof0
+    return header + os.urandom(max(0, size_bytes - len(header) - 2)) + b'\xff\xd9'
+
+
+def legacy_path(frame_data: str) -> int:
+    """Previous handling: every stage works from the string independently"""
+    decoded = base64.b64decode(frame_data)
+    if len(decoded) < 100:
+        raise ValueError("Frame too small")
+    estimated_size = len(frame_data) * 3 // 4
+    sample = frame_data[:1000] + frame_data[-1000:] if len(frame_data) > 2000 else frame_data
+    cache_key = hashlib.md5(sample.encode()).hexdigest()
+    body = json.dumps({
+        'messages': [{'role': 'user', 'content': [
+            {'type': 'image', 'source': {'type': 'base64', 'media_type': 'image/jpeg', 'data': frame_data}},
+            {'type': 'text', 'text': 'prompt'}
+        ]}]
+    })
+    return estimated_size + len(cache_key) + len(body)
+
+
+def frame_path(frame_data: str) -> int:
+    """Shared Frame: header-only validation, one base64 string for key and body"""
+    frame = Frame.from_base64(frame_data).validate()
+    body = encode_request_body('prompt', frame.base64, {'max_tokens': 24}, frame.media_type)
+    return frame.size_bytes + len(frame.cache_key) + len(body)
+
+
+def measure(path, frame_data: str, iterations: int) -> dict:
+    timings = []
+    for _ in range(iterations):
+        start = time.process_time()
+        path(frame_data)
+        timings.append((time.process_time() - start) * 1000)
+
+    tracemalloc.start()
+    path(frame_data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'cpu_ms_p50': round(statistics.median(timings), 3),
+        'peak_alloc_kb': round(peak / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    results = {}
+    for size_kb in SIZES_KB:
+        frame_data = base64.b64encode(make_jpeg(size_kb * 1024)).decode('ascii')
+        legacy = measure(legacy_path, frame_data, args.iterations)
+        shared = measure(frame_path, frame_data, args.iterations)
+        results[f"{size_kb}KB"] = {
+            'legacy': legacy,
+            'frame': shared,
+            'cpu_speedup': round(legacy['cpu_ms_p50'] / max(shared['cpu_ms_p50'], 1e-3), 2),
+            'peak_alloc_saved_kb': round(legacy['peak_alloc_kb'] - shared['peak_alloc_kb'], 1)
+        }
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
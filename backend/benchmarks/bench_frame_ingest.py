@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark frame ingestion: base64 JSON vs raw binary vs multipart uploads
+
+For each transport the script builds the API Gateway event the handler would
+receive and reports the bytes uploaded by the client and the time to parse
+the event into a validated Frame.
+"""
+
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from bench_frame_copies import make_jpeg
+from frame_request import parse_frame_request
+
+SIZES_KB = [50, 200, 1000, 2000]
+BOUNDARY = 'signbridge-frame-boundary'
+METADATA = {'device_id': 'bench-device', 'timestamp': '2025-06-21T12:00:00Z'}
+
+
+def json_upload(image: bytes):
+    """Client sends base64 inside JSON; API Gateway passes the text through"""
+    body = json.dumps({'frame_data': base64.b64encode(image).decode('ascii'), **METADATA})
+    event = {'headers': {'Content-Type': 'application/json'}, 'body': body, 'isBase64Encoded': False}
+    return len(body.encode('utf-8')), event
+
+
+def binary_upload(image: bytes):
+    """Client sends the JPEG bytes; metadata travels in headers"""
+    event = {
+        'headers': {'Content-Type': 'image/jpeg', 'X-Device-Id': METADATA['device_id'],
+                    'X-Timestamp': METADATA['timestamp']},
+        'body': base64.b64encode(image).decode('ascii'),
+        'isBase64Encoded': True
+    }
+    return len(image), event
+
+
+def multipart_upload(image: bytes):
+    """Client sends a JSON metadata part and the JPEG bytes"""
+    body = (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="metadata"\r\n'
+        f'Content-Type: application/json\r\n\r\n{json.dumps(METADATA)}\r\n'
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="frame"; filename="frame.jpg"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'
+    ).encode('utf-8') + image + f'\r\n--{BOUNDARY}--\r\n'.encode('utf-8')
+    event = {
+        'headers': {'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'},
+        'body': base64.b64encode(body).decode('ascii'),
+        'isBase64Encoded': True
+    }
+    return len(body), event
+
+
+def measure(event: dict, iterations: int) -> float:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        request = parse_frame_request(event)
+        request.frame.validate()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    results = {}
+    for size_kb in SIZES_KB:
+        image = make_jpeg(size_kb * 1024)
+        row = {}
+        for name, build in (('json', json_upload), ('binary', binary_upload), ('multipart', multipart_upload)):
+            upload_bytes, event = build(image)
+            row[name] = {'upload_bytes': upload_bytes, 'parse_ms_p50': measure(event, args.iterations)}
+        row['binary_upload_saving'] = f"{(1 - row['binary']['upload_bytes'] / row['json']['upload_bytes']) * 100:.1f}%"
+        results[f"{size_kb}KB"] = row
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
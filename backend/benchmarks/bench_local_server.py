@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Benchmark the standalone server against the fake model endpoint
+
+Starts local_server in-process on a free port with an in-process fake
+Bedrock endpoint, then drives it with concurrent HTTP /process requests and
+WebSocket clients streaming binary frames, and finally drains it the way
+SIGTERM would. Reports request latency, throughput and the drain summary.
+"""
+
+import argparse
+import asyncio
+import base64
+import http.client
+import json
+import os
+import socket
+import statistics
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+sys.path.append(BENCH_DIR)
+import local_server
+from bench_frame_copies import make_jpeg
+from frame_protocol import encode_frame_message
+
+
+def start_server(workers: int) -> tuple:
+    """Run a LocalServer on a background event loop; returns (server, loop)"""
+    loop = asyncio.new_event_loop()
+    server = local_server.LocalServer(port=0, workers=workers)
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+    return server, loop
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def run_http(port: int, frames: list, clients: int, requests: int) -> dict:
+    def client(index: int) -> list:
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        latencies = []
+        for i in range(requests):
+            body = json.dumps({'frame_data': frames[(index + i) % len(frames)], 'device_id': f"bench-{index}"})
+            start_time = time.perf_counter()
+            connection.request('POST', '/process', body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            if response.status == 200:
+                latencies.append((time.perf_counter() - start_time) * 1000)
+        connection.close()
+        return latencies
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        latencies = [ms for result in executor.map(client, range(clients)) for ms in result]
+    elapsed = time.perf_counter() - start_time
+    return {
+        'requests': clients * requests,
+        'succeeded': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'latency_ms_p50': round(statistics.median(latencies), 1) if latencies else None,
+        'latency_ms_p95': round(percentile(latencies, 0.95), 1) if latencies else None
+    }
+
+
+class WebSocketClient:
+    """Minimal blocking WebSocket client (masked frames, no extensions)"""
+
+    def __init__(self, port: int, query: str):
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        self.sock.sendall((
+            f"GET {local_server.WEBSOCKET_PATH}?{query} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+            f"Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        ).encode('ascii'))
+        self.stream = self.sock.makefile('rb')
+        status = self.stream.readline()
+        while self.stream.readline() not in (b'\r\n', b''):
+            pass
+        if b' 101 ' not in status:
+            raise ConnectionError(f"Upgrade refused: {status!r}")
+
+    def send(self, payload: bytes, opcode: int = local_server.OP_BINARY) -> None:
+        self.sock.sendall(local_server.encode_ws_frame(opcode, payload, mask=os.urandom(4)))
+
+    def receive(self) -> dict:
+        first, second = self.stream.read(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('>H', self.stream.read(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', self.stream.read(8))[0]
+        payload = self.stream.read(length)
+        if first & 0x0F == local_server.OP_CLOSE:
+            raise ConnectionError('Closed by server')
+        return json.loads(payload)
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+def run_websocket(port: int, images: list, clients: int, frames: int, fps: float) -> dict:
+    def client(index: int) -> dict:
+        ws = WebSocketClient(port, f"device_id=ws-{index}&format=compact")
+        sent_at, latencies = {}, []
+        done = threading.Event()
+
+        def reader():
+            try:
+                while True:
+                    message = ws.receive()
+                    if message.get('type') == 'translation_result' and message.get('sequence') in sent_at:
+                        latencies.append((time.perf_counter() - sent_at[message['sequence']]) * 1000)
+                        if message['sequence'] == frames - 1:
+                            break
+            except (ConnectionError, ValueError, OSError):
+                pass
+            done.set()
+
+        threading.Thread(target=reader, daemon=True).start()
+        for sequence in range(frames):
+            sent_at[sequence] = time.perf_counter()
+            ws.send(encode_frame_message(images[(index + sequence) % len(images)], sequence,
+                                         int(time.time() * 1000)))
+            time.sleep(1 / fps)
+        done.wait(timeout=10)
+        ws.close()
+        return {'latencies': latencies}
+
+    with ThreadPoolExecutor(clients) as executor:
+        results = list(executor.map(client, range(clients)))
+    latencies = [ms for result in results for ms in result['latencies']]
+    return {
+        'frames_sent': clients * frames,
+        'results_received': len(latencies),
+        'latency_ms_p50': round(statistics.median(latencies), 1) if latencies else None,
+        'latency_ms_p95': round(percentile(latencies, 0.95), 1) if latencies else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--model-ms', type=float, default=300, help='Fake model latency')
+    parser.add_argument('--http-clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=10, help='Requests per HTTP client')
+    parser.add_argument('--ws-clients', type=int, default=8)
+    parser.add_argument('--ws-frames', type=int, default=20, help='Frames per WebSocket client')
+    parser.add_argument('--fps', type=float, default=5)
+    parser.add_argument('--size-kb', type=int, default=50)
+    args = parser.parse_args()
+
+    local_server.use_fake_model(args.model_ms)
+    images = [make_jpeg(args.size_kb * 1024) for _ in range(8)]
+    frames = [base64.b64encode(image).decode('ascii') for image in images]
+
+    server, loop = start_server(args.workers)
+    report = {
+        'workers': args.workers,
+        'model_ms': args.model_ms,
+        'http': run_http(server.port, frames, args.http_clients, args.requests),
+        'websocket': run_websocket(server.port, images, args.ws_clients, args.ws_frames, args.fps)
+    }
+
+    drain_start = time.perf_counter()
+    report['drain'] = asyncio.run_coroutine_threadsafe(server.drain(), loop).result()
+    report['drain']['drain_ms'] = round((time.perf_counter() - drain_start) * 1000, 1)
+    report['server'] = server.get_stats()
+    loop.call_soon_threadsafe(loop.stop)
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
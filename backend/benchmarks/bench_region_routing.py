@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark multi-region routing against local fake endpoints
+
+Runs the gateway against several fake endpoints with different latency and
+error profiles and reports where calls were routed and the latency seen by
+callers. With --http the fakes are served over HTTP and reached through real
+boto3 clients (requires boto3).
+"""
+
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+from contextlib import ExitStack
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bedrock_gateway import BedrockGateway, Endpoint
+from fake_bedrock import FakeBedrockClient, FakeBedrockServer, LatencyProfile
+
+PROFILES = {
+    'fake-east': LatencyProfile(latency=0.040, jitter=0.010),
+    'fake-west': LatencyProfile(latency=0.090, jitter=0.020),
+    'fake-slow': LatencyProfile(latency=0.250, jitter=0.050, error_rate=0.2),
+}
+
+# Minimal 1x1 JPEG header; the fakes never look at the image
+FRAME = base64.b64encode(
+    b'\xff\xd8\xff\xc0\x00\x11\x08\x00\x01\x00\x01\x03\x01\x22\x00\x02\x11\x01\x03\x11\x01\xff\xd9'
+).decode('ascii')
+
+
+def run(gateway: BedrockGateway, requests: int, slowdown_at: int) -> dict:
+    """Send requests through the gateway, degrading the fastest region midway"""
+    latencies = []
+    errors = 0
+
+    for i in range(requests):
+        if i == slowdown_at:
+            # Simulate a regional slowdown on the best endpoint
+            PROFILES['fake-east'].latency = 0.400
+
+        start_time = time.monotonic()
+        try:
+            gateway.complete('prompt', FRAME, {'max_tokens': 24}, fallback_key=f"bench-{i}")
+        except Exception:
+            errors += 1
+        latencies.append((time.monotonic() - start_time) * 1000)
+
+    return {
+        'requests': requests,
+        'errors': errors,
+        'latency_p50_ms': round(statistics.median(latencies), 1),
+        'latency_p95_ms': round(sorted(latencies)[int(len(latencies) * 0.95) - 1], 1),
+        'gateway': gateway.get_stats()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--probe-rate', type=float, default=0.05)
+    parser.add_argument('--http', action='store_true', help='Serve fakes over HTTP and use boto3')
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        if args.http:
+            os.environ.setdefault('AWS_ACCESS_KEY_ID', 'fake')
+            os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'fake')
+            endpoints = [
+                Endpoint(name, stack.enter_context(FakeBedrockServer(profile)).endpoint_url)
+                for name, profile in PROFILES.items()
+            ]
+        else:
+            endpoints = [
+                Endpoint(name, client=FakeBedrockClient(profile))
+                for name, profile in PROFILES.items()
+            ]
+
+        gateway = BedrockGateway(endpoints=endpoints, probe_rate=args.probe_rate, base_backoff=0.01)
+        results = run(gateway, args.requests, slowdown_at=args.requests // 2)
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark Bedrock request body assembly: json.dumps vs the spliced template
+
+json.dumps serializes the whole request and escape-scans the base64 image on
+every call, and botocore then encodes the string to bytes. The template path
+serializes the prompt and parameters once and joins the image bytes into it.
+Reports CPU time and peak allocation per request for 100KB-2MB frames.
+"""
+
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bedrock_prompts import (
+    COMPACT_PROMPT, RESPONSE_FORMAT_COMPACT, build_request_body, encode_request_body, get_generation_params
+)
+
+SIZES_KB = [100, 500, 1000, 2000]
+
+
+def dumps_path(frame_data: str, frame_bytes: bytes, params: dict) -> bytes:
+    return json.dumps(build_request_body(COMPACT_PROMPT, frame_data, params)).encode('utf-8')
+
+
+def template_path(frame_data: str, frame_bytes: bytes, params: dict) -> bytes:
+    return encode_request_body(COMPACT_PROMPT, frame_bytes, params)
+
+
+def measure(path, frame_data: str, frame_bytes: bytes, params: dict, iterations: int) -> dict:
+    path(frame_data, frame_bytes, params)  # warm the template cache
+
+    timings = []
+    for _ in range(iterations):
+        start = time.process_time()
+        path(frame_data, frame_bytes, params)
+        timings.append((time.process_time() - start) * 1000)
+
+    tracemalloc.start()
+    path(frame_data, frame_bytes, params)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'cpu_ms_p50': round(statistics.median(timings), 3),
+        'peak_alloc_kb': round(peak / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    params = get_generation_params(RESPONSE_FORMAT_COMPACT, 24)
+    results = {}
+    for size_kb in SIZES_KB:
+        frame_bytes = base64.b64encode(os.urandom(size_kb * 1024))
+        frame_data = frame_bytes.decode('ascii')
+
+        if json.loads(dumps_path(frame_data, frame_bytes, params)) != \
+                json.loads(template_path(frame_data, frame_bytes, params)):
+            raise AssertionError("Template body differs from json.dumps body")
+
+        dumps = measure(dumps_path, frame_data, frame_bytes, params, args.iterations)
+        template = measure(template_path, frame_data, frame_bytes, params, args.iterations)
+        results[f"{size_kb}KB"] = {
+            'json_dumps': dumps,
+            'template': template,
+            'cpu_speedup': round(dumps['cpu_ms_p50'] / max(template['cpu_ms_p50'], 1e-3), 2)
+        }
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
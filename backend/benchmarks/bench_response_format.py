@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark the compact response protocol against the verbose JSON format
+
+Offline mode (default) compares representative model outputs: estimated output
+tokens, parse time and modelled generation latency. With --live it calls
+Bedrock for both formats and reports the real output token usage and latency.
+"""
+
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bedrock_prompts import (
+    RESPONSE_FORMAT_JSON, RESPONSE_FORMAT_COMPACT,
+    build_request_body, estimate_tokens, get_generation_params, parse_response
+)
+from processing_optimizer import pipeline
+
+MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+
+# Representative completions for each format
+SAMPLE_OUTPUTS = {
+    RESPONSE_FORMAT_JSON: json.dumps({
+        "translation": "HELLO",
+        "confidence": 0.82,
+        "hand_detected": True,
+        "description": "Open right hand raised near the forehead with fingers "
+                       "together, palm facing outward, moving away from the head"
+    }, indent=4),
+    RESPONSE_FORMAT_COMPACT: "HELLO|0.82|1",
+}
+
+
+def benchmark_offline(iterations: int, ms_per_output_token: float, ttft_ms: float) -> dict:
+    """Compare formats using sample outputs and a per-token decode cost"""
+    results = {}
+
+    for response_format, content in SAMPLE_OUTPUTS.items():
+        output_tokens = estimate_tokens(content)
+        parse_seconds = timeit.timeit(
+            lambda: parse_response(content, response_format),
+            number=iterations
+        )
+        prompt = pipeline.optimize_prompt({}, response_format)
+
+        results[response_format] = {
+            'prompt_tokens_estimate': estimate_tokens(prompt),
+            'output_tokens_estimate': output_tokens,
+            'max_tokens': get_generation_params(response_format, 200)['max_tokens'],
+            'parse_us': parse_seconds / iterations * 1e6,
+            'modelled_latency_ms': ttft_ms + output_tokens * ms_per_output_token
+        }
+
+    return results
+
+
+def benchmark_live(image_path: str, iterations: int, region: str) -> dict:
+    """Call Bedrock for each format and collect usage and latency"""
+    import boto3
+
+    client = boto3.client('bedrock-runtime', region_name=region)
+    with open(image_path, 'rb') as image_file:
+        frame_data = base64.b64encode(image_file.read()).decode('utf-8')
+
+    results = {}
+    for response_format in SAMPLE_OUTPUTS:
+        prompt = pipeline.optimize_prompt({}, response_format)
+        request_body = json.dumps(build_request_body(
+            prompt, frame_data, get_generation_params(response_format, 200)
+        ))
+
+        latencies = []
+        output_tokens = []
+        cached_tokens = []
+        parse_failures = 0
+        for _ in range(iterations):
+            start_time = time.time()
+            response = client.invoke_model(modelId=MODEL_ID, body=request_body)
+            response_body = json.loads(response['body'].read())
+            latencies.append((time.time() - start_time) * 1000)
+            usage = response_body.get('usage', {})
+            output_tokens.append(usage.get('output_tokens', 0))
+            cached_tokens.append(usage.get('cache_read_input_tokens', 0))
+
+            try:
+                parse_response(response_body['content'][0]['text'], response_format)
+            except ValueError:
+                parse_failures += 1
+
+        results[response_format] = {
+            'output_tokens_mean': statistics.mean(output_tokens),
+            'cache_read_tokens_mean': statistics.mean(cached_tokens),
+            'latency_p50_ms': statistics.median(latencies),
+            'latency_max_ms': max(latencies),
+            'parse_failures': parse_failures
+        }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=10000)
+    parser.add_argument('--ms-per-token', type=float, default=20.0,
+                        help='Modelled decode time per output token (offline mode)')
+    parser.add_argument('--ttft-ms', type=float, default=600.0,
+                        help='Modelled time to first token (offline mode)')
+    parser.add_argument('--live', metavar='IMAGE', help='Call Bedrock with this JPEG file')
+    parser.add_argument('--region', default=os.environ.get('BEDROCK_REGION', 'us-east-1'))
+    args = parser.parse_args()
+
+    if args.live:
+        results = benchmark_live(args.live, min(args.iterations, 20), args.region)
+    else:
+        results = benchmark_offline(args.iterations, args.ms_per_token, args.ttft_ms)
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark transcript deltas against per-frame translation messages
+
+Simulates a signer holding each sign for a few frames, with misread frames
+and short pauses between signs, and compares how many messages (and bytes)
+a client receives per frame versus as transcript deltas, and how closely
+the assembled transcript matches the signed sentence for several stability
+windows.
+"""
+
+import argparse
+import difflib
+import json
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bedrock_prompts import NO_SIGN_TRANSLATION
+from transcript import TranscriptBuilder
+
+VOCABULARY = ['HELLO', 'MY', 'NAME', 'WHAT', 'YOUR', 'THANK YOU', 'PLEASE', 'HELP', 'WHERE', 'BATHROOM']
+
+
+def make_stream(signs: int, hold_frames: int, misread_rate: float, pause_rate: float, seed: int) -> tuple:
+    """(signed sentence, [(gloss, confidence) per frame])"""
+    rng = random.Random(seed)
+    sentence, frames = [], []
+    for _ in range(signs):
+        sign = rng.choice([word for word in VOCABULARY if not sentence or word != sentence[-1]])
+        sentence.append(sign)
+        for _ in range(max(1, hold_frames + rng.randint(-1, 1))):
+            if rng.random() < misread_rate:
+                frames.append((rng.choice(VOCABULARY), rng.uniform(0.3, 0.6)))
+            else:
+                frames.append((sign, rng.uniform(0.6, 0.95)))
+        if rng.random() < pause_rate:
+            frames += [(NO_SIGN_TRANSLATION, 0.0)] * rng.randint(1, 3)
+    return sentence, frames
+
+
+def per_frame_messages(frames: list) -> dict:
+    sizes = [len(json.dumps({'type': 'translation_result', 'translation': gloss, 'confidence': confidence,
+                             'description': '', 'hand_detected': True, 'cache_hit': False,
+                             'timestamp': '2025-06-21T12:00:00.000Z', 'sequence': i}))
+             for i, (gloss, confidence) in enumerate(frames)]
+    return {'messages': len(sizes), 'bytes': sum(sizes)}
+
+
+def delta_messages(frames: list, sentence: list, stability_frames: int, gap_frames: int) -> dict:
+    builder = TranscriptBuilder(stability_frames=stability_frames, gap_frames=gap_frames)
+    messages = size = 0
+    for i, (gloss, confidence) in enumerate(frames):
+        update = builder.observe(gloss, confidence)
+        if update is not None:
+            messages += 1
+            size += len(json.dumps({'type': 'transcript_delta', **update, 'sequence': i}))
+    stats = builder.get_stats()
+    words = [token.text for token in builder.tokens]
+    return {
+        'messages': messages,
+        'bytes': size,
+        'revisions': stats['revisions'],
+        'token_accuracy': round(difflib.SequenceMatcher(None, words, sentence, autojunk=False).ratio(), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--signs', type=int, default=200)
+    parser.add_argument('--hold-frames', type=int, default=4, help='Frames each sign is held for')
+    parser.add_argument('--misread-rate', type=float, default=0.15)
+    parser.add_argument('--pause-rate', type=float, default=0.3)
+    parser.add_argument('--stability-frames', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--gap-frames', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    sentence, frames = make_stream(args.signs, args.hold_frames, args.misread_rate, args.pause_rate, args.seed)
+    baseline = per_frame_messages(frames)
+    report = {'frames': len(frames), 'signs': len(sentence), 'per_frame': baseline, 'deltas': {}}
+    for stability_frames in args.stability_frames:
+        result = delta_messages(frames, sentence, stability_frames, args.gap_frames)
+        result['message_reduction'] = round(1 - result['messages'] / baseline['messages'], 3)
+        result['byte_reduction'] = round(1 - result['bytes'] / baseline['bytes'], 3)
+        report['deltas'][f"stability_{stability_frames}"] = result
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
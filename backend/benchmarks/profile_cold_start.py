@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Profile handler import cost and enforce a cold start budget
+
+Each handler module is imported in a fresh interpreter with -X importtime.
+The report lists the most expensive imports, total init time and the number
+of modules loaded. With --check the script exits non-zero when any handler
+exceeds the init time or module count budget, so it can run in CI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, Any, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (module, directory it is imported from)
+HANDLERS = [
+    ('handler', os.path.join(BACKEND_DIR, 'lambda')),
+    ('optimized_handler', os.path.join(BACKEND_DIR, 'lambda')),
+    ('websocket_handler', BACKEND_DIR),
+]
+
+MEASURE_SNIPPET = """
+import json, sys, time
+baseline = len(sys.modules)
+start = time.perf_counter()
+import {module}
+print(json.dumps({{
+    'init_ms': (time.perf_counter() - start) * 1000,
+    'modules': len(sys.modules) - baseline
+}}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Parse `-X importtime` output into per-module self/cumulative costs"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append({
+            'module': name.strip(),
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000
+        })
+    return entries
+
+
+def profile_module(module: str, directory: str, repeats: int, top: int) -> Dict[str, Any]:
+    """Import a module in fresh interpreters and summarize the cost"""
+    runs = []
+    imports: List[Dict[str, Any]] = []
+
+    for _ in range(repeats):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', MEASURE_SNIPPET.format(module=module)],
+            cwd=directory, capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        imports = parse_importtime(completed.stderr)
+
+    top_imports = sorted(imports, key=lambda entry: entry['cumulative_ms'], reverse=True)[:top]
+    return {
+        'init_ms': round(statistics.median(run['init_ms'] for run in runs), 2),
+        'modules': max(run['modules'] for run in runs),
+        'top_imports': top_imports
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--check', action='store_true', help='Fail when a budget is exceeded')
+    parser.add_argument('--max-init-ms', type=float,
+                        default=float(os.environ.get('COLD_START_MAX_INIT_MS', '150')))
+    parser.add_argument('--max-modules', type=int,
+                        default=int(os.environ.get('COLD_START_MAX_MODULES', '120')))
+    args = parser.parse_args()
+
+    report = {}
+    violations = []
+    for module, directory in HANDLERS:
+        result = profile_module(module, directory, args.repeats, args.top)
+        report[module] = result
+
+        if result['init_ms'] > args.max_init_ms:
+            violations.append(f"{module}: init {result['init_ms']}ms > {args.max_init_ms}ms")
+        if result['modules'] > args.max_modules:
+            violations.append(f"{module}: {result['modules']} modules > {args.max_modules}")
+
+    print(json.dumps(report, indent=2))
+
+    if args.check and violations:
+        print("\n❌ Cold start budget exceeded:")
+        for violation in violations:
+            print(f"  {violation}")
+        return 1
+
+    if args.check:
+        print("\n✅ Cold start within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
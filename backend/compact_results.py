@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Compact stored results into large gzipped JSON Lines files per partition
+
+Reads the small result objects under results/ (the legacy
+results/{device_id}/{timestamp}.json layout and the partitioned JSON Lines
+batches), fetches them with parallel GETs and rewrites each date/hour/device
+partition as gzipped JSON Lines parts under compacted/, with a manifest per
+partition listing the parts and the source objects they contain. Runs
+against S3 or a local directory laid out like a bucket.
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Iterator, Tuple
+
+from frame_request import parse_timestamp
+from result_store import RESULTS_PREFIX, partition_prefix
+
+COMPACTED_PREFIX = 'compacted/'
+MANIFEST_NAME = 'manifest.json'
+
+# Uncompressed bytes written to one part before starting the next
+DEFAULT_MAX_PART_BYTES = 128 * 1024 * 1024
+
+DEFAULT_WORKERS = 16
+
+
+@dataclass
+class StoredObject:
+    key: str
+    last_modified: float
+    size: int
+
+
+class LocalStorage:
+    """Directory laid out like a bucket; keys are relative paths"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def list(self, prefix: str) -> Iterator[StoredObject]:
+        base = self._path(prefix.rstrip('/'))
+        for directory, dirnames, filenames in os.walk(base):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(directory, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                stat = os.stat(path)
+                yield StoredObject(key, stat.st_mtime, stat.st_size)
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), 'rb') as source:
+            return source.read()
+
+    def put(self, key: str, body: bytes, content_type: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as target:
+            target.write(body)
+
+    def delete(self, keys: List[str]) -> None:
+        for key in keys:
+            os.remove(self._path(key))
+
+
+class S3Storage:
+    """S3 bucket accessed through boto3"""
+
+    def __init__(self, bucket: str, client: Any = None, workers: int = DEFAULT_WORKERS):
+        if client is None:
+            import boto3
+            from botocore.config import Config
+            client = boto3.client('s3', config=Config(max_pool_connections=workers))
+        self.bucket = bucket
+        self.client = client
+
+    def list(self, prefix: str) -> Iterator[StoredObject]:
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get('Contents', []):
+                yield StoredObject(item['Key'], item['LastModified'].timestamp(), item['Size'])
+
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+
+    def put(self, key: str, body: bytes, content_type: str) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+
+    def delete(self, keys: List[str]) -> None:
+        for start in range(0, len(keys), 1000):
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={'Objects': [{'Key': key} for key in keys[start:start + 1000]], 'Quiet': True}
+            )
+
+
+def source_partition(stored: StoredObject) -> Optional[str]:
+    """Partition of a source object, from its key or (legacy keys) its timestamp"""
+    relative = stored.key[len(RESULTS_PREFIX):]
+    parts = relative.split('/')
+
+    if parts[0].startswith('date='):
+        # Already partitioned: date=.../hour=.../device=.../batch.jsonl
+        return '/'.join(parts[:3]) if len(parts) == 4 else None
+
+    if len(parts) == 2 and parts[1].endswith('.json'):
+        # Legacy results/{device_id}/{timestamp}.json
+        device_id, name = parts
+        epoch = parse_timestamp(name[:-len('.json')])
+        return partition_prefix(device_id, epoch if epoch is not None else stored.last_modified)
+
+    return None
+
+
+def group_by_partition(storage: Any, prefix: str) -> Tuple[Dict[str, List[str]], int]:
+    """Map partitions to their source keys; also returns the number of unrecognized keys"""
+    partitions: Dict[str, List[str]] = {}
+    skipped = 0
+    for stored in storage.list(prefix):
+        partition = source_partition(stored)
+        if partition is None:
+            skipped += 1
+            continue
+        partitions.setdefault(partition, []).append(stored.key)
+    return partitions, skipped
+
+
+def to_lines(key: str, body: bytes) -> List[bytes]:
+    """Records of a source object as JSON Lines"""
+    if key.endswith('.jsonl'):
+        return [line for line in body.splitlines() if line.strip()]
+    # Legacy objects hold one JSON document, possibly pretty-printed
+    return [json.dumps(json.loads(body), separators=(',', ':')).encode('utf-8')]
+
+
+def load_manifest(storage: Any, partition: str) -> Dict[str, Any]:
+    """Existing manifest of a partition, or an empty one"""
+    try:
+        return json.loads(storage.get(f"{COMPACTED_PREFIX}{partition}/{MANIFEST_NAME}"))
+    except Exception as e:
+        error_code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+        if not isinstance(e, FileNotFoundError) and error_code not in ('NoSuchKey', '404'):
+            raise
+        return {'partition': partition, 'parts': [], 'sources': []}
+
+
+class PartWriter:
+    """Gzipped JSON Lines parts for one partition, rolled at max_part_bytes"""
+
+    def __init__(self, storage: Any, partition: str, max_part_bytes: int, dry_run: bool):
+        self.storage = storage
+        self.partition = partition
+        self.max_part_bytes = max_part_bytes
+        self.dry_run = dry_run
+        self.parts: List[Dict[str, Any]] = []
+        self.written_sources: List[str] = []
+        self._open()
+
+    def _open(self) -> None:
+        self.buffer = io.BytesIO()
+        self.gzip = gzip.GzipFile(fileobj=self.buffer, mode='wb', mtime=0)
+        self.records = 0
+        self.raw_bytes = 0
+        self.sources: List[str] = []
+
+    def add(self, key: str, lines: List[bytes]) -> None:
+        for line in lines:
+            self.gzip.write(line + b'\n')
+            self.raw_bytes += len(line) + 1
+        self.records += len(lines)
+        self.sources.append(key)
+        if self.raw_bytes >= self.max_part_bytes:
+            self.close_part()
+
+    def close_part(self) -> None:
+        if not self.records:
+            return
+        self.gzip.close()
+        body = self.buffer.getvalue()
+        key = f"{COMPACTED_PREFIX}{self.partition}/part-{uuid.uuid4().hex[:12]}.jsonl.gz"
+        if not self.dry_run:
+            self.storage.put(key, body, 'application/gzip')
+        self.parts.append({
+            'key': key,
+            'records': self.records,
+            'uncompressed_bytes': self.raw_bytes,
+            'compressed_bytes': len(body),
+            'sources': len(self.sources)
+        })
+        self.written_sources.extend(self.sources)
+        self._open()
+
+
+def compact_partition(storage: Any, partition: str, keys: List[str], executor: ThreadPoolExecutor,
+                      workers: int, max_part_bytes: int, delete_sources: bool,
+                      dry_run: bool) -> Dict[str, Any]:
+    """Merge one partition's source objects into parts and update its manifest"""
+    manifest = load_manifest(storage, partition)
+    already_compacted = set(manifest['sources'])
+    pending = [key for key in keys if key not in already_compacted]
+
+    writer = PartWriter(storage, partition, max_part_bytes, dry_run)
+    # map() keeps at most one window of bodies in memory and preserves key order
+    window = workers * 4
+    for start in range(0, len(pending), window):
+        chunk = pending[start:start + window]
+        for key, body in zip(chunk, executor.map(storage.get, chunk)):
+            writer.add(key, to_lines(key, body))
+    writer.close_part()
+
+    written_sources = writer.written_sources
+    manifest['parts'].extend(writer.parts)
+    manifest['sources'].extend(written_sources)
+    manifest['updated_at'] = time.time()
+
+    if writer.parts and not dry_run:
+        storage.put(f"{COMPACTED_PREFIX}{partition}/{MANIFEST_NAME}",
+                    json.dumps(manifest, indent=2).encode('utf-8'), 'application/json')
+        if delete_sources:
+            # Only after the parts and manifest that cover them are written
+            storage.delete(written_sources)
+
+    return {
+        'sources': len(written_sources),
+        'parts': len(writer.parts),
+        'records': sum(part['records'] for part in writer.parts),
+        'compressed_bytes': sum(part['compressed_bytes'] for part in writer.parts)
+    }
+
+
+def compact(storage: Any, prefix: str = RESULTS_PREFIX, workers: int = DEFAULT_WORKERS,
+            max_part_bytes: int = DEFAULT_MAX_PART_BYTES, delete_sources: bool = False,
+            dry_run: bool = False) -> Dict[str, Any]:
+    """Compact every partition under prefix and return a summary"""
+    start_time = time.time()
+    partitions, skipped = group_by_partition(storage, prefix)
+
+    summary = {'partitions': 0, 'sources': 0, 'parts': 0, 'records': 0,
+               'compressed_bytes': 0, 'skipped_keys': skipped}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for partition in sorted(partitions):
+            result = compact_partition(storage, partition, partitions[partition], executor,
+                                       workers, max_part_bytes, delete_sources, dry_run)
+            if result['parts']:
+                summary['partitions'] += 1
+            for field_name in ('sources', 'parts', 'records', 'compressed_bytes'):
+                summary[field_name] += result[field_name]
+
+    summary['duration_seconds'] = round(time.time() - start_time, 2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--bucket', help='S3 bucket holding the results')
+    target.add_argument('--local-dir', help='Local directory laid out like a bucket')
+    parser.add_argument('--prefix', default=RESULTS_PREFIX)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--max-part-mb', type=int, default=DEFAULT_MAX_PART_BYTES // (1024 * 1024))
+    parser.add_argument('--delete-sources', action='store_true',
+                        help='Delete source objects once their partition manifest is written')
+    parser.add_argument('--dry-run', action='store_true', help='Read and merge but write nothing')
+    args = parser.parse_args()
+
+    storage = (S3Storage(args.bucket, workers=args.workers) if args.bucket
+               else LocalStorage(args.local_dir))
+    summary = compact(storage, args.prefix, args.workers, args.max_part_mb * 1024 * 1024,
+                      args.delete_sources, args.dry_run)
+
+    print(json.dumps(summary, indent=2))
+    print(f"\n✅ Compacted {summary['sources']} objects into {summary['parts']} parts "
+          f"across {summary['partitions']} partitions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
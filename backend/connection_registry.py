@@ -0,0 +1,568 @@
+#!/usr/bin/env python3
+"""
+Per-connection WebSocket session state: negotiated format, adaptive frame
+rate and the last frame and translation, kept in a pluggable store, plus
+session rooms that viewers subscribe to
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Connections tracked per container before the least recently used are evicted
+DEFAULT_MAX_CONNECTIONS = 10000
+
+# API Gateway closes WebSocket connections after two hours
+DEFAULT_CONNECTION_TTL_SECONDS = 2 * 60 * 60
+
+# Interval between frames a client starts with until the server adjusts it
+# (the normal rate_control level)
+DEFAULT_FRAME_INTERVAL_MS = 1000
+
+# What a signer's connection is pushed per frame: every translation result,
+# or only the transcript deltas the frame caused
+UPDATES_FULL = 'full'
+UPDATES_DELTA = 'delta'
+UPDATE_MODES = (UPDATES_FULL, UPDATES_DELTA)
+
+
+class ConnectionState:
+    """Compact state of one WebSocket connection"""
+
+    __slots__ = ('connection_id', 'device_id', 'response_format', 'frame_interval_ms',
+                 'last_frame_key', 'last_translation', 'last_confidence',
+                 'connected_at', 'last_seen', 'frames', 'session_id', 'last_sequence', 'updates',
+                 'watching')
+
+    def __init__(self, connection_id: str, device_id: str = 'default',
+                 response_format: Optional[str] = None,
+                 frame_interval_ms: int = DEFAULT_FRAME_INTERVAL_MS,
+                 last_frame_key: Optional[str] = None, last_translation: Optional[str] = None,
+                 last_confidence: float = 0.0, connected_at: Optional[float] = None,
+                 last_seen: Optional[float] = None, frames: int = 0,
+                 session_id: Optional[str] = None, last_sequence: Optional[int] = None,
+                 updates: str = UPDATES_FULL, watching: Optional[str] = None):
+        now = time.time()
+        self.connection_id = connection_id
+        self.device_id = device_id
+        self.response_format = response_format
+        self.frame_interval_ms = frame_interval_ms
+        self.last_frame_key = last_frame_key
+        self.last_translation = last_translation
+        self.last_confidence = last_confidence
+        self.connected_at = connected_at if connected_at is not None else now
+        self.last_seen = last_seen if last_seen is not None else now
+        self.frames = frames
+        # Session this connection's translations are broadcast to, if any
+        self.session_id = session_id
+        # Newest frame sequence number started on this connection
+        self.last_sequence = last_sequence
+        self.updates = updates
+        # Session room this connection is subscribed to as a viewer, if any
+        self.watching = watching
+
+    def to_tuple(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @classmethod
+    def from_tuple(cls, values: Tuple[Any, ...]) -> 'ConnectionState':
+        return cls(*values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self.__slots__, self.to_tuple()))
+
+
+class ConnectionStore(ABC):
+    """Interface for connection state, keyed by connection id"""
+
+    @abstractmethod
+    def get(self, connection_id: str) -> Optional[ConnectionState]:
+        ...
+
+    @abstractmethod
+    def put(self, state: ConnectionState) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, connection_id: str) -> Optional[ConnectionState]:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def add_member(self, session_id: str, connection_id: str) -> None:
+        """Add a connection to a session room"""
+
+    @abstractmethod
+    def remove_member(self, session_id: str, connection_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def members(self, session_id: str) -> Set[str]:
+        ...
+
+
+class MemoryConnectionStore(ConnectionStore):
+    """Bounded in-process store; the least recently used connections are evicted"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_CONNECTIONS):
+        self.max_entries = max_entries
+        self._states: 'OrderedDict[str, ConnectionState]' = OrderedDict()
+        self._rooms: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, connection_id: str) -> Optional[ConnectionState]:
+        with self._lock:
+            state = self._states.get(connection_id)
+            if state is not None:
+                self._states.move_to_end(connection_id)
+            return state
+
+    def put(self, state: ConnectionState) -> None:
+        with self._lock:
+            self._states[state.connection_id] = state
+            self._states.move_to_end(state.connection_id)
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, connection_id: str) -> Optional[ConnectionState]:
+        with self._lock:
+            return self._states.pop(connection_id, None)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def add_member(self, session_id: str, connection_id: str) -> None:
+        with self._lock:
+            self._rooms.setdefault(session_id, set()).add(connection_id)
+
+    def remove_member(self, session_id: str, connection_id: str) -> None:
+        with self._lock:
+            room = self._rooms.get(session_id)
+            if room is not None:
+                room.discard(connection_id)
+                if not room:
+                    del self._rooms[session_id]
+
+    def members(self, session_id: str) -> Set[str]:
+        with self._lock:
+            return set(self._rooms.get(session_id, ()))
+
+
+class KeyValueBackend(ABC):
+    """
+    Interface for a shared key-value service (DynamoDB, Redis, ...) holding
+    small values with an expiry
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def put(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def compare_and_put(self, key: str, value: bytes, expected: Optional[bytes], ttl_seconds: float) -> bool:
+        """
+        Write only if the live value is still `expected` (None: no live value);
+        returns whether it was written
+        """
+
+    @abstractmethod
+    def add_to_set(self, key: str, member: str, ttl_seconds: float) -> None:
+        """Atomically add to a string set, refreshing its expiry (Redis SADD, DynamoDB ADD)"""
+
+    @abstractmethod
+    def remove_from_set(self, key: str, member: str) -> None:
+        """Atomically remove from a string set; an emptied set is deleted"""
+
+    @abstractmethod
+    def get_set(self, key: str) -> Set[str]:
+        ...
+
+
+class LocalKeyValueBackend(KeyValueBackend):
+    """In-process stand-in for a key-value service, for local runs and benchmarks"""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._items: Dict[str, Tuple[bytes, float]] = {}
+        self._sets: Dict[str, Tuple[Set[str], float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[1] <= self.clock():
+                del self._items[key]
+                return None
+            return item[0]
+
+    def put(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        with self._lock:
+            self._items[key] = (value, self.clock() + ttl_seconds)
+
+    def delete(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._items.pop(key, None)
+            return item[0] if item is not None else None
+
+    def count(self) -> int:
+        return len(self._items)
+
+    def compare_and_put(self, key: str, value: bytes, expected: Optional[bytes], ttl_seconds: float) -> bool:
+        with self._lock:
+            item = self._items.get(key)
+            current = item[0] if item is not None and item[1] > self.clock() else None
+            if current != expected:
+                return False
+            self._items[key] = (value, self.clock() + ttl_seconds)
+            return True
+
+    def add_to_set(self, key: str, member: str, ttl_seconds: float) -> None:
+        with self._lock:
+            members = self._live_set(key) or set()
+            members.add(member)
+            self._sets[key] = (members, self.clock() + ttl_seconds)
+
+    def remove_from_set(self, key: str, member: str) -> None:
+        with self._lock:
+            members = self._live_set(key)
+            if members is not None:
+                members.discard(member)
+                if not members:
+                    del self._sets[key]
+
+    def get_set(self, key: str) -> Set[str]:
+        with self._lock:
+            return set(self._live_set(key) or ())
+
+    def _live_set(self, key: str) -> Optional[Set[str]]:
+        item = self._sets.get(key)
+        if item is None:
+            return None
+        if item[1] <= self.clock():
+            del self._sets[key]
+            return None
+        return item[0]
+
+
+class DynamoDBKeyValueBackend(KeyValueBackend):
+    """
+    Key-value backend on a DynamoDB table with a string partition key `pk`
+    and TTL enabled on `expires_at`. Values are binary attributes and sets
+    are string sets changed with ADD/DELETE updates, so concurrent writers
+    never drop each other's members. DynamoDB removes expired items lazily,
+    so reads check the expiry too.
+    """
+
+    def __init__(self, table_name: str, client: Any = None, clock: Callable[[], float] = time.time):
+        self.table_name = table_name
+        self.clock = clock
+        self._client = client
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            import boto3
+            from botocore.config import Config
+
+            # Every WebSocket message reads its connection record, so fail fast
+            self._client = boto3.client('dynamodb', config=Config(
+                connect_timeout=1, read_timeout=2, retries={'max_attempts': 2, 'mode': 'standard'}
+            ))
+        return self._client
+
+    def _key(self, key: str) -> Dict[str, Any]:
+        return {'pk': {'S': key}}
+
+    def _expiry(self, ttl_seconds: float) -> Dict[str, str]:
+        return {'N': str(int(self.clock() + ttl_seconds))}
+
+    def _live(self, item: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not item or float(item.get('expires_at', {}).get('N', 0)) <= self.clock():
+            return None
+        return item
+
+    def get(self, key: str) -> Optional[bytes]:
+        item = self._live(self.client.get_item(
+            TableName=self.table_name, Key=self._key(key), ConsistentRead=True
+        ).get('Item'))
+        return item['value']['B'] if item and 'value' in item else None
+
+    def put(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        self.client.put_item(TableName=self.table_name, Item={
+            **self._key(key), 'value': {'B': value}, 'expires_at': self._expiry(ttl_seconds)
+        })
+
+    def delete(self, key: str) -> Optional[bytes]:
+        item = self._live(self.client.delete_item(
+            TableName=self.table_name, Key=self._key(key), ReturnValues='ALL_OLD'
+        ).get('Attributes'))
+        return item['value']['B'] if item and 'value' in item else None
+
+    def count(self) -> int:
+        # Approximate (DynamoDB refreshes it every few hours); a scan would cost too much
+        return self.client.describe_table(TableName=self.table_name)['Table'].get('ItemCount', 0)
+
+    def compare_and_put(self, key: str, value: bytes, expected: Optional[bytes], ttl_seconds: float) -> bool:
+        now = {':now': {'N': str(int(self.clock()))}}
+        if expected is None:
+            # An expired item TTL has not deleted yet counts as absent
+            condition = {
+                'ConditionExpression': 'attribute_not_exists(pk) OR expires_at <= :now',
+                'ExpressionAttributeValues': now
+            }
+        else:
+            condition = {
+                'ConditionExpression': '#value = :expected AND expires_at > :now',
+                'ExpressionAttributeNames': {'#value': 'value'},
+                'ExpressionAttributeValues': {**now, ':expected': {'B': expected}}
+            }
+        try:
+            self.client.put_item(TableName=self.table_name, Item={
+                **self._key(key), 'value': {'B': value}, 'expires_at': self._expiry(ttl_seconds)
+            }, **condition)
+        except Exception as e:
+            response = getattr(e, 'response', None)
+            code = response.get('Error', {}).get('Code') if isinstance(response, dict) else None
+            if code == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+    def add_to_set(self, key: str, member: str, ttl_seconds: float) -> None:
+        self.client.update_item(
+            TableName=self.table_name, Key=self._key(key),
+            UpdateExpression='ADD members :member SET expires_at = :expires_at',
+            ExpressionAttributeValues={':member': {'SS': [member]}, ':expires_at': self._expiry(ttl_seconds)}
+        )
+
+    def remove_from_set(self, key: str, member: str) -> None:
+        # DynamoDB drops the attribute when its last member is removed
+        self.client.update_item(
+            TableName=self.table_name, Key=self._key(key),
+            UpdateExpression='DELETE members :member',
+            ExpressionAttributeValues={':member': {'SS': [member]}}
+        )
+
+    def get_set(self, key: str) -> Set[str]:
+        item = self._live(self.client.get_item(
+            TableName=self.table_name, Key=self._key(key), ConsistentRead=True
+        ).get('Item'))
+        return set(item.get('members', {}).get('SS', ())) if item else set()
+
+
+class KeyValueConnectionStore(ConnectionStore):
+    """
+    Connection state in a key-value backend, so every container handling
+    the connection sees the same state. Records are stored as compact JSON
+    arrays in slot order; session rooms are sets under room:<session_id>.
+    """
+
+    def __init__(self, backend: KeyValueBackend, key_prefix: str = 'conn:',
+                 ttl_seconds: float = DEFAULT_CONNECTION_TTL_SECONDS, room_prefix: str = 'room:'):
+        self.backend = backend
+        self.key_prefix = key_prefix
+        self.room_prefix = room_prefix
+        self.ttl_seconds = ttl_seconds
+
+    def _decode(self, value: Optional[bytes]) -> Optional[ConnectionState]:
+        if value is None:
+            return None
+        try:
+            return ConnectionState.from_tuple(json.loads(value))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Discarding unreadable connection record: {e}")
+            return None
+
+    def get(self, connection_id: str) -> Optional[ConnectionState]:
+        return self._decode(self.backend.get(self.key_prefix + connection_id))
+
+    def put(self, state: ConnectionState) -> None:
+        value = json.dumps(state.to_tuple(), separators=(',', ':')).encode('utf-8')
+        self.backend.put(self.key_prefix + state.connection_id, value, self.ttl_seconds)
+
+    def delete(self, connection_id: str) -> Optional[ConnectionState]:
+        return self._decode(self.backend.delete(self.key_prefix + connection_id))
+
+    def __len__(self) -> int:
+        return self.backend.count()
+
+    def add_member(self, session_id: str, connection_id: str) -> None:
+        self.backend.add_to_set(self.room_prefix + session_id, connection_id, self.ttl_seconds)
+
+    def remove_member(self, session_id: str, connection_id: str) -> None:
+        self.backend.remove_from_set(self.room_prefix + session_id, connection_id)
+
+    def members(self, session_id: str) -> Set[str]:
+        return self.backend.get_set(self.room_prefix + session_id)
+
+
+class ConnectionRegistry:
+    """
+    Tracks connections from $connect to $disconnect (or a failed post).
+
+    Viewers subscribe to a signer's session room. Room membership lives in
+    the store next to the connection records, and each record notes the
+    room it watches, so any container can broadcast to a room or remove a
+    viewer from it.
+    """
+
+    def __init__(self, store: ConnectionStore):
+        self.store = store
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.disconnects = 0
+        self.lookups = 0
+        self.misses = 0
+        self.stale_frames = 0
+        self.subscribes = 0
+        self.unsubscribes = 0
+
+    def _increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def connect(self, connection_id: str, device_id: str = 'default',
+                response_format: Optional[str] = None,
+                frame_interval_ms: int = DEFAULT_FRAME_INTERVAL_MS,
+                session_id: Optional[str] = None, updates: str = UPDATES_FULL) -> ConnectionState:
+        state = ConnectionState(connection_id, device_id, response_format, frame_interval_ms,
+                                session_id=session_id, updates=updates)
+        self.store.put(state)
+        self._increment('connects')
+        return state
+
+    def disconnect(self, connection_id: str) -> Optional[ConnectionState]:
+        state = self.store.delete(connection_id)
+        if state is not None:
+            if state.watching is not None:
+                self.store.remove_member(state.watching, connection_id)
+            self._increment('disconnects')
+        return state
+
+    def get(self, connection_id: str) -> Optional[ConnectionState]:
+        self._increment('lookups')
+        state = self.store.get(connection_id)
+        if state is None:
+            self._increment('misses')
+        return state
+
+    def get_or_connect(self, connection_id: str) -> ConnectionState:
+        """State of a connection, recreated if this container never saw its $connect"""
+        return self.get(connection_id) or self.connect(connection_id)
+
+    def subscribe(self, connection_id: str, session_id: str) -> None:
+        """Add a viewer to a session room, leaving any room it was in"""
+        state = self.get_or_connect(connection_id)
+        if state.watching is not None and state.watching != session_id:
+            self.store.remove_member(state.watching, connection_id)
+        state.watching = session_id
+        self.store.put(state)
+        self.store.add_member(session_id, connection_id)
+        self._increment('subscribes')
+
+    def unsubscribe(self, connection_id: str) -> Optional[str]:
+        """Remove a viewer from its room; returns the session it was watching"""
+        state = self.store.get(connection_id)
+        if state is None or state.watching is None:
+            return None
+        session_id, state.watching = state.watching, None
+        self.store.put(state)
+        self.store.remove_member(session_id, connection_id)
+        self._increment('unsubscribes')
+        return session_id
+
+    def prune(self, session_id: str, connection_ids: List[str]) -> None:
+        """Drop viewers known to be gone, including ones whose record already expired"""
+        for connection_id in connection_ids:
+            self.store.remove_member(session_id, connection_id)
+
+    def subscribers(self, session_id: str) -> List[str]:
+        """Snapshot of the viewers of a session"""
+        return sorted(self.store.members(session_id))
+
+    def save(self, state: ConnectionState) -> None:
+        """Write back a state changed in place"""
+        self.store.put(state)
+
+    def begin_sequence(self, state: ConnectionState, sequence: Optional[int], reset: bool = False) -> bool:
+        """
+        Claim a frame sequence number for processing.
+
+        Returns False for a frame older than one already started on the
+        connection; unsequenced frames and resets are always accepted.
+        """
+        if sequence is None:
+            return True
+        if not reset and state.last_sequence is not None and sequence <= state.last_sequence:
+            self._increment('stale_frames')
+            return False
+        state.last_sequence = sequence
+        self.store.put(state)
+        return True
+
+    def record_frame(self, state: ConnectionState, frame_key: str,
+                     translation: Optional[str] = None, confidence: float = 0.0) -> None:
+        """Remember the latest frame and its translation"""
+        state.frames += 1
+        state.last_seen = time.time()
+        state.last_frame_key = frame_key
+        if translation is not None:
+            state.last_translation = translation
+            state.last_confidence = confidence
+        self.store.put(state)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'store': type(self.store).__name__,
+                'active': len(self.store),
+                'connects': self.connects,
+                'disconnects': self.disconnects,
+                'lookups': self.lookups,
+                'misses': self.misses,
+                'stale_frames': self.stale_frames,
+                'subscribes': self.subscribes,
+                'unsubscribes': self.unsubscribes
+            }
+
+
+def create_store() -> ConnectionStore:
+    """
+    Store selected by CONNECTION_STORE: memory (per container) or dynamodb
+    (shared by all containers, table CONNECTION_TABLE)
+    """
+    if os.environ.get('CONNECTION_STORE', 'memory').lower() == 'dynamodb':
+        return KeyValueConnectionStore(
+            DynamoDBKeyValueBackend(os.environ.get('CONNECTION_TABLE', 'signtome-connections'))
+        )
+    return MemoryConnectionStore()
+
+
+# Global registry shared by all WebSocket handlers in the container
+connections = ConnectionRegistry(create_store())
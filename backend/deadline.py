@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Request deadlines derived from the Lambda context and propagated to downstream calls
+"""
+
+import time
+import threading
+from typing import Dict, Any, Optional, Callable
+
+# Budget used when there is no Lambda context (local runs, tests)
+DEFAULT_BUDGET_SECONDS = 30.0
+
+# Time kept back for building and returning the response
+DEFAULT_SAFETY_MARGIN = 0.5
+
+# Minimum remaining budget before optional work (stats, enrichment) is attempted
+OPTIONAL_WORK_MIN_BUDGET = 3.0
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when the remaining budget is too small for a downstream call"""
+
+
+class RequestDeadline:
+    """Absolute deadline for one request, measured on the monotonic clock"""
+
+    def __init__(self, budget_seconds: float, safety_margin: float = DEFAULT_SAFETY_MARGIN,
+                 clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.budget = max(0.0, budget_seconds - safety_margin)
+        self.expires_at = clock() + self.budget
+
+    @classmethod
+    def from_context(cls, context: Any, default_budget: float = DEFAULT_BUDGET_SECONDS,
+                     safety_margin: float = DEFAULT_SAFETY_MARGIN) -> 'RequestDeadline':
+        """Create a deadline from context.get_remaining_time_in_millis() when available"""
+        get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+        budget = get_remaining() / 1000.0 if callable(get_remaining) else default_budget
+        return cls(budget, safety_margin)
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)"""
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def has_budget(self, seconds: float) -> bool:
+        """Check whether at least `seconds` remain"""
+        return self.remaining() >= seconds
+
+    def timeout_for(self, cap: float, minimum: float = 0.0, stage: str = 'call') -> float:
+        """
+        Timeout for a downstream call: the remaining budget, capped at `cap`.
+
+        Raises DeadlineExceededError (and counts a miss) if less than `minimum` remains.
+        """
+        remaining = self.remaining()
+        if remaining <= 0.0 or remaining < minimum:
+            deadline_stats.record_miss(stage)
+            raise DeadlineExceededError(
+                f"{stage}: {remaining:.2f}s left, {minimum:.2f}s needed"
+            )
+        return min(cap, remaining)
+
+    def allow_optional(self, stage: str, min_budget: float = OPTIONAL_WORK_MIN_BUDGET) -> bool:
+        """Check whether optional work may run, counting it as skipped if not"""
+        if self.has_budget(min_budget):
+            return True
+        deadline_stats.record_skip(stage)
+        return False
+
+
+class DeadlineStats:
+    """Counters for deadline misses and skipped optional work"""
+
+    def __init__(self):
+        self.requests = 0
+        self.misses: Dict[str, int] = {}
+        self.skipped: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def record_miss(self, stage: str) -> None:
+        with self._lock:
+            self.misses[stage] = self.misses.get(stage, 0) + 1
+
+    def record_skip(self, stage: str) -> None:
+        with self._lock:
+            self.skipped[stage] = self.skipped.get(stage, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'deadline_misses': sum(self.misses.values()),
+                'misses_by_stage': dict(self.misses),
+                'optional_work_skipped': dict(self.skipped)
+            }
+
+
+def start_request(context: Any, default_budget: Optional[float] = None) -> RequestDeadline:
+    """Create the deadline for a handler invocation and count the request"""
+    deadline_stats.record_request()
+    return RequestDeadline.from_context(context, default_budget or DEFAULT_BUDGET_SECONDS)
+
+
+# Global counters shared by all handlers in the container
+deadline_stats = DeadlineStats()
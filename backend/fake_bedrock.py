@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Local fake Bedrock runtime endpoints for exercising the gateway offline
+
+FakeBedrockClient is an in-process stand-in for a bedrock-runtime client.
+FakeBedrockServer serves the InvokeModel REST route over HTTP so a real
+boto3 client can be pointed at it with endpoint_url.
+"""
+
+import io
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+
+
+@dataclass
+class LatencyProfile:
+    """Latency and failure behaviour of a fake endpoint"""
+    latency: float = 0.05
+    jitter: float = 0.0
+    throttle_rate: float = 0.0
+    error_rate: float = 0.0
+    reply: str = 'HELLO|0.82|1'
+    output_tokens: int = 4
+
+    def sample_latency(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def sample_error(self) -> Optional[str]:
+        """Pick an error code to fail with, or None to succeed"""
+        roll = random.random()
+        if roll < self.throttle_rate:
+            return 'ThrottlingException'
+        if roll < self.throttle_rate + self.error_rate:
+            return 'ServiceUnavailableException'
+        return None
+
+    def response_body(self, request_body: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'content': [{'type': 'text', 'text': self.reply}],
+            'stop_reason': 'stop_sequence' if request_body.get('stop_sequences') else 'end_turn',
+            'usage': {'input_tokens': 1500, 'output_tokens': self.output_tokens}
+        }
+
+
+class FakeClientError(Exception):
+    """Mimics botocore's ClientError shape (error code under response['Error'])"""
+
+    def __init__(self, code: str):
+        super().__init__(f"An error occurred ({code}) when calling the InvokeModel operation")
+        self.response = {'Error': {'Code': code, 'Message': code}}
+
+
+class FakeBedrockClient:
+    """In-process bedrock-runtime client with a configurable latency profile"""
+
+    def __init__(self, profile: Optional[LatencyProfile] = None):
+        self.profile = profile or LatencyProfile()
+        self.invocations = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId: str, body: Any, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self.invocations += 1
+
+        time.sleep(self.profile.sample_latency())
+
+        error_code = self.profile.sample_error()
+        if error_code:
+            raise FakeClientError(error_code)
+
+        request_body = json.loads(body)
+        payload = json.dumps(self.profile.response_body(request_body)).encode('utf-8')
+        return {'body': io.BytesIO(payload), 'contentType': 'application/json'}
+
+
+class FakeBedrockServer:
+    """HTTP server implementing POST /model/{modelId}/invoke on localhost"""
+
+    INVOKE_PATH = re.compile(r'^/model/[^/]+/invoke$')
+
+    def __init__(self, profile: Optional[LatencyProfile] = None, host: str = '127.0.0.1', port: int = 0):
+        self.profile = profile or LatencyProfile()
+        self.invocations = 0
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                request_body = json.loads(self.rfile.read(length) or b'{}')
+
+                if not fake.INVOKE_PATH.match(self.path):
+                    self._send(404, {'message': 'Unknown route'}, 'ResourceNotFoundException')
+                    return
+
+                fake.invocations += 1
+                time.sleep(fake.profile.sample_latency())
+
+                error_code = fake.profile.sample_error()
+                if error_code == 'ThrottlingException':
+                    self._send(429, {'message': 'Too many requests'}, error_code)
+                elif error_code:
+                    self._send(503, {'message': 'Service unavailable'}, error_code)
+                else:
+                    self._send(200, fake.profile.response_body(request_body))
+
+            def _send(self, status: int, payload: Dict[str, Any], error_type: Optional[str] = None):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                if error_type:
+                    self.send_header('x-amzn-ErrorType', error_type)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'FakeBedrockServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeBedrockServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
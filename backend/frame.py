@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Decode-once frame value object shared by validation, hashing, preprocessing
+and request assembly
+"""
+
+import base64
+import binascii
+import hashlib
+import struct
+from dataclasses import dataclass
+from typing import Iterator, Optional, Union
+
+# Base64 characters decoded when only the image header is needed; large
+# enough for typical APP0/APP1 segments ahead of the SOF marker
+HEADER_BASE64_CHARS = 8192
+
+# Base64 characters hashed per step, so the cache key never needs a full copy
+HASH_BASE64_CHARS = 64 * 1024
+
+JPEG_SOI = b'\xff\xd8'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Start-of-frame markers carrying the image dimensions (excludes DHT/JPG/DAC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+JPEG_SOS = 0xDA
+
+MEDIA_TYPES = {'jpeg': 'image/jpeg', 'png': 'image/png'}
+
+
+class FrameError(ValueError):
+    """Raised when frame data is not a usable image"""
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    """Image format and dimensions read from the header"""
+    format: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES.get(self.format, 'application/octet-stream')
+
+
+def parse_jpeg_header(data: bytes) -> Optional[ImageInfo]:
+    """
+    Walk JPEG markers from SOI up to the first SOF/SOS segment.
+
+    Returns None if the data is too short to reach a SOF marker.
+    """
+    if not data.startswith(JPEG_SOI):
+        raise FrameError("Not a JPEG image (missing SOI marker)")
+
+    offset = 2
+    length = len(data)
+    while offset + 4 <= length:
+        if data[offset] != 0xFF:
+            raise FrameError(f"Corrupt JPEG marker at byte {offset}")
+
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            offset += 1
+            continue
+
+        if marker in JPEG_STANDALONE_MARKERS:
+            offset += 2
+            continue
+
+        segment_length = struct.unpack_from('>H', data, offset + 2)[0]
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 9 > length:
+                return None
+            height, width = struct.unpack_from('>HH', data, offset + 5)
+            return ImageInfo('jpeg', width, height)
+
+        if marker == JPEG_SOS:
+            raise FrameError("JPEG scan data before frame header")
+
+        offset += 2 + segment_length
+
+    return None
+
+
+def parse_png_header(data: bytes) -> Optional[ImageInfo]:
+    """Read dimensions from the PNG IHDR chunk"""
+    if len(data) < 24:
+        return None
+    width, height = struct.unpack_from('>II', data, 16)
+    return ImageInfo('png', width, height)
+
+
+class Frame:
+    """
+    One video frame, created once per request.
+
+    Holds whichever of the base64 and raw forms it was created from and
+    derives the other lazily, so each conversion happens at most once. The
+    base64 form is kept only as a str; the cache key is hashed from it in
+    chunks rather than from a second, bytes copy.
+    """
+
+    __slots__ = ('_base64', '_raw', '_info', '_cache_key')
+
+    def __init__(self, base64_data: Optional[str] = None, raw: Optional[bytes] = None):
+        if base64_data is None and raw is None:
+            raise FrameError("Empty frame data")
+        self._base64 = base64_data
+        self._raw = raw
+        self._info: Optional[ImageInfo] = None
+        self._cache_key: Optional[str] = None
+
+    @classmethod
+    def from_base64(cls, base64_data: str) -> 'Frame':
+        if not base64_data:
+            raise FrameError("Empty frame data")
+        if not isinstance(base64_data, str):
+            raise FrameError(f"Invalid frame data: expected a base64 string, got {type(base64_data).__name__}")
+        return cls(base64_data=base64_data)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'Frame':
+        if not raw:
+            raise FrameError("Empty frame data")
+        return cls(raw=bytes(raw))
+
+    @classmethod
+    def coerce(cls, frame: Union['Frame', str, bytes]) -> 'Frame':
+        """Accept a Frame, a base64 string or raw bytes"""
+        if isinstance(frame, Frame):
+            return frame
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            return cls.from_bytes(bytes(frame))
+        return cls.from_base64(frame)
+
+    @property
+    def base64(self) -> str:
+        """Base64 form, encoded on first use"""
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self._raw).decode('ascii')
+        return self._base64
+
+    def _base64_chunks(self) -> Iterator[bytes]:
+        """Base64 form as consecutive ASCII chunks, without materializing all of it"""
+        if self._base64 is None:
+            step = HASH_BASE64_CHARS // 4 * 3
+            for start in range(0, len(self._raw), step):
+                yield base64.b64encode(self._raw[start:start + step])
+            return
+        for start in range(0, len(self._base64), HASH_BASE64_CHARS):
+            try:
+                yield self._base64[start:start + HASH_BASE64_CHARS].encode('ascii')
+            except UnicodeEncodeError:
+                raise FrameError("Invalid base64 frame data: non-ASCII characters")
+
+    @property
+    def raw(self) -> bytes:
+        """Raw image bytes, decoded on first use"""
+        if self._raw is None:
+            try:
+                self._raw = base64.b64decode(self._base64, validate=True)
+            except (binascii.Error, ValueError) as e:
+                raise FrameError(f"Invalid base64 frame data: {e}")
+        return self._raw
+
+    @property
+    def size_bytes(self) -> int:
+        """Exact image size, computed from the base64 length without decoding"""
+        if self._raw is not None:
+            return len(self._raw)
+        padding = 2 if self._base64.endswith('==') else 1 if self._base64.endswith('=') else 0
+        return len(self._base64) * 3 // 4 - padding
+
+    def _header_bytes(self, base64_chars: int = HEADER_BASE64_CHARS) -> bytes:
+        """Leading image bytes, decoding only a prefix of the base64 form"""
+        if self._raw is not None:
+            return self._raw[:base64_chars * 3 // 4]
+        prefix = self._base64[:base64_chars - base64_chars % 4]
+        try:
+            return base64.b64decode(prefix, validate=True)
+        except (binascii.Error, ValueError) as e:
+            raise FrameError(f"Invalid base64 frame data: {e}")
+
+    @property
+    def info(self) -> ImageInfo:
+        """Image format and dimensions from the JPEG SOF / PNG IHDR header"""
+        if self._info is None:
+            header = self._header_bytes()
+            if header.startswith(PNG_SIGNATURE):
+                info = parse_png_header(header)
+            elif header.startswith(JPEG_SOI):
+                info = parse_jpeg_header(header)
+                if info is None and len(header) < self.size_bytes:
+                    # Large metadata segments pushed the SOF past the prefix
+                    info = parse_jpeg_header(self.raw)
+            else:
+                raise FrameError("Unsupported image format (expected JPEG or PNG)")
+
+            self._info = info or ImageInfo('jpeg' if header.startswith(JPEG_SOI) else 'png')
+        return self._info
+
+    @property
+    def media_type(self) -> str:
+        return self.info.media_type
+
+    @property
+    def cache_key(self) -> str:
+        """Content hash of the full image"""
+        if self._cache_key is None:
+            # Hash the base64 form so frames key identically whichever form they
+            # arrived in
+            digest = hashlib.blake2b(digest_size=16)
+            for chunk in self._base64_chunks():
+                digest.update(chunk)
+            self._cache_key = digest.hexdigest()
+        return self._cache_key
+
+    def validate(self, min_bytes: int = 75) -> 'Frame':
+        """Check size, base64 framing and image header; returns self for chaining"""
+        if self._base64 is not None and len(self._base64) % 4:
+            raise FrameError("Invalid base64 frame data: length is not a multiple of 4")
+        if self.size_bytes < min_bytes:
+            raise FrameError(f"Invalid frame data: too small ({self.size_bytes} bytes)")
+        self.info  # parses and checks the image header
+        return self
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Binary WebSocket frame messages and the per-connection latest-frame slot
+
+A binary message is a fixed 16-byte header followed by the image bytes:
+
+    offset  size  field
+    0       2     magic b'SB'
+    2       1     version (1)
+    3       1     flags (FLAG_*)
+    4       4     sequence, unsigned, per connection
+    8       8     capture timestamp, Unix epoch milliseconds
+
+All fields are big-endian. The JSON process_frame message (base64
+frame_data, optional sequence and timestamp) is still accepted and decodes
+to the same FrameMessage.
+
+Ordering is enforced in two places. The sequence check
+(ConnectionRegistry.begin_sequence) lives in the connection store, so it
+holds wherever a frame is handled. LatestFrameSlots only coalesce frames
+that reach the same process concurrently, which happens in the standalone
+server (local_server). A Lambda container handles one invocation at a time,
+so there every frame is processed (or dropped as stale) on its own.
+"""
+
+import base64
+import binascii
+import json
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Tuple
+
+from frame import Frame, FrameError
+
+HEADER = struct.Struct('>2sBBIQ')
+HEADER_SIZE = HEADER.size
+MAGIC = b'SB'
+VERSION = 1
+
+# Payload is a PNG rather than a JPEG (informational; the header is sniffed)
+FLAG_PNG = 0x01
+# Client restarted its sequence numbers (new camera session, page reload)
+FLAG_RESET = 0x02
+
+MAX_SEQUENCE = 0xFFFFFFFF
+
+
+class FrameProtocolError(ValueError):
+    """Raised when a WebSocket message is not a valid frame message"""
+
+
+@dataclass
+class FrameMessage:
+    """One frame received over a WebSocket, whichever encoding it used"""
+    frame: Frame
+    sequence: Optional[int] = None
+    timestamp_ms: Optional[int] = None
+    flags: int = 0
+    binary: bool = False
+
+    @property
+    def reset(self) -> bool:
+        return bool(self.flags & FLAG_RESET)
+
+
+def encode_frame_message(image: bytes, sequence: int, timestamp_ms: int, flags: int = 0) -> bytes:
+    """Build a binary frame message (used by clients, tests and benchmarks)"""
+    if not 0 <= sequence <= MAX_SEQUENCE:
+        raise FrameProtocolError(f"Sequence out of range: {sequence}")
+    return HEADER.pack(MAGIC, VERSION, flags, sequence, timestamp_ms) + image
+
+
+def decode_frame_message(data: bytes) -> FrameMessage:
+    """Parse a binary frame message; the image itself is not decoded"""
+    if len(data) <= HEADER_SIZE:
+        raise FrameProtocolError(f"Binary frame message too short ({len(data)} bytes)")
+
+    magic, version, flags, sequence, timestamp_ms = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise FrameProtocolError("Not a frame message (bad magic)")
+    if version != VERSION:
+        raise FrameProtocolError(f"Unsupported frame message version {version}")
+
+    try:
+        frame = Frame.from_bytes(memoryview(data)[HEADER_SIZE:])
+    except FrameError as e:
+        raise FrameProtocolError(str(e))
+    return FrameMessage(frame, sequence, timestamp_ms, flags, binary=True)
+
+
+def parse_websocket_frame(event: Dict[str, Any]) -> FrameMessage:
+    """
+    Frame message from an API Gateway WebSocket event.
+
+    Binary messages arrive base64-encoded with isBase64Encoded set; text
+    messages are the JSON process_frame format.
+    """
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        try:
+            data = base64.b64decode(body)
+        except (binascii.Error, ValueError) as e:
+            raise FrameProtocolError(f"Invalid base64 message body: {e}")
+        return decode_frame_message(data)
+
+    try:
+        message = json.loads(body) if isinstance(body, str) else body
+    except ValueError as e:
+        raise FrameProtocolError(f"Invalid JSON message: {e}")
+
+    frame_data = message.get('frame_data')
+    if not frame_data:
+        raise FrameProtocolError('No frame data provided')
+    try:
+        sequence = int(message['sequence']) if message.get('sequence') is not None else None
+        timestamp_ms = int(message['timestamp']) if isinstance(message.get('timestamp'), (int, float)) else None
+    except (TypeError, ValueError):
+        raise FrameProtocolError(f"Invalid sequence number: {message.get('sequence')!r}")
+    return FrameMessage(Frame.from_base64(frame_data), sequence, timestamp_ms,
+                        FLAG_RESET if message.get('reset') else 0)
+
+
+class LatestFrameSlots:
+    """
+    Single-slot, latest-wins frame buffer per connection, within one process.
+
+    The first frame offered for an idle connection is processed by the
+    caller, which then owns the connection until next() returns None.
+    Frames offered while it is busy replace each other in the slot, so when
+    the owner finishes it picks up only the freshest frame and every frame
+    superseded in between is dropped without being processed.
+    """
+
+    def __init__(self):
+        self._slots: Dict[str, list] = {}  # connection id -> [pending message or None]
+        self._lock = threading.Lock()
+        self.offered = 0
+        self.superseded = 0
+
+    def offer(self, connection_id: str, message: FrameMessage) -> Tuple[bool, Optional[FrameMessage]]:
+        """
+        Hand a frame to the connection's slot.
+
+        Returns (process_now, dropped): process_now is True if the caller
+        now owns the connection and should process `message`; dropped is a
+        pending frame this one replaced.
+        """
+        with self._lock:
+            self.offered += 1
+            slot = self._slots.get(connection_id)
+            if slot is None:
+                self._slots[connection_id] = [None]
+                return True, None
+
+            dropped, slot[0] = slot[0], message
+            if dropped is not None:
+                self.superseded += 1
+            return False, dropped
+
+    def next(self, connection_id: str) -> Optional[FrameMessage]:
+        """Freshest frame that arrived while the owner was busy, or None (releasing ownership)"""
+        with self._lock:
+            slot = self._slots.get(connection_id)
+            if slot is None or slot[0] is None:
+                self._slots.pop(connection_id, None)
+                return None
+            message, slot[0] = slot[0], None
+            return message
+
+    def discard(self, connection_id: str) -> None:
+        with self._lock:
+            self._slots.pop(connection_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'busy_connections': len(self._slots),
+                'offered': self.offered,
+                'superseded': self.superseded
+            }
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Parse frame requests from API Gateway events: base64 JSON, raw binary images
+and multipart uploads with a JSON metadata part
+"""
+
+import base64
+import binascii
+import json
+import math
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Tuple
+
+from frame import Frame, FrameError
+
+TRANSPORT_JSON = 'json'
+TRANSPORT_BINARY = 'binary'
+TRANSPORT_MULTIPART = 'multipart'
+
+BINARY_CONTENT_TYPES = {'image/jpeg', 'image/jpg', 'image/png'}
+MULTIPART_CONTENT_TYPE = 'multipart/form-data'
+
+# Metadata carried outside the body for binary uploads
+DEVICE_ID_HEADER = 'x-device-id'
+TIMESTAMP_HEADER = 'x-timestamp'
+
+# Client-chosen key for de-duplicating retries, accepted on every transport
+IDEMPOTENCY_KEY_HEADER = 'idempotency-key'
+
+# Per-device frame counter used to order frames when timestamps are missing
+# or too coarse
+SEQUENCE_HEADER = 'x-sequence'
+
+# Device id of clients that send none; they are not one stream, so their
+# frames are never ordered against each other
+DEFAULT_DEVICE_ID = 'default'
+
+# Multipart field names
+METADATA_PART = 'metadata'
+FRAME_PART = 'frame'
+
+
+class FrameRequestError(ValueError):
+    """Raised when a request body cannot be parsed into a frame"""
+
+
+@dataclass
+class FrameRequest:
+    """A frame and its metadata, whichever transport it arrived over"""
+    frame: Optional[Frame]
+    device_id: str = DEFAULT_DEVICE_ID
+    timestamp: Optional[str] = None
+    transport: str = TRANSPORT_JSON
+    idempotency_key: Optional[str] = None
+    sequence: Optional[int] = None
+
+    def __post_init__(self):
+        # A NaN or infinite order compares as neither older nor newer than
+        # any other, which would make every later frame of the device stale
+        if is_non_finite(self.timestamp):
+            raise FrameRequestError(f"Invalid timestamp: {self.timestamp!r}")
+
+    def order(self) -> Optional[float]:
+        """
+        Position of the frame in its device's stream: sequence number, else
+        timestamp. None (not sequenced) for frames without a device id.
+        """
+        if self.device_id == DEFAULT_DEVICE_ID:
+            return None
+        if self.sequence is not None:
+            return float(self.sequence)
+        return parse_timestamp(self.timestamp)
+
+
+def is_non_finite(value: Any) -> bool:
+    """True for numeric values (or strings) that are NaN or infinite"""
+    try:
+        return not math.isfinite(float(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds from an ISO 8601 or numeric timestamp, or None"""
+    if value is None:
+        return None
+    try:
+        number = float(value)
+        if not math.isfinite(number):
+            return None
+        # Millisecond epochs (Date.now()) are far beyond any seconds value
+        return number / 1000.0 if number > 1e11 else number
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_sequence(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError, OverflowError):
+        raise FrameRequestError(f"Invalid sequence number: {value!r}")
+
+
+def split_content_type(value: str) -> Tuple[str, Dict[str, str]]:
+    """Split a Content-Type header into the media type and its parameters"""
+    media_type, _, rest = value.partition(';')
+    params = {}
+    for param in rest.split(';'):
+        name, _, param_value = param.strip().partition('=')
+        if name:
+            params[name.lower()] = param_value.strip().strip('"')
+    return media_type.strip().lower(), params
+
+
+def parse_multipart(body: bytes, boundary: str) -> Dict[str, Tuple[Dict[str, str], bytes]]:
+    """
+    Split a multipart/form-data body into {field name: (headers, content)}.
+
+    Only what the frame upload needs: named parts, no nested multiparts.
+    """
+    delimiter = b'--' + boundary.encode('latin-1')
+    parts = {}
+    for chunk in body.split(delimiter)[1:]:
+        if chunk.startswith(b'--'):
+            break  # closing delimiter
+
+        head, separator, content = chunk.partition(b'\r\n\r\n')
+        if not separator:
+            raise FrameRequestError("Malformed multipart part (missing header separator)")
+
+        headers = {}
+        for line in head.decode('latin-1').strip().split('\r\n'):
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        _, disposition = split_content_type(headers.get('content-disposition', ''))
+        name = disposition.get('name')
+        if name:
+            parts[name] = (headers, content[:-2] if content.endswith(b'\r\n') else content)
+    return parts
+
+
+def _lower_keys(mapping: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {key.lower(): value for key, value in (mapping or {}).items()}
+
+
+def _body_bytes(event: Dict[str, Any]) -> bytes:
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        try:
+            return base64.b64decode(body)
+        except (binascii.Error, ValueError) as e:
+            raise FrameRequestError(f"Invalid base64 request body: {e}")
+    return body.encode('latin-1') if isinstance(body, str) else body
+
+
+def _parse_json(event: Dict[str, Any], headers: Dict[str, Any]) -> FrameRequest:
+    if 'body' in event:
+        body = event['body']
+        if isinstance(body, str):
+            if event.get('isBase64Encoded'):
+                body = _body_bytes(event)
+            body = json.loads(body)
+    else:
+        # Direct invocations (IoT rule, tests) pass the payload as the event
+        body = event
+
+    frame_data = body.get('frame_data')
+    return FrameRequest(
+        frame=Frame.from_base64(frame_data) if frame_data else None,
+        device_id=body.get('device_id') or DEFAULT_DEVICE_ID,
+        timestamp=body.get('timestamp'),
+        transport=TRANSPORT_JSON,
+        idempotency_key=body.get('idempotency_key') or headers.get(IDEMPOTENCY_KEY_HEADER),
+        sequence=parse_sequence(body.get('sequence', headers.get(SEQUENCE_HEADER)))
+    )
+
+
+def _parse_binary(event: Dict[str, Any]) -> Optional[Frame]:
+    body = event.get('body')
+    if not body:
+        return None
+    if event.get('isBase64Encoded') and isinstance(body, str):
+        # API Gateway hands binary bodies over as base64; that is exactly the
+        # form the model request needs, so the image is never decoded here
+        return Frame.from_base64(body)
+    return Frame.from_bytes(_body_bytes(event))
+
+
+def _parse_multipart(event: Dict[str, Any], params: Dict[str, str]) -> Tuple[Optional[Frame], Dict[str, Any]]:
+    boundary = params.get('boundary')
+    if not boundary:
+        raise FrameRequestError("Multipart request without a boundary")
+
+    parts = parse_multipart(_body_bytes(event), boundary)
+
+    metadata: Dict[str, Any] = {}
+    if METADATA_PART in parts:
+        try:
+            metadata = json.loads(parts[METADATA_PART][1])
+        except ValueError as e:
+            raise FrameRequestError(f"Invalid metadata part: {e}")
+
+    frame_part = parts.get(FRAME_PART)
+    if frame_part is None:
+        # Accept the first image part whatever it is called
+        frame_part = next(
+            (part for part in parts.values()
+             if split_content_type(part[0].get('content-type', ''))[0] in BINARY_CONTENT_TYPES),
+            None
+        )
+    frame = Frame.from_bytes(frame_part[1]) if frame_part and frame_part[1] else None
+    return frame, metadata
+
+
+def parse_frame_request(event: Dict[str, Any]) -> FrameRequest:
+    """
+    Build a FrameRequest from an API Gateway proxy event or a direct payload.
+
+    JSON bodies carry everything in the body. For binary (`image/jpeg`,
+    `image/png`) and multipart uploads, `device_id` and `timestamp` come from
+    the multipart metadata part, then the X-Device-Id / X-Timestamp headers,
+    then the query string.
+    """
+    headers = _lower_keys(event.get('headers'))
+    media_type, params = split_content_type(headers.get('content-type', 'application/json'))
+
+    try:
+        if media_type in BINARY_CONTENT_TYPES:
+            frame, metadata, transport = _parse_binary(event), {}, TRANSPORT_BINARY
+        elif media_type == MULTIPART_CONTENT_TYPE:
+            frame, metadata = _parse_multipart(event, params)
+            transport = TRANSPORT_MULTIPART
+        else:
+            return _parse_json(event, headers)
+    except FrameError as e:
+        raise FrameRequestError(str(e))
+
+    query = event.get('queryStringParameters') or {}
+    return FrameRequest(
+        frame=frame,
+        device_id=metadata.get('device_id') or headers.get(DEVICE_ID_HEADER) or query.get('device_id') or DEFAULT_DEVICE_ID,
+        timestamp=metadata.get('timestamp') or headers.get(TIMESTAMP_HEADER) or query.get('timestamp'),
+        transport=transport,
+        idempotency_key=metadata.get('idempotency_key') or headers.get(IDEMPOTENCY_KEY_HEADER),
+        sequence=parse_sequence(metadata.get('sequence', headers.get(SEQUENCE_HEADER, query.get('sequence'))))
+    )
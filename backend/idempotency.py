@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Idempotency keys: replay stored responses for retried requests and make
+concurrent duplicates wait for the original instead of calling the model again
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# How long a completed response is replayed for
+DEFAULT_TTL_SECONDS = 300.0
+
+# How long an in-flight claim blocks duplicates before it is considered abandoned
+DEFAULT_LEASE_SECONDS = 30.0
+
+# Poll interval for stores that cannot signal completion
+POLL_INTERVAL_SECONDS = 0.05
+
+STATE_IN_PROGRESS = 'in_progress'
+STATE_DONE = 'done'
+
+
+class IdempotencyStore(ABC):
+    """
+    Interface for idempotency records.
+
+    A record is {'state', 'expires_at'} plus 'response' once done. claim()
+    must be atomic: exactly one caller wins for a key that has no live record.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def claim(self, key: str, lease_seconds: float) -> bool:
+        ...
+
+    @abstractmethod
+    def complete(self, key: str, response: Dict[str, Any], ttl_seconds: float) -> None:
+        ...
+
+    @abstractmethod
+    def release(self, key: str) -> None:
+        ...
+
+    def wait(self, key: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait until the key's record is no longer in progress; returns the final record"""
+        give_up_at = time.monotonic() + timeout
+        while True:
+            record = self.get(key)
+            if record is None or record['state'] != STATE_IN_PROGRESS:
+                return record
+            if time.monotonic() >= give_up_at:
+                return record
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Bounded in-process store; waiting duplicates are woken on completion"""
+
+    def __init__(self, max_entries: int = 1024, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._records: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._changed = threading.Condition()
+
+    def _live(self, key: str) -> Optional[Dict[str, Any]]:
+        record = self._records.get(key)
+        if record is not None and record['expires_at'] <= self.clock():
+            del self._records[key]
+            return None
+        return record
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._changed:
+            return self._live(key)
+
+    def claim(self, key: str, lease_seconds: float) -> bool:
+        with self._changed:
+            if self._live(key) is not None:
+                return False
+            self._store(key, {'state': STATE_IN_PROGRESS, 'expires_at': self.clock() + lease_seconds})
+            return True
+
+    def complete(self, key: str, response: Dict[str, Any], ttl_seconds: float) -> None:
+        with self._changed:
+            self._store(key, {'state': STATE_DONE, 'response': response,
+                              'expires_at': self.clock() + ttl_seconds})
+            self._changed.notify_all()
+
+    def release(self, key: str) -> None:
+        with self._changed:
+            self._records.pop(key, None)
+            self._changed.notify_all()
+
+    def _store(self, key: str, record: Dict[str, Any]) -> None:
+        self._records[key] = record
+        self._records.move_to_end(key)
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+
+    def wait(self, key: str, timeout: float) -> Optional[Dict[str, Any]]:
+        give_up_at = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                record = self._live(key)
+                remaining = give_up_at - time.monotonic()
+                if record is None or record['state'] != STATE_IN_PROGRESS or remaining <= 0:
+                    return record
+                self._changed.wait(timeout=remaining)
+
+
+class FileIdempotencyStore(IdempotencyStore):
+    """
+    One small JSON file per key in a directory, shared by every process that
+    can see it (workers on one host, or invocations of a Lambda container
+    using /tmp). Claims use exclusive file creation.
+    """
+
+    def __init__(self, directory: str, clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.clock = clock
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r', encoding='utf-8') as source:
+                return json.load(source)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # Claim file still being written
+            return {'state': STATE_IN_PROGRESS, 'expires_at': self.clock() + POLL_INTERVAL_SECONDS}
+
+    def _write(self, path: str, record: Dict[str, Any]) -> None:
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as target:
+            json.dump(record, target, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        record = self._read(path)
+        if record is not None and record['expires_at'] <= self.clock():
+            self._remove(path)
+            return None
+        return record
+
+    def claim(self, key: str, lease_seconds: float) -> bool:
+        path = self._path(key)
+        for _ in range(2):
+            try:
+                descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self.get(key) is not None:
+                    return False
+                continue  # expired record removed, try again
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as target:
+                json.dump({'state': STATE_IN_PROGRESS, 'expires_at': self.clock() + lease_seconds}, target)
+            return True
+        return False
+
+    def complete(self, key: str, response: Dict[str, Any], ttl_seconds: float) -> None:
+        self._write(self._path(key), {'state': STATE_DONE, 'response': response,
+                                      'expires_at': self.clock() + ttl_seconds})
+
+    def release(self, key: str) -> None:
+        self._remove(self._path(key))
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def purge_expired(self) -> int:
+        """Delete expired records and return how many were removed"""
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            record = self._read(path) if name.endswith('.json') else None
+            if record is not None and record['expires_at'] <= self.clock():
+                self._remove(path)
+                removed += 1
+        return removed
+
+
+class IdempotencyManager:
+    """Runs a request at most once per key while its record is live"""
+
+    def __init__(self, store: IdempotencyStore, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.replayed = 0
+        self.waited = 0
+        self.wait_timeouts = 0
+
+    def _increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def run(self, key: str, handler: Callable[[], Tuple[Dict[str, Any], bool]],
+            wait_timeout: float = DEFAULT_LEASE_SECONDS) -> Tuple[Dict[str, Any], bool]:
+        """
+        Return (response, replayed) for key.
+
+        `handler` returns (response, cacheable); only cacheable responses are
+        stored, so failed requests are executed again when retried. A
+        duplicate that arrives while the original is in flight waits up to
+        wait_timeout for it, then executes on its own.
+        """
+        while True:
+            record = self.store.get(key)
+            if record is not None and record['state'] == STATE_IN_PROGRESS:
+                self._increment('waited')
+                record = self.store.wait(key, wait_timeout)
+                if record is not None and record['state'] == STATE_IN_PROGRESS:
+                    self._increment('wait_timeouts')
+                    logger.warning(f"Timed out waiting for in-flight request {key}; processing it again")
+                    response, _ = self._execute(handler)
+                    return response, False
+
+            if record is not None and record['state'] == STATE_DONE:
+                self._increment('replayed')
+                return record['response'], True
+
+            if self.store.claim(key, self.lease_seconds):
+                break
+            # Lost the race to another duplicate; wait for it instead
+
+        try:
+            response, cacheable = self._execute(handler)
+        except Exception:
+            self.store.release(key)
+            raise
+
+        if cacheable:
+            self.store.complete(key, response, self.ttl_seconds)
+        else:
+            self.store.release(key)
+        return response, False
+
+    def _execute(self, handler: Callable[[], Tuple[Dict[str, Any], bool]]) -> Tuple[Dict[str, Any], bool]:
+        self._increment('executed')
+        return handler()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'store': type(self.store).__name__,
+                'executed': self.executed,
+                'replayed': self.replayed,
+                'waited': self.waited,
+                'wait_timeouts': self.wait_timeouts
+            }
+
+
+def request_key(device_id: str, timestamp: Optional[str], explicit_key: Optional[str] = None) -> Optional[str]:
+    """Idempotency key for a request: the client's key, else device_id plus timestamp"""
+    if explicit_key:
+        return f"{device_id}:key:{explicit_key}"
+    if timestamp:
+        return f"{device_id}:ts:{timestamp}"
+    return None
+
+
+def create_store() -> IdempotencyStore:
+    """Store selected by IDEMPOTENCY_STORE (memory or file)"""
+    if os.environ.get('IDEMPOTENCY_STORE', 'memory').lower() == 'file':
+        return FileIdempotencyStore(os.environ.get('IDEMPOTENCY_DIR', '/tmp/idempotency'))
+    return MemoryIdempotencyStore()
+
+
+# Global manager shared by all handlers in the container
+idempotency = IdempotencyManager(
+    create_store(),
+    ttl_seconds=float(os.environ.get('IDEMPOTENCY_TTL_SECONDS', DEFAULT_TTL_SECONDS))
+)
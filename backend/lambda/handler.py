@@ -1,61 +1,70 @@
 import json
-import boto3
-import base64
-import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union, Tuple
 import logging
 
+# Shared modules are bundled next to the handler in the deployment artifact
+from bedrock_prompts import (
+    get_response_format, get_generation_params, get_prompt, parse_response
+)
+from bedrock_gateway import gateway
+from deadline import RequestDeadline, start_request
+from frame import Frame, FrameError
+from frame_request import parse_frame_request, FrameRequestError
+from result_store import result_store, register_flush_extension, flush_after_invocation
+from idempotency import idempotency, request_key
+from rate_control import with_rate_hint
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-bedrock_client = boto3.client('bedrock-runtime', region_name=os.environ.get('BEDROCK_REGION', 'us-east-1'))
-s3_client = boto3.client('s3')
+# Flush buffered results after the response is sent, before the sandbox freezes
+register_flush_extension(result_store)
+
 
+@flush_after_invocation
 def process_sign(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Process sign language video frames using Amazon Bedrock
     """
+    deadline = start_request(context)
+    
     try:
-        # Parse the incoming event
-        if 'body' in event:
-            body = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
-        else:
-            body = event
+        # Parse the incoming event (base64 JSON, binary image or multipart)
+        try:
+            request = parse_frame_request(event)
+        except FrameRequestError as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': str(e)})
+            }
         
-        # Extract video frame data
-        frame_data = body.get('frame_data')
-        timestamp = body.get('timestamp')
-        device_id = body.get('device_id', 'default')
+        # The Frame is shared by every later stage
+        frame = request.frame
+        timestamp = request.timestamp
+        device_id = request.device_id
         
-        if not frame_data:
+        if frame is None:
             return {
                 'statusCode': 400,
                 'body': json.dumps({'error': 'No frame data provided'})
             }
         
-        # Process the frame with Bedrock
-        translation_result = process_frame_with_bedrock(frame_data)
-        
-        # Store result in S3 for historical analysis
-        store_result_in_s3(device_id, timestamp, translation_result)
-        
-        # Return the translation
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-            },
-            'body': json.dumps({
-                'translation': translation_result.get('text', ''),
-                'confidence': translation_result.get('confidence', 0.0),
-                'timestamp': timestamp,
-                'device_id': device_id
-            })
-        }
+        key = request_key(device_id, timestamp, request.idempotency_key)
+        if key is None:
+            response, _ = respond_to_frame(frame, device_id, timestamp, deadline)
+            return with_rate_hint(response)
+        
+        # Client retries with the same key get the stored response instead of
+        # another Bedrock call; concurrent duplicates wait for the original
+        response, replayed = idempotency.run(
+            key,
+            lambda: respond_to_frame(frame, device_id, timestamp, deadline),
+            wait_timeout=deadline.remaining()
+        )
+        if replayed:
+            response = {**response, 'headers': {**response['headers'], 'Idempotent-Replayed': 'true'}}
+        # Hints reflect load now, not when a replayed response was stored
+        return with_rate_hint(response)
         
     except Exception as e:
         logger.error(f"Error processing sign language frame: {str(e)}")
@@ -64,7 +73,40 @@ def process_sign(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': f'Processing error: {str(e)}'})
         }
 
-def process_frame_with_bedrock(frame_data: str) -> Dict[str, Any]:
+def respond_to_frame(frame: Frame, device_id: str, timestamp: Optional[str],
+                     deadline: RequestDeadline) -> Tuple[Dict[str, Any], bool]:
+    """
+    Translate a frame, store the result and build the API response.
+    
+    Also returns whether the response may be replayed for retries (failed
+    translations are not).
+    """
+    # Process the frame with Bedrock
+    translation_result = process_frame_with_bedrock(frame, device_id, deadline)
+    
+    # Store result in S3 for historical analysis
+    store_result_in_s3(device_id, timestamp, translation_result)
+    
+    # Return the translation
+    response = {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, Authorization, Idempotency-Key'
+        },
+        'body': json.dumps({
+            'translation': translation_result.get('text', ''),
+            'confidence': translation_result.get('confidence', 0.0),
+            'timestamp': timestamp,
+            'device_id': device_id
+        })
+    }
+    return response, 'error' not in translation_result
+
+def process_frame_with_bedrock(frame_data: Union[Frame, str], device_id: str = 'default',
+                               deadline: Optional[RequestDeadline] = None) -> Dict[str, Any]:
     """
     Use Amazon Bedrock to analyze video frame for sign language
     """
@@ -75,24 +117,26 @@ def process_frame_with_bedrock(frame_data: str) -> Dict[str, Any]:
             return {
                 "text": "No frame data provided",
                 "confidence": 0.0,
-                "description": "Empty frame data"
+                "description": "Empty frame data",
+                "error": "Empty frame data"
             }
         
-        # Check if frame data is valid base64
+        # Check the frame header without decoding the whole image
         try:
-            base64.b64decode(frame_data)
-            logger.info(f"Valid base64 frame data received, length: {len(frame_data)}")
-        except Exception as decode_error:
-            logger.error(f"Invalid base64 frame data: {decode_error}")
+            frame = Frame.coerce(frame_data).validate()
+            logger.info(f"Valid {frame.info.format} frame received, {frame.size_bytes} bytes")
+        except FrameError as decode_error:
+            logger.error(f"Invalid frame data: {decode_error}")
             return {
                 "text": "Invalid frame data format",
                 "confidence": 0.0,
-                "description": f"Base64 decode error: {decode_error}"
+                "description": f"Frame validation error: {decode_error}",
+                "error": str(decode_error)
             }
         # For now, we'll use Claude with vision capabilities
         # In production, you'd use a specialized computer vision model
         
-        prompt = """
+        json_prompt = """
         You are a sign language interpreter. Analyze this video frame and identify any American Sign Language (ASL) gestures or signs being performed. 
         
         Provide:
@@ -110,45 +154,28 @@ def process_frame_with_bedrock(frame_data: str) -> Dict[str, Any]:
         }
         """
         
-        # Prepare the request for Bedrock
-        request_body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 200,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": frame_data
-                            }
-                        }
-                    ]
-                }
-            ]
-        }
+        response_format = get_response_format()
+        prompt = get_prompt(json_prompt, response_format)
         
-        # Call Bedrock with Claude 3.5 Sonnet (v1 has better availability)
-        response = bedrock_client.invoke_model(
-            modelId="anthropic.claude-3-5-sonnet-20240620-v1:0",
-            body=json.dumps(request_body)
+        # Call Bedrock through the shared gateway
+        reply = gateway.complete(
+            prompt, frame, get_generation_params(response_format, 200),
+            fallback_key=device_id,
+            deadline=deadline
         )
+        content = reply.text
         
-        # Parse response
-        response_body = json.loads(response['body'].read())
-        content = response_body['content'][0]['text']
-        
-        # Try to parse as JSON, fallback to text extraction
+        # Try to parse in the requested format, fallback to text extraction
         try:
-            result = json.loads(content)
-        except json.JSONDecodeError:
+            result = parse_response(content, response_format)
+            if 'translation' in result and 'text' not in result:
+                # Compact responses use the shared field names
+                result = {
+                    "text": result['translation'],
+                    "confidence": result['confidence'],
+                    "description": "Hand detected" if result.get('hand_detected') else "No hand detected"
+                }
+        except ValueError:
             # Fallback parsing
             result = {
                 "text": content[:100],  # First 100 chars
@@ -166,33 +193,25 @@ def process_frame_with_bedrock(frame_data: str) -> Dict[str, Any]:
         return {
             "text": f"Bedrock API error: {str(e)}",
             "confidence": 0.0,
-            "description": f"Processing error: {str(e)}"
+            "description": f"Processing error: {str(e)}",
+            "error": str(e)
         }
 
 def store_result_in_s3(device_id: str, timestamp: str, result: Dict[str, Any]) -> None:
     """
-    Store processing result in S3 for historical analysis
+    Buffer processing result for batched storage in S3 for historical analysis
     """
     try:
-        bucket_name = os.environ.get('DATA_BUCKET')
-        if not bucket_name:
+        if not result_store.enabled:
             logger.warning("No S3 bucket configured, skipping storage")
             return
         
-        key = f"results/{device_id}/{timestamp}.json"
-        
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=key,
-            Body=json.dumps(result),
-            ContentType='application/json'
-        )
-        
-        logger.info(f"Stored result in S3: {bucket_name}/{key}")
+        result_store.put(device_id, {**result, 'timestamp': timestamp, 'device_id': device_id})
         
     except Exception as e:
         logger.error(f"Error storing result in S3: {str(e)}")
 
+@flush_after_invocation
 def websocket_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Handle WebSocket connections for real-time communication
@@ -207,7 +226,7 @@ def websocket_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         elif route_key == 'process_frame':
             # Process frame data received via WebSocket
             body = json.loads(event.get('body', '{}'))
-            result = process_frame_with_bedrock(body.get('frame_data', ''))
+            result = process_frame_with_bedrock(body.get('frame_data', ''), deadline=start_request(context))
             
             # Send result back via WebSocket
             # Implementation would require API Gateway Management API
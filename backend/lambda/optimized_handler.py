@@ -1,84 +1,230 @@
 import json
-import boto3
-import base64
-import os
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union, Tuple
 import logging
 
-# Import our optimization modules
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from processing_optimizer import pipeline
+# Optimization modules are bundled next to the handler in the deployment artifact
+from processing_optimizer import pipeline, MAX_BATCH_FRAMES
+from bedrock_prompts import (
+    get_response_format, get_generation_params, parse_response
+)
+from bedrock_gateway import gateway
+from deadline import RequestDeadline, start_request
+from frame import Frame
+from frame_request import parse_frame_request, FrameRequestError
+from result_store import result_store, register_flush_extension, flush_after_invocation
+from idempotency import idempotency, request_key
+from rate_control import with_rate_hint
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-bedrock_client = boto3.client('bedrock-runtime', region_name=os.environ.get('BEDROCK_REGION', 'us-east-1'))
-s3_client = boto3.client('s3')
+# Flush buffered results after the response is sent, before the sandbox freezes
+register_flush_extension(result_store)
 
+
+@flush_after_invocation
 def process_sign_optimized(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Optimized sign language processing with caching and rate limiting
     """
     start_time = time.time()
+    deadline = start_request(context)
     
     try:
-        # Parse the incoming event
-        if 'body' in event:
-            body = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
-        else:
-            body = event
+        # Parse the incoming event (base64 JSON, binary image or multipart)
+        try:
+            request = parse_frame_request(event)
+        except FrameRequestError as e:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': str(e)})
+            }
         
-        # Extract request data
-        frame_data = body.get('frame_data')
-        timestamp = body.get('timestamp')
-        device_id = body.get('device_id', 'default')
+        frame = request.frame
+        timestamp = request.timestamp
+        device_id = request.device_id
         
-        if not frame_data:
+        if frame is None:
             return {
                 'statusCode': 400,
                 'headers': get_cors_headers(),
                 'body': json.dumps({'error': 'No frame data provided'})
             }
         
+        key = request_key(device_id, timestamp, request.idempotency_key)
+        if key is None:
+            response, _ = respond_to_frame(frame, device_id, timestamp, deadline, start_time, request.order())
+            return with_rate_hint(response)
+        
+        # Client retries with the same key get the stored response instead of
+        # another Bedrock call; concurrent duplicates wait for the original
+        response, replayed = idempotency.run(
+            key,
+            lambda: respond_to_frame(frame, device_id, timestamp, deadline, start_time, request.order()),
+            wait_timeout=deadline.remaining()
+        )
+        if replayed:
+            response = {**response, 'headers': {**response['headers'], 'Idempotent-Replayed': 'true'}}
+        # Hints reflect load now, not when a replayed response was stored
+        return with_rate_hint(response)
+        
+    except Exception as e:
+        logger.error(f"Error in optimized processing: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'error': f'Processing error: {str(e)}',
+                'latency': time.time() - start_time
+            })
+        }
+
+def respond_to_frame(frame: Frame, device_id: str, timestamp: Optional[str],
+                     deadline: RequestDeadline, start_time: float,
+                     order: Optional[float] = None) -> Tuple[Dict[str, Any], bool]:
+    """
+    Run a frame through the pipeline and Bedrock, store it and build the response.
+    
+    Also returns whether the response may be replayed for retries (errors,
+    rate limiting and degraded fallbacks are not).
+    """
+    # Latest wins: a frame older than one already in progress for the device
+    # is answered with the newer result (or dropped) instead of processed
+    stale_result = pipeline.sequencer.begin(device_id, order)
+    if stale_result is not None:
+        result = stale_result
+    else:
         # Use optimized processing pipeline
-        result = pipeline.process_with_cache(frame_data, device_id)
+        result = pipeline.process_with_cache(frame, device_id)
         
-        # If not a cached result, process with Bedrock
-        if not result.get('cache_hit', False) and result.get('translation') == 'Sample sign detected':
-            bedrock_result = process_with_bedrock(frame_data)
+        # The cache only holds model results; anything else that is not a
+        # cache hit (the pipeline's placeholder) goes to Bedrock
+        from_model = result.get('cache_hit', False)
+        if not from_model and result.get('translation') == 'Sample sign detected':
+            bedrock_result = process_with_bedrock(frame, device_id, deadline)
             result.update(bedrock_result)
+            pipeline.cache_result(frame, result)
+            from_model = True
         
-        # Store result in S3 for analytics
-        store_result_in_s3(device_id, timestamp, result)
+        # Only model answers may later stand in for this device's stale frames
+        if from_model:
+            pipeline.sequencer.complete(device_id, order, result)
         
-        # Add performance metrics
-        result.update({
+        # Store result in S3 for analytics
+        store_result_in_s3(device_id, timestamp, result, deadline)
+    
+    # Add performance metrics
+    result.update({
+        'timestamp': timestamp,
+        'device_id': device_id,
+        'total_latency': time.time() - start_time
+    })
+    if deadline.allow_optional('performance_stats'):
+        result['performance_stats'] = pipeline.get_performance_stats()
+    
+    response = {
+        'statusCode': 200,
+        'headers': get_cors_headers(),
+        'body': json.dumps({
+            'translation': result.get('translation', 'Processing error'),
+            'confidence': result.get('confidence', 0.0),
             'timestamp': timestamp,
             'device_id': device_id,
-            'total_latency': time.time() - start_time,
-            'performance_stats': pipeline.get_performance_stats()
+            'latency': result.get('total_latency', 0),
+            'cache_hit': result.get('cache_hit', False),
+            'hand_detected': result.get('hand_detected', False),
+            'degraded': result.get('degraded', False),
+            'stale': result.get('stale', False)
         })
+    }
+    return response, not result.get('error') and not result.get('degraded')
+
+@flush_after_invocation
+def process_batch(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Process an ordered batch of frames from one device in a single request
+    """
+    start_time = time.time()
+    deadline = start_request(context)
+    
+    try:
+        # Parse the incoming event
+        if 'body' in event:
+            body = json.loads(event['body']) if isinstance(event['body'], str) else event['body']
+        else:
+            body = event
         
-        return {
+        device_id = body.get('device_id', 'default')
+        items = body.get('frames') or []
+        
+        if not isinstance(items, list):
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'frames must be a list'})
+            }
+        
+        if not items:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'No frames provided'})
+            }
+        
+        if len(items) > MAX_BATCH_FRAMES:
+            return {
+                'statusCode': 413,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': f'Batch exceeds {MAX_BATCH_FRAMES} frames'})
+            }
+        
+        # Entries that are not objects get a per-frame error, not a failed batch
+        items = [item if isinstance(item, dict) else {} for item in items]
+        
+        # Cache and rate limit checks run in bulk; misses share the worker pool
+        results = pipeline.process_batch(
+            [item.get('frame_data') or '' for item in items],
+            lambda frame, metadata: process_with_bedrock(frame, device_id, deadline),
+            client_id=device_id
+        )
+        
+        frame_results = []
+        for index, (item, result) in enumerate(zip(items, results)):
+            timestamp = item.get('timestamp')
+            if result['status'] == 'ok':
+                store_result_in_s3(device_id, timestamp, result, deadline)
+            
+            frame_result = {
+                'index': index,
+                'timestamp': timestamp,
+                'status': result['status'],
+                'translation': result.get('translation', 'Processing error'),
+                'confidence': result.get('confidence', 0.0),
+                'hand_detected': result.get('hand_detected', False),
+                'cache_hit': result.get('cache_hit', False),
+                'degraded': result.get('degraded', False)
+            }
+            if 'error' in result:
+                frame_result['error'] = result['error']
+            frame_results.append(frame_result)
+        
+        succeeded = sum(1 for result in frame_results if result['status'] == 'ok')
+        return with_rate_hint({
             'statusCode': 200,
             'headers': get_cors_headers(),
             'body': json.dumps({
-                'translation': result.get('translation', 'Processing error'),
-                'confidence': result.get('confidence', 0.0),
-                'timestamp': timestamp,
                 'device_id': device_id,
-                'latency': result.get('total_latency', 0),
-                'cache_hit': result.get('cache_hit', False),
-                'hand_detected': result.get('hand_detected', False)
+                'results': frame_results,
+                'succeeded': succeeded,
+                'failed': len(frame_results) - succeeded,
+                'latency': time.time() - start_time
             })
-        }
+        })
         
     except Exception as e:
-        logger.error(f"Error in optimized processing: {str(e)}")
+        logger.error(f"Error in batch processing: {str(e)}")
         return {
             'statusCode': 500,
             'headers': get_cors_headers(),
@@ -88,52 +234,33 @@ def process_sign_optimized(event: Dict[str, Any], context: Any) -> Dict[str, Any
             })
         }
 
-def process_with_bedrock(frame_data: str) -> Dict[str, Any]:
+def process_with_bedrock(frame_data: Union[Frame, str], device_id: str = 'default',
+                         deadline: Optional[RequestDeadline] = None) -> Dict[str, Any]:
     """
     Process frame with Bedrock using optimized prompt
     """
     try:
-        # Get optimized prompt
-        prompt = pipeline.optimize_prompt({'estimated_size_bytes': len(frame_data) * 3 // 4})
-        
-        request_body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 200,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": frame_data
-                            }
-                        }
-                    ]
-                }
-            ]
-        }
+        frame = Frame.coerce(frame_data)
         
-        # Call Bedrock
-        response = bedrock_client.invoke_model(
-            modelId="anthropic.claude-3-5-sonnet-20240620-v1:0",
-            body=json.dumps(request_body)
+        # Get optimized prompt for the deployment's response format
+        response_format = get_response_format()
+        prompt = pipeline.optimize_prompt(
+            {'estimated_size_bytes': frame.size_bytes},
+            response_format
         )
         
-        # Parse response
-        response_body = json.loads(response['body'].read())
-        content = response_body['content'][0]['text']
+        # Call Bedrock through the shared gateway
+        reply = gateway.complete(
+            prompt, frame, get_generation_params(response_format, 200),
+            fallback_key=device_id,
+            deadline=deadline
+        )
+        content = reply.text
         
-        # Try to parse as JSON
+        # Try to parse in the requested format
         try:
-            bedrock_result = json.loads(content)
-        except json.JSONDecodeError:
+            bedrock_result = parse_response(content, response_format)
+        except ValueError:
             # Fallback parsing
             bedrock_result = {
                 "translation": content[:100],
@@ -141,6 +268,7 @@ def process_with_bedrock(frame_data: str) -> Dict[str, Any]:
                 "hand_detected": "hand" in content.lower()
             }
         
+        bedrock_result['degraded'] = reply.degraded
         return bedrock_result
         
     except Exception as e:
@@ -152,30 +280,23 @@ def process_with_bedrock(frame_data: str) -> Dict[str, Any]:
             "error": str(e)
         }
 
-def store_result_in_s3(device_id: str, timestamp: str, result: Dict[str, Any]) -> None:
+def store_result_in_s3(device_id: str, timestamp: str, result: Dict[str, Any],
+                       deadline: Optional[RequestDeadline] = None) -> None:
     """
-    Store processing result in S3 with performance metrics
+    Buffer processing result with performance metrics for batched S3 storage
     """
     try:
-        bucket_name = os.environ.get('DATA_BUCKET')
-        if not bucket_name:
-            return
-        
         # Create enriched result for storage
         storage_result = {
             **result,
-            'stored_at': time.time(),
-            'performance_stats': pipeline.get_performance_stats()
+            'timestamp': timestamp,
+            'device_id': device_id,
+            'stored_at': time.time()
         }
+        if deadline is None or deadline.allow_optional('performance_stats'):
+            storage_result['performance_stats'] = pipeline.get_performance_stats()
         
-        key = f"results/{device_id}/{timestamp}.json"
-        
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=key,
-            Body=json.dumps(storage_result, default=str),
-            ContentType='application/json'
-        )
+        result_store.put(device_id, storage_result)
         
     except Exception as e:
         logger.error(f"S3 storage error: {str(e)}")
@@ -186,9 +307,10 @@ def get_cors_headers() -> Dict[str, str]:
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Methods': 'POST, OPTIONS',
-        'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization, Idempotency-Key'
     }
 
+@flush_after_invocation
 def get_performance_metrics(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Endpoint to get current performance metrics
@@ -214,5 +336,6 @@ def get_performance_metrics(event: Dict[str, Any], context: Any) -> Dict[str, An
         }
 
 # Main handler - delegate to optimized version
+@flush_after_invocation
 def process_sign(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     return process_sign_optimized(event, context)
\ No newline at end of file
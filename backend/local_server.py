@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+"""
+Standalone asyncio server for on-prem deployments without Lambda or API Gateway
+
+Serves the REST routes (POST /process, POST /process/batch, GET /metrics) and
+the WebSocket API (GET /ws) by building API-Gateway-shaped events and calling
+the existing Lambda handlers on a bounded worker pool. WebSocket replies
+posted through the Management API client are written straight to the open
+sockets. SIGTERM/SIGINT stop accepting connections, let in-flight requests
+finish, close WebSockets and flush buffered results before exiting.
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import signal
+import struct
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Dict, Any, Optional, Callable, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# The Lambda handlers import the shared modules as top-level modules, as in the artifact
+if BACKEND_DIR not in sys.path:
+    sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.join(BACKEND_DIR, 'lambda'))
+import handler
+import optimized_handler
+import websocket_handler
+from bedrock_gateway import gateway, Endpoint
+from frame_request import BINARY_CONTENT_TYPES, MULTIPART_CONTENT_TYPE, split_content_type
+from result_store import result_store
+from websocket_delivery import delivery
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 8
+
+# API Gateway's integration timeout, handed to handlers as the remaining time
+DEFAULT_REQUEST_TIMEOUT = 29.0
+
+DEFAULT_DRAIN_SECONDS = 30.0
+
+# API Gateway limits: 10 MB REST payloads, 128 KB WebSocket messages (frames
+# are allowed more here since on-prem cameras may send full-size JPEGs)
+MAX_BODY_BYTES = 10 * 1024 * 1024
+MAX_MESSAGE_BYTES = 1024 * 1024
+
+STAGE = 'local'
+WEBSOCKET_PATH = '/ws'
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+WEBSOCKET_ROUTES = {'process_frame', 'subscribe', 'unsubscribe'}
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_TOO_BIG = 1009
+
+
+class WebSocketProtocolError(Exception):
+    """Raised on a malformed or oversized WebSocket frame; carries the close code"""
+
+    def __init__(self, message: str, code: int = CLOSE_PROTOCOL_ERROR):
+        super().__init__(message)
+        self.code = code
+
+
+class GoneError(Exception):
+    """Mimics the Management API's GoneException (error code under response['Error'])"""
+
+    def __init__(self, connection_id: str):
+        super().__init__(f"Connection {connection_id} is gone")
+        self.response = {'Error': {'Code': 'GoneException', 'Message': 'Gone'}}
+
+
+def apply_mask(payload: bytes, mask: bytes) -> bytes:
+    """XOR a payload with a 4-byte WebSocket mask"""
+    if not payload:
+        return payload
+    length = len(payload)
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(length, 'big')
+
+
+def encode_ws_frame(opcode: int, payload: bytes, mask: Optional[bytes] = None) -> bytes:
+    """One final WebSocket frame; clients must pass a mask, servers must not"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('>BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack('>BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('>BBQ', 0x80 | opcode, 127, length)
+    if mask is None:
+        return header + payload
+    return header[:1] + bytes([header[1] | 0x80]) + header[2:] + mask + apply_mask(payload, mask)
+
+
+async def read_ws_frame(reader: asyncio.StreamReader) -> Tuple[bool, int, bytes]:
+    """Read one frame and return (fin, opcode, unmasked payload)"""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack('>H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('>Q', await reader.readexactly(8))[0]
+    if length > MAX_MESSAGE_BYTES:
+        raise WebSocketProtocolError(f"Frame of {length} bytes exceeds the message limit", CLOSE_TOO_BIG)
+
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    return bool(first & 0x80), first & 0x0F, apply_mask(payload, mask) if mask else payload
+
+
+def websocket_accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+
+
+class InvocationContext:
+    """The parts of the Lambda context object the handlers use"""
+
+    def __init__(self, timeout: float):
+        self.aws_request_id = str(uuid.uuid4())
+        self.function_name = 'signbridge-local'
+        self._expires_at = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int(max(0.0, self._expires_at - time.monotonic()) * 1000)
+
+
+class WebSocketConnection:
+    """An accepted WebSocket; sends are serialized, reads happen on one task"""
+
+    def __init__(self, connection_id: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connection_id = connection_id
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, data: bytes, opcode: Optional[int] = None) -> None:
+        if self.closed:
+            raise GoneError(self.connection_id)
+        if opcode is None:
+            # The Management API delivers UTF-8 data as text frames
+            try:
+                data.decode('utf-8')
+                opcode = OP_TEXT
+            except UnicodeDecodeError:
+                opcode = OP_BINARY
+        async with self._send_lock:
+            self.writer.write(encode_ws_frame(opcode, data))
+            await self.writer.drain()
+
+    async def receive(self) -> Optional[Tuple[int, bytes]]:
+        """Next complete data message as (opcode, payload), or None once closed"""
+        message_opcode, parts, size = None, [], 0
+        while True:
+            fin, opcode, payload = await read_ws_frame(self.reader)
+            if opcode == OP_CLOSE:
+                await self.close(CLOSE_NORMAL)
+                return None
+            if opcode == OP_PING:
+                await self.send(payload, OP_PONG)
+                continue
+            if opcode == OP_PONG:
+                continue
+
+            if opcode == OP_CONTINUATION:
+                if message_opcode is None:
+                    raise WebSocketProtocolError("Continuation frame without a message")
+            elif message_opcode is not None:
+                raise WebSocketProtocolError("New message before the previous one finished")
+            else:
+                message_opcode = opcode
+
+            size += len(payload)
+            if size > MAX_MESSAGE_BYTES:
+                raise WebSocketProtocolError("Message exceeds the size limit", CLOSE_TOO_BIG)
+            parts.append(payload)
+            if fin:
+                return message_opcode, b''.join(parts)
+
+    async def close(self, code: int = CLOSE_NORMAL, reason: str = '') -> None:
+        if self.closed:
+            return
+        try:
+            await self.send(struct.pack('>H', code) + reason.encode('utf-8'), OP_CLOSE)
+        except (ConnectionError, GoneError):
+            pass
+        self.closed = True
+        self.writer.close()
+
+
+class LocalManagementClient:
+    """Stands in for the apigatewaymanagementapi client by writing to the server's sockets"""
+
+    def __init__(self, server: 'LocalServer', send_timeout: float = 5.0):
+        self.server = server
+        self.send_timeout = send_timeout
+
+    def post_to_connection(self, ConnectionId: str, Data: bytes) -> None:
+        connection = self.server.websockets.get(ConnectionId)
+        if connection is None or connection.closed:
+            raise GoneError(ConnectionId)
+        future = asyncio.run_coroutine_threadsafe(connection.send(bytes(Data)), self.server.loop)
+        try:
+            future.result(timeout=self.send_timeout)
+        except ConnectionError:
+            raise GoneError(ConnectionId)
+
+
+class LocalServer:
+    """HTTP/1.1 and WebSocket front end for the Lambda handlers"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 workers: int = DEFAULT_WORKERS, request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+                 drain_seconds: float = DEFAULT_DRAIN_SECONDS,
+                 process_handler: Callable = handler.process_sign):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.request_timeout = request_timeout
+        self.drain_seconds = drain_seconds
+        self.routes: Dict[Tuple[str, str], Callable] = {
+            ('POST', '/process'): process_handler,
+            ('POST', '/process/batch'): optimized_handler.process_batch,
+            ('GET', '/metrics'): optimized_handler.get_performance_metrics,
+        }
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='handler')
+        self.websockets: Dict[str, WebSocketConnection] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.draining = False
+        self._clients: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self._stopped: Optional[asyncio.Event] = None
+
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.http_requests = 0
+        self.websocket_messages = 0
+        self.websocket_connections = 0
+
+    async def start(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        delivery.client_factory = lambda endpoint_url: LocalManagementClient(self)
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def invoke(self, lambda_handler: Callable, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a handler on the worker pool, as one Lambda invocation"""
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            response = await self.loop.run_in_executor(
+                self.executor, lambda_handler, event, InvocationContext(self.request_timeout)
+            )
+            return response or {'statusCode': 200}
+        finally:
+            self.in_flight -= 1
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients[writer] = asyncio.current_task()
+        try:
+            while not writer.is_closing():
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers = request
+                path = urlsplit(target).path
+                if path == WEBSOCKET_PATH and headers.get('upgrade', '').lower() == 'websocket':
+                    await self._serve_websocket(reader, writer, target, headers)
+                    break
+                if not await self._serve_http(reader, writer, method, target, headers):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Connection error: {e}")
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str]]]:
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            return None
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return method.upper(), target, headers
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: int, headers: Dict[str, str],
+                              body: bytes, keep_alive: bool) -> None:
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = ''
+        lines = [f"HTTP/1.1 {status} {reason}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()
+                  if name.lower() not in ('content-length', 'connection')]
+        lines += [f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    def _http_event(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Dict[str, Any]:
+        """REST API (v1) proxy event, encoding binary media types as API Gateway does"""
+        url = urlsplit(target)
+        media_type, _ = split_content_type(headers.get('content-type', ''))
+        binary = media_type in BINARY_CONTENT_TYPES or media_type == MULTIPART_CONTENT_TYPE
+        return {
+            'resource': url.path,
+            'path': url.path,
+            'httpMethod': method,
+            'headers': headers,
+            'queryStringParameters': dict(parse_qsl(url.query)) or None,
+            'body': base64.b64encode(body).decode('ascii') if binary else body.decode('utf-8', 'replace'),
+            'isBase64Encoded': binary,
+            'requestContext': {
+                'requestId': str(uuid.uuid4()),
+                'stage': STAGE,
+                'httpMethod': method,
+                'path': url.path
+            }
+        }
+
+    async def _serve_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                          method: str, target: str, headers: Dict[str, str]) -> bool:
+        """Serve one request; returns whether the connection stays open"""
+        if headers.get('transfer-encoding'):
+            await self._write_response(writer, 411, {}, b'', False)
+            return False
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY_BYTES:
+            await self._write_response(writer, 413, {}, b'', False)
+            return False
+        body = await reader.readexactly(length) if length else b''
+        keep_alive = headers.get('connection', '').lower() != 'close' and not self.draining
+        path = urlsplit(target).path
+        self.http_requests += 1
+
+        if path == '/health':
+            status = 503 if self.draining else 200
+            payload = {'status': 'draining' if self.draining else 'ok', 'in_flight': self.in_flight}
+            await self._write_response(writer, status, {'Content-Type': 'application/json'},
+                                       json.dumps(payload).encode('utf-8'), keep_alive)
+            return keep_alive
+
+        if self.draining:
+            await self._write_response(writer, 503, {'Retry-After': '1'}, b'', False)
+            return False
+
+        if method == 'OPTIONS':
+            await self._write_response(writer, 204, optimized_handler.get_cors_headers(), b'', keep_alive)
+            return keep_alive
+
+        route = self.routes.get((method, path))
+        if route is None:
+            await self._write_response(writer, 404, {'Content-Type': 'application/json'},
+                                       b'{"error": "Not found"}', keep_alive)
+            return keep_alive
+
+        response = await self.invoke(route, self._http_event(method, target, headers, body))
+        keep_alive = keep_alive and not self.draining
+        response_body = response.get('body') or ''
+        if response.get('isBase64Encoded'):
+            response_bytes = base64.b64decode(response_body)
+        else:
+            response_bytes = response_body.encode('utf-8')
+        await self._write_response(writer, response.get('statusCode', 200), response.get('headers') or {},
+                                   response_bytes, keep_alive)
+        return keep_alive
+
+    def _websocket_event(self, route_key: str, connection_id: str, host: str,
+                         body: Optional[str] = None, binary: bool = False,
+                         query: Optional[Dict[str, str]] = None,
+                         headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        event = {
+            'requestContext': {
+                'routeKey': route_key,
+                'connectionId': connection_id,
+                'domainName': host,
+                'stage': STAGE,
+                'requestId': str(uuid.uuid4()),
+                'eventType': {'$connect': 'CONNECT', '$disconnect': 'DISCONNECT'}.get(route_key, 'MESSAGE')
+            },
+            'isBase64Encoded': binary
+        }
+        if body is not None:
+            event['body'] = body
+        if query is not None:
+            event['queryStringParameters'] = query or None
+        if headers is not None:
+            event['headers'] = headers
+        return event
+
+    async def _serve_websocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                               target: str, headers: Dict[str, str]) -> None:
+        key = headers.get('sec-websocket-key')
+        if self.draining or not key:
+            await self._write_response(writer, 503 if self.draining else 400, {}, b'', False)
+            return
+
+        # $connect decides whether the upgrade is accepted, as on API Gateway
+        connection_id = base64.b64encode(os.urandom(12)).decode('ascii')
+        host = headers.get('host', self.host)
+        query = dict(parse_qsl(urlsplit(target).query))
+        response = await self.invoke(websocket_handler.lambda_handler, self._websocket_event(
+            '$connect', connection_id, host, query=query, headers=headers
+        ))
+        if response.get('statusCode', 200) != 200:
+            await self._write_response(writer, response['statusCode'], {}, b'', False)
+            return
+
+        writer.write((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n"
+        ).encode('ascii'))
+        await writer.drain()
+
+        connection = WebSocketConnection(connection_id, reader, writer)
+        self.websockets[connection_id] = connection
+        self.websocket_connections += 1
+        messages = set()
+        try:
+            while True:
+                try:
+                    message = await connection.receive()
+                except WebSocketProtocolError as e:
+                    await connection.close(e.code, str(e))
+                    break
+                if message is None:
+                    break
+
+                # Each message is its own invocation, so they run concurrently
+                self.websocket_messages += 1
+                task = asyncio.ensure_future(self.invoke(websocket_handler.lambda_handler,
+                                                         self._message_event(connection_id, host, *message)))
+                messages.add(task)
+                task.add_done_callback(messages.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            connection.closed = True
+            self.websockets.pop(connection_id, None)
+            if messages:
+                await asyncio.gather(*messages, return_exceptions=True)
+            await self.invoke(websocket_handler.lambda_handler,
+                              self._websocket_event('$disconnect', connection_id, host))
+
+    def _message_event(self, connection_id: str, host: str, opcode: int, payload: bytes) -> Dict[str, Any]:
+        """Select the route like API Gateway's $request.body.action expression"""
+        if opcode == OP_BINARY:
+            return self._websocket_event('$default', connection_id, host,
+                                         base64.b64encode(payload).decode('ascii'), binary=True)
+        body = payload.decode('utf-8', 'replace')
+        try:
+            action = json.loads(body).get('action')
+        except (ValueError, AttributeError):
+            action = None
+        route_key = action if action in WEBSOCKET_ROUTES else '$default'
+        return self._websocket_event(route_key, connection_id, host, body)
+
+    async def drain(self) -> Dict[str, Any]:
+        """Stop accepting work, finish in-flight invocations, close sockets and flush results"""
+        self.draining = True
+        self.server.close()
+
+        give_up_at = time.monotonic() + self.drain_seconds
+        while self.in_flight and time.monotonic() < give_up_at:
+            await asyncio.sleep(0.05)
+        unfinished = self.in_flight
+
+        for connection in list(self.websockets.values()):
+            await connection.close(CLOSE_GOING_AWAY, 'server shutting down')
+        for writer in list(self._clients):
+            writer.close()
+        pending = [task for task in self._clients.values() if task is not asyncio.current_task()]
+        if pending:
+            await asyncio.wait(pending, timeout=max(0.1, give_up_at - time.monotonic()))
+
+        await self.loop.run_in_executor(None, self.executor.shutdown, True)
+        flushed = await self.loop.run_in_executor(None, result_store.flush)
+        self._stopped.set()
+        return {'unfinished_invocations': unfinished, 'results_flushed': flushed}
+
+    async def serve_until_stopped(self) -> Dict[str, Any]:
+        """Serve until SIGTERM or SIGINT, then drain"""
+        stop = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.loop.add_signal_handler(signum, stop.set)
+        await stop.wait()
+        return await self.drain()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'http_requests': self.http_requests,
+            'websocket_connections': self.websocket_connections,
+            'open_websockets': len(self.websockets),
+            'websocket_messages': self.websocket_messages,
+            'delivery': delivery.get_stats()
+        }
+
+
+def use_fake_model(latency_ms: float) -> None:
+    """Point the shared gateway at an in-process fake Bedrock endpoint"""
+    from fake_bedrock import FakeBedrockClient, LatencyProfile
+    profile = LatencyProfile(latency=latency_ms / 1000, jitter=latency_ms / 10000)
+    gateway.endpoints[:] = [Endpoint('fake', client=FakeBedrockClient(profile))]
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    process_handler = optimized_handler.process_sign_optimized if args.optimized else handler.process_sign
+    server = LocalServer(args.host, args.port, args.workers, args.request_timeout,
+                         args.drain_seconds, process_handler)
+    await server.start()
+    print(f"🚀 SignBridge server listening on http://{args.host}:{server.port} "
+          f"(WebSocket: ws://{args.host}:{server.port}{WEBSOCKET_PATH}, {args.workers} workers)")
+    summary = await server.serve_until_stopped()
+    return {**summary, **server.get_stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get('SERVER_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('SERVER_PORT', DEFAULT_PORT)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SERVER_WORKERS', DEFAULT_WORKERS)),
+                        help='Handler invocations run concurrently')
+    parser.add_argument('--request-timeout', type=float, default=DEFAULT_REQUEST_TIMEOUT,
+                        help='Time budget handed to each invocation (seconds)')
+    parser.add_argument('--drain-seconds', type=float, default=DEFAULT_DRAIN_SECONDS,
+                        help='How long shutdown waits for in-flight requests')
+    parser.add_argument('--optimized', action='store_true',
+                        help='Serve /process with the optimized handler (cache, rate limiting)')
+    parser.add_argument('--fake-model-ms', type=float,
+                        help='Answer model calls from a local fake endpoint with this latency')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.fake_model_ms is not None:
+        use_fake_model(args.fake_model_ms)
+
+    summary = asyncio.run(run(args))
+    print(json.dumps(summary, indent=2))
+    print("\n✅ Drained and stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
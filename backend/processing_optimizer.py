@@ -3,14 +3,33 @@
 Processing pipeline optimizations for real-time sign language interpretation
 """
 
+import os
 import time
-import hashlib
-import base64
 import json
-from typing import Dict, Any, Optional, Tuple
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple, Union, List, Callable
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 
+from bedrock_prompts import get_response_format, get_prompt, usage_stats
+from bedrock_gateway import gateway
+from deadline import deadline_stats
+from result_store import result_store
+from idempotency import idempotency
+from rate_control import rate_controller
+from frame import Frame
+
+# Frames accepted in one batch request, and model calls run concurrently for
+# it (kept within the gateway's connection pool)
+MAX_BATCH_FRAMES = 32
+DEFAULT_BATCH_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '4'))
+
+# Frames per minute a streaming connection may send: one per second, the
+# fastest rate the rate_control hints ever recommend
+STREAM_FRAMES_PER_MINUTE = 60
+
 @dataclass
 class ProcessingMetrics:
     """Metrics for processing performance"""
@@ -29,15 +48,15 @@ class FrameCache:
         self.max_size = max_size
         self.ttl = timedelta(seconds=ttl_seconds)
     
-    def _generate_key(self, frame_data: str) -> str:
-        """Generate cache key from frame data"""
-        # Use first and last 100 characters + length for faster hashing
-        sample = frame_data[:100] + frame_data[-100:] + str(len(frame_data))
-        return hashlib.md5(sample.encode()).hexdigest()
+    def _generate_key(self, frame_data: Union[Frame, str], namespace: Optional[str] = None) -> str:
+        """Generate cache key from frame data, optionally scoped to one client"""
+        # Content hash computed once per Frame and shared with other stages
+        key = Frame.coerce(frame_data).cache_key
+        return f"{namespace}:{key}" if namespace else key
     
-    def get(self, frame_data: str) -> Optional[Any]:
+    def get(self, frame_data: Union[Frame, str], namespace: Optional[str] = None) -> Optional[Any]:
         """Get cached result if available and not expired"""
-        key = self._generate_key(frame_data)
+        key = self._generate_key(frame_data, namespace)
         
         if key in self.cache:
             result, timestamp = self.cache[key]
@@ -49,9 +68,9 @@ class FrameCache:
         
         return None
     
-    def put(self, frame_data: str, result: Any) -> None:
+    def put(self, frame_data: Union[Frame, str], result: Any, namespace: Optional[str] = None) -> None:
         """Cache processing result"""
-        key = self._generate_key(frame_data)
+        key = self._generate_key(frame_data, namespace)
         
         # Remove oldest entries if cache is full
         if len(self.cache) >= self.max_size:
@@ -100,6 +119,133 @@ class RateLimiter:
             return True
         
         return False
+    
+    def acquire(self, client_id: str, count: int) -> int:
+        """Admit up to `count` requests for client at once; returns how many were allowed"""
+        now = datetime.now()
+        
+        window_requests = [
+            req_time for req_time in self.requests.get(client_id, [])
+            if now - req_time < self.window
+        ]
+        allowed = max(0, min(count, self.max_requests - len(window_requests)))
+        self.requests[client_id] = window_requests + [now] * allowed
+        
+        return allowed
+
+class DeviceSequencer:
+    """
+    Latest-wins ordering of frames per device.
+    
+    A frame whose order (sequence number or timestamp) is older than the
+    newest frame already started or completed for its device is stale: it is
+    answered with the newest completed result when there is one, and dropped
+    otherwise, instead of being sent to the model.
+    """
+    
+    def __init__(self, max_devices: int = 1024):
+        self.max_devices = max_devices
+        self.devices: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.answered_with_newer = 0
+    
+    def _state(self, device_id: str) -> Dict[str, Any]:
+        state = self.devices.get(device_id)
+        if state is None:
+            state = self.devices[device_id] = {'newest': None, 'completed': None, 'result': None}
+            if len(self.devices) > self.max_devices:
+                self.devices.popitem(last=False)
+        self.devices.move_to_end(device_id)
+        return state
+    
+    def begin(self, device_id: str, order: Optional[float]) -> Optional[Dict[str, Any]]:
+        """
+        Register a frame before processing.
+        
+        Returns None if the frame should be processed, or the response for a
+        stale frame (the newer result, or a dropped marker).
+        """
+        if order is None:
+            return None
+        
+        with self.lock:
+            state = self._state(device_id)
+            if state['newest'] is None or order >= state['newest']:
+                state['newest'] = order
+                return None
+            
+            if state['result'] is not None:
+                self.answered_with_newer += 1
+                return {**state['result'], 'stale': True, 'cache_hit': True}
+            
+            self.dropped += 1
+            return {
+                'translation': 'Superseded by a newer frame',
+                'confidence': 0.0,
+                'hand_detected': False,
+                'stale': True,
+                'error': 'Frame is older than a frame already in progress'
+            }
+    
+    def complete(self, device_id: str, order: Optional[float], result: Dict[str, Any]) -> None:
+        """
+        Record a finished frame's result if it is the newest completed one.
+        
+        Callers pass only model answers (fresh or cached); errors and
+        degraded fallbacks are never kept to answer stale frames with.
+        """
+        if order is None or result.get('error') or result.get('degraded'):
+            return
+        
+        with self.lock:
+            state = self._state(device_id)
+            if state['completed'] is None or order >= state['completed']:
+                state['completed'] = order
+                state['result'] = {
+                    key: result[key] for key in ('translation', 'confidence', 'hand_detected', 'degraded')
+                    if key in result
+                }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'devices': len(self.devices),
+                'stale_dropped': self.dropped,
+                'stale_answered_with_newer': self.answered_with_newer
+            }
+
+class ChannelStats:
+    """Per-channel request outcomes and latency (HTTP, batch, WebSocket)"""
+    
+    def __init__(self):
+        self.channels: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+    
+    def record(self, channel: str, status: str, cache_hit: bool, latency: float) -> None:
+        with self.lock:
+            stats = self.channels.get(channel)
+            if stats is None:
+                stats = self.channels[channel] = {
+                    'requests': 0, 'ok': 0, 'errors': 0, 'invalid': 0, 'rate_limited': 0,
+                    'cache_hits': 0, 'average_latency': 0.0
+                }
+            stats['requests'] += 1
+            stats[status if status in ('ok', 'invalid', 'rate_limited') else 'errors'] += 1
+            stats['cache_hits'] += 1 if cache_hit else 0
+            if status == 'ok':
+                # Same smoothing as the pipeline-wide average
+                if stats['ok'] == 1:
+                    stats['average_latency'] = latency
+                else:
+                    stats['average_latency'] = 0.1 * latency + 0.9 * stats['average_latency']
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                channel: {**stats, 'average_latency': f"{stats['average_latency']:.3f}s"}
+                for channel, stats in self.channels.items()
+            }
 
 class ProcessingPipeline:
     """Optimized processing pipeline for real-time sign language interpretation"""
@@ -107,24 +253,29 @@ class ProcessingPipeline:
     def __init__(self):
         self.cache = FrameCache(max_size=50, ttl_seconds=20)
         self.rate_limiter = RateLimiter(max_requests=20, window_seconds=60)
+        # Streaming connections send a steady frame rate and are gated separately
+        self.stream_rate_limiter = RateLimiter(max_requests=STREAM_FRAMES_PER_MINUTE, window_seconds=60)
+        self.sequencer = DeviceSequencer()
         self.metrics = ProcessingMetrics()
+        self.channels = ChannelStats()
     
-    def preprocess_frame(self, frame_data: str) -> Tuple[str, Dict[str, Any]]:
+    def preprocess_frame(self, frame_data: Union[Frame, str]) -> Tuple[Frame, Dict[str, Any]]:
         """Preprocess frame data for optimal AI processing"""
         start_time = time.time()
         
-        # Basic validation
-        if not frame_data or len(frame_data) < 100:
-            raise ValueError("Invalid frame data: too small or empty")
+        # Basic validation (size and image header, no full decode)
+        frame = Frame.coerce(frame_data).validate()
         
-        # Decode and analyze frame
+        # Analyze frame
         try:
-            # Quick size check (base64 encoded)
-            estimated_bytes = len(frame_data) * 3 // 4
+            estimated_bytes = frame.size_bytes
             
             metadata = {
                 'estimated_size_bytes': estimated_bytes,
-                'base64_length': len(frame_data),
+                'base64_length': len(frame.base64),
+                'format': frame.info.format,
+                'width': frame.info.width,
+                'height': frame.info.height,
                 'preprocessing_time': time.time() - start_time
             }
             
@@ -133,14 +284,16 @@ class ProcessingPipeline:
             if estimated_bytes > 500000:  # > 500KB
                 metadata['size_warning'] = True
             
-            return frame_data, metadata
+            return frame, metadata
             
         except Exception as e:
             raise ValueError(f"Frame preprocessing failed: {e}")
     
-    def optimize_prompt(self, frame_metadata: Dict[str, Any]) -> str:
+    def optimize_prompt(self, frame_metadata: Dict[str, Any], response_format: Optional[str] = None) -> str:
         """Generate optimized prompt based on frame characteristics"""
         
+        response_format = get_response_format(response_format)
+        
         base_prompt = """
         Analyze this image for American Sign Language (ASL) signs. Be concise and accurate.
         
@@ -157,22 +310,27 @@ class ProcessingPipeline:
         }
         """
         
+        base_prompt = get_prompt(base_prompt, response_format)
+        
         # Adjust prompt based on image characteristics
         if frame_metadata.get('size_warning'):
             base_prompt += "\nNote: Large image - focus on central region."
         
         return base_prompt.strip()
     
-    def process_with_cache(self, frame_data: str, client_id: str = "default") -> Dict[str, Any]:
+    def process_with_cache(self, frame_data: Union[Frame, str], client_id: str = "default") -> Dict[str, Any]:
         """Process frame with caching and rate limiting"""
         start_time = time.time()
         
         try:
+            frame = Frame.coerce(frame_data)
+            
             # Increment total requests
             self.metrics.total_requests += 1
             
             # Check rate limiting
             if not self.rate_limiter.is_allowed(client_id):
+                self.channels.record('http', 'rate_limited', False, time.time() - start_time)
                 return {
                     'translation': 'Rate limit exceeded',
                     'confidence': 0.0,
@@ -180,18 +338,18 @@ class ProcessingPipeline:
                     'latency': time.time() - start_time
                 }
             
-            # Check cache first
-            cached_result = self.cache.get(frame_data)
+            # Check cache first (it only ever holds model results)
+            cached_result = self.cache.get(frame)
             if cached_result:
                 self.metrics.cache_hits += 1
-                cached_result['cache_hit'] = True
-                cached_result['latency'] = time.time() - start_time
+                cached_result = {**cached_result, 'cache_hit': True, 'latency': time.time() - start_time}
+                self.channels.record('http', 'ok', True, cached_result['latency'])
                 return cached_result
             
             self.metrics.cache_misses += 1
             
             # Preprocess frame
-            processed_frame, metadata = self.preprocess_frame(frame_data)
+            processed_frame, metadata = self.preprocess_frame(frame)
             
             # Simulate AI processing (replace with actual Bedrock call)
             # This is where the real Bedrock processing would happen
@@ -208,17 +366,19 @@ class ProcessingPipeline:
                 'latency': time.time() - start_time
             }
             
-            # Cache the result
-            self.cache.put(frame_data, result.copy())
+            # The mock is not cached: callers cache the model's result with
+            # cache_result, so other paths sharing the cache never see it
             
             # Update metrics
             self.metrics.successful_requests += 1
             self.update_average_latency(time.time() - start_time)
+            self.channels.record('http', 'ok', False, time.time() - start_time)
             
             return result
             
         except Exception as e:
             self.metrics.failed_requests += 1
+            self.channels.record('http', 'error', False, time.time() - start_time)
             return {
                 'translation': 'Processing error',
                 'confidence': 0.0,
@@ -226,6 +386,169 @@ class ProcessingPipeline:
                 'latency': time.time() - start_time
             }
     
+    def cache_result(self, frame_data: Union[Frame, str], result: Dict[str, Any],
+                     namespace: Optional[str] = None) -> None:
+        """
+        Cache a model result for identical frames; errors, degraded fallbacks
+        and unparseable raw replies are not cached
+        """
+        if result.get('error') or result.get('degraded') or result.get('raw_response'):
+            return
+        self.cache.put(frame_data, {
+            key: result[key] for key in ('translation', 'confidence', 'hand_detected', 'description')
+            if key in result
+        }, namespace)
+    
+    def process_batch(self, frames: List[Union[Frame, str]],
+                      infer: Callable[[Frame, Dict[str, Any]], Dict[str, Any]],
+                      client_id: str = "default",
+                      max_workers: int = DEFAULT_BATCH_WORKERS) -> List[Dict[str, Any]]:
+        """
+        Process an ordered batch of frames, returning one result per frame in order.
+        
+        Rate limiting, validation and cache lookups run once for the whole batch
+        on the calling thread. Identical frames share one model call, and cache
+        misses go to `infer` on a bounded worker pool. Each result carries a
+        status ('ok', 'error', 'invalid' or 'rate_limited'), so one failing frame
+        does not fail the batch.
+        """
+        start_time = time.time()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(frames)
+        self.metrics.total_requests += len(frames)
+        
+        # Frames beyond the client's remaining allowance are rejected up front
+        allowed = self.rate_limiter.acquire(client_id, len(frames))
+        
+        waiting: Dict[str, List[int]] = {}
+        misses: Dict[str, Tuple[Frame, Dict[str, Any]]] = {}
+        for index, frame_data in enumerate(frames):
+            if index >= allowed:
+                results[index] = {
+                    'status': 'rate_limited',
+                    'translation': 'Rate limit exceeded',
+                    'confidence': 0.0,
+                    'error': 'Too many requests'
+                }
+                continue
+            
+            try:
+                frame, metadata = self.preprocess_frame(frame_data)
+            except (ValueError, TypeError) as e:
+                self.metrics.failed_requests += 1
+                results[index] = {
+                    'status': 'invalid',
+                    'translation': 'Processing error',
+                    'confidence': 0.0,
+                    'error': str(e)
+                }
+                continue
+            
+            cached_result = self.cache.get(frame)
+            if cached_result:
+                self.metrics.cache_hits += 1
+                results[index] = {**cached_result, 'status': 'ok', 'cache_hit': True}
+                continue
+            
+            if frame.cache_key in waiting:
+                # Same image earlier in the batch; reuse its result
+                waiting[frame.cache_key].append(index)
+                continue
+            
+            self.metrics.cache_misses += 1
+            waiting[frame.cache_key] = [index]
+            misses[frame.cache_key] = (frame, metadata)
+        
+        if misses:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(misses)))) as executor:
+                futures = {
+                    key: executor.submit(infer, frame, metadata)
+                    for key, (frame, metadata) in misses.items()
+                }
+                for key, future in futures.items():
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'translation': 'Processing error', 'confidence': 0.0, 'error': str(e)}
+                    
+                    if result.get('error'):
+                        outcome = {**result, 'status': 'error'}
+                    else:
+                        self.cache_result(misses[key][0], result)
+                        outcome = {**result, 'status': 'ok'}
+                    
+                    for position, index in enumerate(waiting[key]):
+                        results[index] = {**outcome, 'cache_hit': position > 0 and outcome['status'] == 'ok'}
+        
+        latency = time.time() - start_time
+        for result in results:
+            if result['status'] == 'ok':
+                self.metrics.successful_requests += 1
+            elif result['status'] == 'error':
+                self.metrics.failed_requests += 1
+            self.channels.record('batch', result['status'], result.get('cache_hit', False), latency)
+        if any(result['status'] == 'ok' for result in results):
+            self.update_average_latency(latency)
+        
+        return results
+    
+    def process_frame(self, frame_data: Union[Frame, str],
+                      infer: Callable[[Frame, Dict[str, Any]], Dict[str, Any]],
+                      client_id: str, channel: str = 'websocket') -> Dict[str, Any]:
+        """
+        Run one streamed frame through the pipeline stages.
+        
+        Gating and caching are keyed per client (a connection), so one
+        client's frames neither use up nor hit another's. Cache misses go to
+        `infer`; the result carries a status like process_batch results.
+        """
+        start_time = time.time()
+        self.metrics.total_requests += 1
+        
+        if not self.stream_rate_limiter.is_allowed(client_id):
+            result = {
+                'status': 'rate_limited',
+                'translation': 'Rate limit exceeded',
+                'confidence': 0.0,
+                'error': 'Too many requests'
+            }
+        else:
+            try:
+                frame, metadata = self.preprocess_frame(frame_data)
+            except ValueError as e:
+                frame = None
+                self.metrics.failed_requests += 1
+                result = {
+                    'status': 'invalid',
+                    'translation': 'Invalid frame data',
+                    'confidence': 0.0,
+                    'error': str(e)
+                }
+            
+            cached_result = self.cache.get(frame, client_id) if frame is not None else None
+            if cached_result:
+                self.metrics.cache_hits += 1
+                result = {**cached_result, 'status': 'ok', 'cache_hit': True}
+            elif frame is not None:
+                self.metrics.cache_misses += 1
+                try:
+                    result = infer(frame, metadata)
+                except Exception as e:
+                    result = {'translation': 'Processing failed', 'confidence': 0.0, 'error': str(e)}
+                
+                if result.get('error'):
+                    self.metrics.failed_requests += 1
+                    result = {**result, 'status': 'error', 'cache_hit': False}
+                else:
+                    self.cache_result(frame, result, client_id)
+                    result = {**result, 'status': 'ok', 'cache_hit': False}
+        
+        latency = time.time() - start_time
+        if result['status'] == 'ok':
+            self.metrics.successful_requests += 1
+            self.update_average_latency(latency)
+        self.channels.record(channel, result['status'], result.get('cache_hit', False), latency)
+        return {**result, 'latency': latency}
+    
     def update_average_latency(self, latency: float) -> None:
         """Update rolling average latency"""
         if self.metrics.successful_requests == 1:
@@ -237,6 +560,10 @@ class ProcessingPipeline:
                 alpha * latency + (1 - alpha) * self.metrics.average_latency
             )
     
+    def forget_client(self, client_id: str) -> None:
+        """Drop per-client gating state once a streaming connection closes"""
+        self.stream_rate_limiter.requests.pop(client_id, None)
+    
     def get_performance_stats(self) -> Dict[str, Any]:
         """Get current performance statistics"""
         total = self.metrics.total_requests
@@ -259,7 +586,16 @@ class ProcessingPipeline:
             'average_latency': f"{self.metrics.average_latency:.3f}s",
             'cache_hit_rate': f"{cache_hit_rate:.1f}%",
             'cache_size': len(self.cache.cache),
-            'active_clients': len(self.rate_limiter.requests)
+            'active_clients': len(self.rate_limiter.requests),
+            'active_streams': len(self.stream_rate_limiter.requests),
+            'channels': self.channels.get_stats(),
+            'sequencing': self.sequencer.get_stats(),
+            'token_usage': usage_stats.get_stats(),
+            'bedrock_gateway': gateway.get_stats(),
+            'deadlines': deadline_stats.get_stats(),
+            'result_store': result_store.get_stats(),
+            'idempotency': idempotency.get_stats(),
+            'rate_control': rate_controller.get_stats()
         }
     
     def cleanup(self) -> None:
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Server-driven rate control: recommend a frame interval, JPEG quality and
+resolution to clients from backend load, so the whole fleet backs off
+together when Bedrock is slow or throttling
+"""
+
+import time
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional, Callable
+
+from bedrock_gateway import gateway, BedrockGateway, CircuitBreaker
+
+# Response header carrying the hint on HTTP responses
+RATE_HINT_HEADER = 'X-Rate-Hint'
+
+
+@dataclass(frozen=True)
+class RateHint:
+    """Capture settings recommended to clients"""
+    level: str
+    frame_interval_ms: int
+    jpeg_quality: float
+    max_width: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def header_value(self) -> str:
+        return (f"level={self.level}, interval-ms={self.frame_interval_ms}, "
+                f"quality={self.jpeg_quality}, max-width={self.max_width}")
+
+
+# Load levels from idle to overloaded; the normal level matches the
+# frontend's own ceiling of one frame per second, the critical level its floor
+RATE_LEVELS = (
+    RateHint('normal', 1000, 0.8, 640),
+    RateHint('elevated', 2000, 0.7, 480),
+    RateHint('high', 3000, 0.6, 320),
+    RateHint('critical', 5000, 0.5, 320),
+)
+
+# Model latency the normal level is sized for (matches the frontend target)
+DEFAULT_TARGET_LATENCY = 1.5
+
+
+class RateController:
+    """
+    Maps gateway load to a RateHint.
+
+    Load is sampled at most once per sample_seconds from the gateway's pool
+    usage, endpoint latency EWMAs, throttle rate and circuit breakers. The
+    level rises as soon as load does, but only falls one level at a time
+    after step_down_seconds of lower load, so clients are not told to speed
+    up and slow down on every sample.
+    """
+
+    def __init__(self, model_gateway: Optional[BedrockGateway] = None,
+                 target_latency: float = DEFAULT_TARGET_LATENCY,
+                 sample_seconds: float = 1.0, step_down_seconds: float = 10.0,
+                 throttle_alpha: float = 0.3, clock: Callable[[], float] = time.monotonic):
+        self.gateway = model_gateway or gateway
+        self.target_latency = target_latency
+        self.sample_seconds = sample_seconds
+        self.step_down_seconds = step_down_seconds
+        self.throttle_alpha = throttle_alpha
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._level = 0
+        self._sampled_at: Optional[float] = None
+        self._lower_since: Optional[float] = None
+        self._last_counts = (0, 0)
+        self.throttle_rate = 0.0
+        self.utilization = 0.0
+        self.latency_ratio = 0.0
+        self.transitions = 0
+
+    def _load_level(self, stats: Dict[str, Any]) -> int:
+        """Level index the current load calls for"""
+        calls, throttles = stats['calls'], stats['throttles']
+        new_calls = calls - self._last_counts[0]
+        if new_calls > 0:
+            sample_rate = (throttles - self._last_counts[1]) / new_calls
+            self.throttle_rate += self.throttle_alpha * (sample_rate - self.throttle_rate)
+        self._last_counts = (calls, throttles)
+
+        pool = stats['pool']
+        self.utilization = pool['in_flight'] / max(1, pool['max_pool_connections'])
+        measured = [e['ewma_latency_ms'] for e in stats['routing_table'] if e['calls']]
+        self.latency_ratio = min(measured) / 1000.0 / self.target_latency if measured else 0.0
+
+        if stats['circuit_breaker']['state'] == CircuitBreaker.OPEN or self.throttle_rate > 0.2:
+            return 3
+        level = 0
+        if self.throttle_rate > 0.05 or self.utilization >= 1.0 or self.latency_ratio > 2.0:
+            level = 2
+        elif self.throttle_rate > 0.01 or self.utilization >= 0.75 or self.latency_ratio > 1.2:
+            level = 1
+        return level
+
+    def current(self) -> RateHint:
+        """Hint for the current load, re-sampled at most once per sample_seconds"""
+        now = self.clock()
+        with self._lock:
+            if self._sampled_at is not None and now - self._sampled_at < self.sample_seconds:
+                return RATE_LEVELS[self._level]
+            self._sampled_at = now
+
+            target = self._load_level(self.gateway.get_stats())
+            if target > self._level:
+                self._level = target
+                self._lower_since = None
+                self.transitions += 1
+            elif target < self._level:
+                if self._lower_since is None:
+                    self._lower_since = now
+                elif now - self._lower_since >= self.step_down_seconds:
+                    self._level -= 1
+                    self._lower_since = now
+                    self.transitions += 1
+            else:
+                self._lower_since = None
+            return RATE_LEVELS[self._level]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'hint': RATE_LEVELS[self._level].to_dict(),
+                'throttle_rate': round(self.throttle_rate, 3),
+                'pool_utilization': round(self.utilization, 2),
+                'latency_ratio': round(self.latency_ratio, 2),
+                'transitions': self.transitions
+            }
+
+
+def with_rate_hint(response: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of an HTTP response with the current hint in its headers"""
+    headers = dict(response.get('headers') or {})
+    headers[RATE_HINT_HEADER] = rate_controller.current().header_value()
+    # Browsers only expose non-simple response headers that are listed
+    headers['Access-Control-Expose-Headers'] = f"{RATE_HINT_HEADER}, Idempotent-Replayed"
+    return {**response, 'headers': headers}
+
+
+# Global controller shared by all handlers in the container
+rate_controller = RateController()
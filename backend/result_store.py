@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Buffered result persistence: results are batched per device and time bucket
+and written to S3 as JSON Lines objects off the response path
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache, wraps
+from typing import Dict, Any, Optional, Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Results written per object at most, and the buffer size that forces a flush
+DEFAULT_MAX_BATCH_RECORDS = 500
+DEFAULT_MAX_BUFFER_BYTES = 4 * 1024 * 1024
+
+# Oldest a buffered result may get before it is flushed
+DEFAULT_MAX_AGE_SECONDS = 30.0
+
+# Width of the time buckets results are grouped into; divides an hour so a
+# bucket never spans two hour partitions
+DEFAULT_BUCKET_SECONDS = 300
+
+# Results kept for retry after a failed flush before the oldest are dropped
+MAX_RETAINED_RECORDS = 5000
+
+# Hive-style partitions (date/hour/device) so analytics jobs can prune by time
+RESULTS_PREFIX = 'results/'
+
+# Longest the post-response flush may hold the sandbox open; a flush still
+# running then carries on in the background after the next invocation starts
+DEFAULT_FLUSH_TIMEOUT_SECONDS = 2.0
+
+# Time left before the invocation deadline that the flush never uses
+FLUSH_DEADLINE_MARGIN_SECONDS = 0.5
+
+EXTENSION_NAME = 'result-store-flush'
+EXTENSIONS_API_VERSION = '2020-01-01'
+
+
+def partition_prefix(device_id: str, epoch_seconds: float) -> str:
+    """Partition path for a device's results at a point in time (UTC)"""
+    utc = time.gmtime(epoch_seconds)
+    return f"date={time.strftime('%Y-%m-%d', utc)}/hour={utc.tm_hour:02d}/device={device_id}"
+
+
+@lru_cache(maxsize=None)
+def get_s3_client() -> Any:
+    """S3 client for background writes, created on first flush"""
+    import boto3
+    from botocore.config import Config
+
+    # Off the response path, so standard retries are affordable
+    return boto3.client('s3', config=Config(
+        connect_timeout=2, read_timeout=5, retries={'max_attempts': 3, 'mode': 'standard'}
+    ))
+
+
+@dataclass
+class Batch:
+    """Buffered results for one device and time bucket"""
+    device_id: str
+    bucket_start: int
+    created_at: float
+    lines: List[bytes] = field(default_factory=list)
+    size_bytes: int = 0
+
+
+class ResultStore:
+    """
+    Collects results in memory and writes one JSON Lines object per device
+    and time bucket on each flush.
+
+    A flush happens when a batch reaches max_batch_records, the buffer
+    reaches max_buffer_bytes, the oldest result reaches max_age_seconds, or
+    the invocation ends. Flushes run on a background thread; inside Lambda an
+    internal extension holds the sandbox open after the response is sent
+    until the end-of-invocation flush has finished.
+    """
+
+    def __init__(self, bucket_name: Optional[str] = None,
+                 client_factory: Callable[[], Any] = get_s3_client,
+                 max_batch_records: int = DEFAULT_MAX_BATCH_RECORDS,
+                 max_buffer_bytes: int = DEFAULT_MAX_BUFFER_BYTES,
+                 max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+                 bucket_seconds: int = DEFAULT_BUCKET_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.bucket_name = bucket_name if bucket_name is not None else os.environ.get('DATA_BUCKET')
+        self.client_factory = client_factory
+        self.max_batch_records = max_batch_records
+        self.max_buffer_bytes = max_buffer_bytes
+        self.max_age_seconds = max_age_seconds
+        self.bucket_seconds = bucket_seconds
+        self.clock = clock
+
+        self._batches: Dict[Tuple[str, int], Batch] = {}
+        self._buffered_bytes = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flush_all = False
+        self._worker: Optional[threading.Thread] = None
+        self.extension: Optional['FlushExtension'] = None
+
+        self.records_buffered = 0
+        self.records_written = 0
+        self.objects_written = 0
+        self.flush_failures = 0
+        self.records_dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.bucket_name)
+
+    def put(self, device_id: str, result: Dict[str, Any]) -> None:
+        """Buffer one result; never blocks on S3"""
+        if not self.enabled:
+            return
+
+        now = self.clock()
+        line = json.dumps(result, default=str).encode('utf-8')
+        bucket_start = int(now // self.bucket_seconds) * self.bucket_seconds
+
+        with self._lock:
+            key = (device_id, bucket_start)
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = self._batches[key] = Batch(device_id, bucket_start, now)
+            batch.lines.append(line)
+            batch.size_bytes += len(line) + 1
+            self._buffered_bytes += len(line) + 1
+            self.records_buffered += 1
+            full = (len(batch.lines) >= self.max_batch_records
+                    or self._buffered_bytes >= self.max_buffer_bytes)
+
+        self._ensure_worker()
+        if full:
+            self._wake.set()
+
+    def object_key(self, batch: Batch) -> str:
+        bucket_time = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(batch.bucket_start))
+        return (f"{RESULTS_PREFIX}{partition_prefix(batch.device_id, batch.bucket_start)}/"
+                f"{bucket_time}-{uuid.uuid4().hex[:12]}.jsonl")
+
+    def _take_batches(self, only_due: bool) -> List[Batch]:
+        """Remove and return the batches to write"""
+        now = self.clock()
+        with self._lock:
+            if only_due and self._buffered_bytes < self.max_buffer_bytes:
+                keys = [
+                    key for key, batch in self._batches.items()
+                    if len(batch.lines) >= self.max_batch_records
+                    or now - batch.created_at >= self.max_age_seconds
+                ]
+            else:
+                keys = list(self._batches)
+
+            batches = [self._batches.pop(key) for key in keys]
+            self._buffered_bytes -= sum(batch.size_bytes for batch in batches)
+        return batches
+
+    def _restore(self, batch: Batch) -> None:
+        """Put a batch back after a failed write, dropping the oldest results if over the limit"""
+        with self._lock:
+            key = (batch.device_id, batch.bucket_start)
+            existing = self._batches.get(key)
+            if existing is not None:
+                batch.lines.extend(existing.lines)
+                batch.size_bytes += existing.size_bytes
+                self._buffered_bytes -= existing.size_bytes
+
+            overflow = len(batch.lines) - MAX_RETAINED_RECORDS
+            if overflow > 0:
+                batch.size_bytes -= sum(len(line) + 1 for line in batch.lines[:overflow])
+                del batch.lines[:overflow]
+                self.records_dropped += overflow
+
+            self._batches[key] = batch
+            self._buffered_bytes += batch.size_bytes
+
+    def flush(self, only_due: bool = False) -> int:
+        """Write buffered batches to S3 and return the number of results written"""
+        if not self.enabled:
+            return 0
+
+        written = 0
+        with self._flush_lock:
+            for batch in self._take_batches(only_due):
+                for start in range(0, len(batch.lines), self.max_batch_records):
+                    chunk = batch.lines[start:start + self.max_batch_records]
+                    try:
+                        self.client_factory().put_object(
+                            Bucket=self.bucket_name,
+                            Key=self.object_key(batch),
+                            Body=b'\n'.join(chunk) + b'\n',
+                            ContentType='application/x-ndjson'
+                        )
+                    except Exception as e:
+                        logger.error(f"Error writing results to S3: {str(e)}")
+                        with self._lock:
+                            self.flush_failures += 1
+                        remaining = batch.lines[start:]
+                        self._restore(Batch(batch.device_id, batch.bucket_start, batch.created_at,
+                                            remaining, sum(len(line) + 1 for line in remaining)))
+                        break
+
+                    written += len(chunk)
+                    with self._lock:
+                        self.objects_written += 1
+                        self.records_written += len(chunk)
+        return written
+
+    def end_invocation(self) -> None:
+        """
+        Mark the end of a handler invocation.
+
+        With the Lambda extension registered the flush runs after the
+        response is sent and before the sandbox freezes; otherwise it is
+        handed to the background worker.
+        """
+        if not self.enabled:
+            return
+        if self.extension is not None:
+            self.extension.invocation_done.set()
+        else:
+            self._ensure_worker()
+            self._flush_all = True
+            self._wake.set()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_worker, name='result-store', daemon=True)
+                self._worker.start()
+
+    def _run_worker(self) -> None:
+        """Flush full or aged batches, and everything when an invocation ends"""
+        while True:
+            self._wake.wait(timeout=max(0.1, self.max_age_seconds / 4))
+            self._wake.clear()
+            flush_all, self._flush_all = self._flush_all, False
+            try:
+                self.flush(only_due=not flush_all)
+            except Exception as e:
+                logger.error(f"Result flush failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'records_buffered': self.records_buffered,
+                'records_pending': sum(len(batch.lines) for batch in self._batches.values()),
+                'records_written': self.records_written,
+                'objects_written': self.objects_written,
+                'flush_failures': self.flush_failures,
+                'records_dropped': self.records_dropped,
+                'post_response_flush': self.extension is not None,
+                'flush_timeouts': self.extension.flush_timeouts if self.extension is not None else 0
+            }
+
+
+class FlushExtension:
+    """
+    Lambda internal extension that flushes the store after each invocation.
+
+    Lambda only freezes the sandbox once every extension has asked for its
+    next event, so the response goes out as soon as the handler returns while
+    this thread finishes the flush first.
+    """
+
+    def __init__(self, store: ResultStore, runtime_api: str,
+                 flush_timeout: float = DEFAULT_FLUSH_TIMEOUT_SECONDS):
+        self.store = store
+        self.base_url = f"http://{runtime_api}/{EXTENSIONS_API_VERSION}/extension"
+        self.flush_timeout = flush_timeout
+        self.invocation_done = threading.Event()
+        self.extension_id: Optional[str] = None
+        self.flush_timeouts = 0
+
+    def register(self) -> None:
+        import urllib.request
+        request = urllib.request.Request(
+            f"{self.base_url}/register",
+            data=json.dumps({'events': ['INVOKE']}).encode('utf-8'),
+            headers={'Lambda-Extension-Name': EXTENSION_NAME},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=2) as response:
+            self.extension_id = response.headers['Lambda-Extension-Identifier']
+
+    def next_event(self) -> Dict[str, Any]:
+        import urllib.request
+        request = urllib.request.Request(
+            f"{self.base_url}/event/next",
+            headers={'Lambda-Extension-Identifier': self.extension_id}
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def run(self) -> None:
+        while True:
+            event = self.next_event()
+            # Wait for the handler, but never past the invocation deadline
+            timeout = max(0.0, event.get('deadlineMs', 0) / 1000.0 - time.time())
+            self.invocation_done.wait(timeout=timeout)
+            self.invocation_done.clear()
+            self.flush(event.get('deadlineMs', 0) / 1000.0)
+
+    def flush(self, deadline: float) -> bool:
+        """
+        Flush the store, waiting at most flush_timeout and never into the last
+        FLUSH_DEADLINE_MARGIN_SECONDS before the deadline; returns whether it finished
+        """
+        timeout = min(self.flush_timeout, max(0.0, deadline - time.time() - FLUSH_DEADLINE_MARGIN_SECONDS))
+        flusher = threading.Thread(target=self._flush, name=f"{EXTENSION_NAME}-write", daemon=True)
+        flusher.start()
+        flusher.join(timeout=timeout)
+        if flusher.is_alive():
+            # The write keeps its batches; they are retried if it fails after the thaw
+            self.flush_timeouts += 1
+            logger.warning(f"Post-response flush still running after {timeout:.1f}s, not waiting for it")
+            return False
+        return True
+
+    def _flush(self) -> None:
+        try:
+            self.store.flush()
+        except Exception as e:
+            logger.error(f"Post-response flush failed: {str(e)}")
+
+
+def register_flush_extension(store: ResultStore) -> bool:
+    """Register the post-response flush inside Lambda; must run during init"""
+    runtime_api = os.environ.get('AWS_LAMBDA_RUNTIME_API')
+    if not runtime_api or not store.enabled or store.extension is not None:
+        return False
+
+    extension = FlushExtension(store, runtime_api, float(
+        os.environ.get('RESULT_FLUSH_TIMEOUT_SECONDS', DEFAULT_FLUSH_TIMEOUT_SECONDS)))
+    try:
+        extension.register()
+    except Exception as e:
+        logger.warning(f"Result flush extension unavailable, flushing in background: {str(e)}")
+        return False
+
+    store.extension = extension
+    threading.Thread(target=extension.run, name=EXTENSION_NAME, daemon=True).start()
+    return True
+
+
+_invocation = threading.local()
+
+
+def flush_after_invocation(handler: Callable) -> Callable:
+    """
+    Decorate a Lambda handler so every invocation ends with end_invocation().
+
+    Handlers that delegate to other decorated handlers end the invocation once.
+    """
+    @wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Any:
+        depth = getattr(_invocation, 'depth', 0)
+        _invocation.depth = depth + 1
+        try:
+            return handler(event, context)
+        finally:
+            _invocation.depth = depth
+            if depth == 0:
+                result_store.end_invocation()
+    return wrapper
+
+
+# Global store shared by all handlers in the container
+result_store = ResultStore()
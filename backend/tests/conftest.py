@@ -0,0 +1,37 @@
+"""
+Shared fixtures: import paths for the backend and Lambda modules, synthetic
+frames and a fake Bedrock endpoint on the shared gateway
+"""
+
+import base64
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('RESPONSE_FORMAT', 'compact')
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.join(BACKEND_DIR, 'lambda'))
+sys.path.append(os.path.join(BACKEND_DIR, 'benchmarks'))
+
+from bench_frame_copies import make_jpeg
+from bedrock_gateway import gateway, Endpoint
+from fake_bedrock import FakeBedrockClient, LatencyProfile
+
+
+@pytest.fixture
+def frame_data():
+    """A base64 JPEG no other test uses, so it is never already cached"""
+    return base64.b64encode(make_jpeg(4096)).decode('ascii')
+
+
+@pytest.fixture
+def fake_model():
+    """Answer model calls from an in-process fake endpoint (replies HELLO|0.82|1)"""
+    saved = list(gateway.endpoints)
+    client = FakeBedrockClient(LatencyProfile(latency=0.0))
+    gateway.endpoints[:] = [Endpoint('fake', client=client)]
+    yield client
+    gateway.endpoints[:] = saved
@@ -0,0 +1,26 @@
+import json
+
+import pytest
+
+from bedrock_prompts import (
+    COMPACT_PROMPT, PROMPT_CACHE_MIN_TOKENS, build_request_body, encode_request_body, get_generation_params
+)
+
+LONG_PROMPT = 'Describe the sign. ' * (PROMPT_CACHE_MIN_TOKENS // 4)
+PARAMS = get_generation_params('compact', 150)
+
+
+def system_block(prompt):
+    return json.loads(encode_request_body(prompt, 'QUJD', PARAMS))['system'][0]
+
+
+def test_no_cache_marker_by_default(monkeypatch):
+    monkeypatch.delenv('PROMPT_CACHING', raising=False)
+    assert 'cache_control' not in system_block(LONG_PROMPT)
+
+
+@pytest.mark.parametrize('prompt, cached', [(COMPACT_PROMPT, False), (LONG_PROMPT, True)])
+def test_cache_marker_only_on_prompts_long_enough_to_cache(monkeypatch, prompt, cached):
+    monkeypatch.setenv('PROMPT_CACHING', 'true')
+    assert ('cache_control' in system_block(prompt)) == cached
+    assert ('cache_control' in build_request_body(prompt, 'QUJD', PARAMS)['system'][0]) == cached
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import build_lambda_artifact
+
+
+@pytest.mark.parametrize('name', ['json', 'os', 'logging', 'typing', 'concurrent', '_socket'])
+def test_stdlib_detected_without_stdlib_module_names(monkeypatch, name):
+    # Python 3.9 (the Lambda target) has no sys.stdlib_module_names
+    monkeypatch.delattr(sys, 'stdlib_module_names', raising=False)
+    assert build_lambda_artifact.is_stdlib(name)
+
+
+def test_site_packages_are_not_stdlib(monkeypatch):
+    monkeypatch.delattr(sys, 'stdlib_module_names', raising=False)
+    assert not build_lambda_artifact.is_stdlib('pytest')
+
+
+def test_handlers_have_no_unresolved_imports_without_stdlib_module_names(monkeypatch):
+    monkeypatch.delattr(sys, 'stdlib_module_names', raising=False)
+    groups, _ = build_lambda_artifact.find_imports(build_lambda_artifact.ENTRY_POINTS)
+    assert groups['unresolved'] == set()
@@ -0,0 +1,155 @@
+from connection_registry import (
+    ConnectionRegistry, ConnectionState, DynamoDBKeyValueBackend, KeyValueConnectionStore,
+    LocalKeyValueBackend, MemoryConnectionStore, create_store
+)
+from fake_bedrock import FakeClientError
+
+
+def shared_registries():
+    """Two containers' registries on one key-value backend"""
+    backend = LocalKeyValueBackend()
+    return ConnectionRegistry(KeyValueConnectionStore(backend)), ConnectionRegistry(KeyValueConnectionStore(backend))
+
+
+def test_subscription_in_one_container_is_seen_by_another():
+    first, second = shared_registries()
+    first.connect('viewer-1')
+    first.subscribe('viewer-1', 'class-1')
+    second.subscribe('viewer-2', 'class-1')
+
+    assert first.subscribers('class-1') == ['viewer-1', 'viewer-2']
+    assert second.subscribers('class-1') == ['viewer-1', 'viewer-2']
+
+
+def test_unsubscribe_and_disconnect_apply_across_containers():
+    first, second = shared_registries()
+    first.subscribe('viewer-1', 'class-1')
+    first.subscribe('viewer-2', 'class-1')
+
+    assert second.unsubscribe('viewer-1') == 'class-1'
+    second.disconnect('viewer-2')
+    assert first.subscribers('class-1') == []
+
+
+def test_subscribing_elsewhere_leaves_the_previous_room():
+    first, second = shared_registries()
+    first.subscribe('viewer-1', 'class-1')
+    second.subscribe('viewer-1', 'class-2')
+
+    assert first.subscribers('class-1') == []
+    assert first.subscribers('class-2') == ['viewer-1']
+
+
+def test_rooms_expire_with_the_connection_ttl():
+    now = [1000.0]
+    backend = LocalKeyValueBackend(clock=lambda: now[0])
+    registry = ConnectionRegistry(KeyValueConnectionStore(backend, ttl_seconds=60))
+    registry.subscribe('viewer-1', 'class-1')
+
+    now[0] += 61
+    assert registry.subscribers('class-1') == []
+
+
+def test_prune_removes_viewers_without_records():
+    registry = ConnectionRegistry(MemoryConnectionStore())
+    registry.subscribe('viewer-1', 'class-1')
+    registry.store.delete('viewer-1')
+
+    registry.prune('class-1', ['viewer-1'])
+    assert registry.subscribers('class-1') == []
+
+
+def test_records_written_before_new_slots_still_load():
+    old_record = ConnectionState('c1', session_id='s1').to_tuple()[:-2]
+    state = ConnectionState.from_tuple(old_record)
+    assert state.session_id == 's1'
+    assert state.watching is None
+
+
+class FakeDynamoDBClient:
+    """The get/put/delete/update_item calls DynamoDBKeyValueBackend makes, in memory"""
+
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, TableName, Key, ConsistentRead=False):
+        item = self.items.get(Key['pk']['S'])
+        return {'Item': dict(item)} if item else {}
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None):
+        if ConditionExpression is not None:
+            current = self.items.get(Item['pk']['S'])
+            now = float(ExpressionAttributeValues[':now']['N'])
+            live = current is not None and float(current['expires_at']['N']) > now
+            if ':expected' in ExpressionAttributeValues:
+                allowed = live and current['value'] == ExpressionAttributeValues[':expected']
+            else:
+                allowed = not live
+            if not allowed:
+                raise FakeClientError('ConditionalCheckFailedException')
+        self.items[Item['pk']['S']] = dict(Item)
+
+    def delete_item(self, TableName, Key, ReturnValues='NONE'):
+        item = self.items.pop(Key['pk']['S'], None)
+        return {'Attributes': item} if item else {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeValues):
+        item = self.items.setdefault(Key['pk']['S'], dict(Key))
+        members = set(item.get('members', {}).get('SS', ()))
+        change = set(ExpressionAttributeValues[':member']['SS'])
+        if UpdateExpression.startswith('ADD'):
+            members |= change
+            item['expires_at'] = ExpressionAttributeValues[':expires_at']
+        else:
+            members -= change
+        if members:
+            item['members'] = {'SS': sorted(members)}
+        else:
+            item.pop('members', None)
+
+
+def test_create_store_from_configuration(monkeypatch):
+    monkeypatch.delenv('CONNECTION_STORE', raising=False)
+    assert isinstance(create_store(), MemoryConnectionStore)
+
+    monkeypatch.setenv('CONNECTION_STORE', 'dynamodb')
+    monkeypatch.setenv('CONNECTION_TABLE', 'connections-test')
+    store = create_store()
+    assert isinstance(store, KeyValueConnectionStore)
+    assert isinstance(store.backend, DynamoDBKeyValueBackend)
+    assert store.backend.table_name == 'connections-test'
+
+
+def test_dynamodb_store_shares_state_and_rooms():
+    client = FakeDynamoDBClient()
+    first = ConnectionRegistry(KeyValueConnectionStore(DynamoDBKeyValueBackend('t', client=client)))
+    second = ConnectionRegistry(KeyValueConnectionStore(DynamoDBKeyValueBackend('t', client=client)))
+
+    first.connect('signer-1', 'cam-1', 'compact', session_id='class-1')
+    state = second.get('signer-1')
+    assert (state.device_id, state.response_format, state.session_id) == ('cam-1', 'compact', 'class-1')
+    assert second.begin_sequence(state, 5)
+    assert not first.begin_sequence(first.get('signer-1'), 4)
+
+    first.subscribe('viewer-1', 'class-1')
+    assert second.subscribers('class-1') == ['viewer-1']
+    second.disconnect('viewer-1')
+    assert first.subscribers('class-1') == []
+    assert first.get('viewer-1') is None
+
+
+def test_compare_and_put_only_replaces_the_expected_value():
+    now = [1000.0]
+    for backend in (LocalKeyValueBackend(clock=lambda: now[0]),
+                    DynamoDBKeyValueBackend('t', client=FakeDynamoDBClient(), clock=lambda: now[0])):
+        assert backend.compare_and_put('k', b'1', None, 60)
+        assert not backend.compare_and_put('k', b'2', None, 60)
+        assert not backend.compare_and_put('k', b'2', b'0', 60)
+        assert backend.compare_and_put('k', b'2', b'1', 60)
+        assert backend.get('k') == b'2'
+
+        # An expired value counts as absent
+        now[0] += 61
+        assert not backend.compare_and_put('k', b'3', b'2', 60)
+        assert backend.compare_and_put('k', b'3', None, 60)
@@ -0,0 +1,24 @@
+import base64
+import hashlib
+
+import pytest
+
+from bench_frame_copies import make_jpeg
+from frame import HASH_BASE64_CHARS, Frame, FrameError
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 4096, HASH_BASE64_CHARS // 4 * 3 + 1, 200000])
+def test_cache_key_and_size_match_across_forms(size):
+    raw = make_jpeg(size)[:size]
+    encoded = base64.b64encode(raw).decode('ascii')
+    from_base64, from_bytes = Frame.from_base64(encoded), Frame.from_bytes(raw)
+
+    expected = hashlib.blake2b(encoded.encode('ascii'), digest_size=16).hexdigest()
+    assert from_base64.cache_key == from_bytes.cache_key == expected
+    assert from_base64.size_bytes == len(raw)
+    assert from_bytes.base64 == encoded
+
+
+def test_non_ascii_frame_is_rejected_when_keyed():
+    with pytest.raises(FrameError):
+        Frame.from_base64('QUJD' * 100 + 'é===').cache_key
@@ -0,0 +1,80 @@
+import json
+
+import optimized_handler
+
+
+def process(frame_data, **fields):
+    return optimized_handler.process_sign_optimized({'body': json.dumps({'frame_data': frame_data, **fields})}, None)
+
+
+def test_batch_after_process_returns_model_result(fake_model, frame_data):
+    response = process(frame_data, device_id='cache-test')
+    assert json.loads(response['body'])['translation'] == 'HELLO'
+
+    response = optimized_handler.process_batch({'body': json.dumps({
+        'device_id': 'cache-test',
+        'frames': [{'frame_data': frame_data, 'timestamp': '1'}]
+    })}, None)
+    result = json.loads(response['body'])['results'][0]
+    assert result['status'] == 'ok'
+    assert result['cache_hit']
+    assert result['translation'] == 'HELLO'
+    assert fake_model.invocations == 1
+
+
+def test_repeated_process_cache_hit_returns_model_result(fake_model, frame_data):
+    process(frame_data, device_id='repeat-test')
+    body = json.loads(process(frame_data, device_id='repeat-test')['body'])
+    assert body['cache_hit']
+    assert body['translation'] == 'HELLO'
+
+
+def test_stale_frame_is_answered_with_model_result(fake_model, frame_data):
+    process(frame_data, device_id='stale-test', sequence=1)
+    # A cache hit completes a newer frame
+    process(frame_data, device_id='stale-test', sequence=3)
+    body = json.loads(process(frame_data, device_id='stale-test', sequence=2)['body'])
+    assert body['stale']
+    assert body['translation'] == 'HELLO'
+
+
+def test_non_finite_timestamp_is_rejected(fake_model, frame_data):
+    for timestamp in ('nan', 'inf', '-Infinity', float('nan')):
+        response = process(frame_data, device_id='nan-test', timestamp=timestamp)
+        assert response['statusCode'] == 400
+
+    # The device's ordering is unaffected, so later frames are processed normally
+    body = json.loads(process(frame_data, device_id='nan-test', timestamp='1750507200')['body'])
+    assert body['translation'] == 'HELLO'
+    assert not body['stale']
+
+
+def test_infinite_sequence_is_rejected(frame_data):
+    response = optimized_handler.process_sign_optimized(
+        {'body': '{"frame_data": "%s", "sequence": Infinity}' % frame_data}, None
+    )
+    assert response['statusCode'] == 400
+
+
+def test_batch_with_mixed_frame_types_fails_per_frame(fake_model, frame_data):
+    response = optimized_handler.process_batch({'body': json.dumps({
+        'device_id': 'mixed-test',
+        'frames': [{'frame_data': frame_data}, {'frame_data': 42}, {'frame_data': None},
+                   {'frame_data': {'image': frame_data}}, 'not-an-object']
+    })}, None)
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert [result['status'] for result in body['results']] == ['ok'] + ['invalid'] * 4
+    assert body['results'][0]['translation'] == 'HELLO'
+
+
+def test_anonymous_clients_are_not_sequenced_against_each_other(fake_model, frame_data):
+    # Two clients without a device id, the second with a slower clock
+    first = json.loads(process(frame_data, timestamp='1750507200', sequence=5)['body'])
+    second = json.loads(process(frame_data, timestamp='1750507100', sequence=1)['body'])
+    first_again = json.loads(process(frame_data, timestamp='1750507201', sequence=6)['body'])
+    second_again = json.loads(process(frame_data, timestamp='1750507101', sequence=2)['body'])
+
+    for body in (first, second, first_again, second_again):
+        assert not body['stale']
+        assert body['translation'] == 'HELLO'
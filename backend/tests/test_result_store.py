@@ -0,0 +1,49 @@
+import threading
+import time
+
+from result_store import FlushExtension, ResultStore
+
+
+class HangingS3:
+    """S3 client whose writes block until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.objects = 0
+
+    def put_object(self, **kwargs):
+        self.release.wait()
+        self.objects += 1
+
+
+def test_post_response_flush_stops_waiting_at_its_timeout():
+    client = HangingS3()
+    store = ResultStore('results-bucket', client_factory=lambda: client)
+    extension = FlushExtension(store, 'localhost:9001', flush_timeout=0.1)
+    store.put('device', {'translation': 'HELLO'})
+
+    start = time.monotonic()
+    assert not extension.flush(deadline=time.time() + 60)
+    assert time.monotonic() - start < 1.0
+    assert extension.flush_timeouts == 1
+
+    client.release.set()
+    for _ in range(100):
+        if store.get_stats()['records_written']:
+            break
+        time.sleep(0.01)
+    stats = store.get_stats()
+    assert stats['records_written'] == 1
+    assert stats['objects_written'] == 1
+
+
+def test_flush_never_runs_into_the_deadline_margin():
+    client = HangingS3()
+    store = ResultStore('results-bucket', client_factory=lambda: client)
+    extension = FlushExtension(store, 'localhost:9001', flush_timeout=30)
+    store.put('device', {'translation': 'HELLO'})
+
+    start = time.monotonic()
+    assert not extension.flush(deadline=time.time() + 0.6)
+    assert time.monotonic() - start < 0.5
+    client.release.set()
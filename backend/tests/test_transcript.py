@@ -0,0 +1,51 @@
+from connection_registry import LocalKeyValueBackend
+from transcript import SharedTranscriptRegistry, TranscriptBuilder, TranscriptRegistry
+
+FRAMES = [('HELLO', 0.8), ('HELLO', 0.9), ('HELP', 0.4), ('HELLO', 0.7), (None, 0.0), (None, 0.0),
+          ('MY', 0.8), ('NAME', 0.5), ('MY', 0.9), ('NAME', 0.8), ('NAME', 0.9)]
+
+
+class ConflictingBackend(LocalKeyValueBackend):
+    """Loses the first conditional write, as if another container wrote first"""
+
+    def __init__(self):
+        super().__init__()
+        self.lost = False
+
+    def compare_and_put(self, key, value, expected, ttl_seconds):
+        if not self.lost:
+            self.lost = True
+            return False
+        return super().compare_and_put(key, value, expected, ttl_seconds)
+
+
+def test_containers_continue_one_shared_transcript():
+    backend = LocalKeyValueBackend()
+    containers = [SharedTranscriptRegistry(backend), SharedTranscriptRegistry(backend)]
+    local = TranscriptBuilder()
+
+    for i, (gloss, confidence) in enumerate(FRAMES):
+        assert containers[i % 2].observe('class-1', gloss, confidence) == local.observe(gloss, confidence)
+
+    assert containers[0].peek('class-1').snapshot() == local.snapshot()
+    containers[1].forget('class-1')
+    assert containers[0].peek('class-1') is None
+
+
+def test_lost_write_is_retried():
+    registry = SharedTranscriptRegistry(ConflictingBackend(), stability_frames=1)
+    update = registry.observe('class-1', 'HELLO', 0.8)
+
+    assert update['version'] == 1
+    assert registry.peek('class-1').text() == 'HELLO'
+    assert registry.get_stats()['conflicts'] == 1
+
+
+def test_idle_transcripts_expire():
+    now = [1000.0]
+    registry = TranscriptRegistry(ttl_seconds=60, clock=lambda: now[0], stability_frames=1)
+    registry.observe('class-1', 'HELLO', 0.8)
+
+    now[0] += 61
+    assert registry.peek('class-1') is None
+    assert registry.get_stats()['expirations'] == 1
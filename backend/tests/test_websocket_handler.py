@@ -0,0 +1,65 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from bedrock_gateway import gateway, Endpoint
+from connection_registry import UPDATES_DELTA, connections
+from fake_bedrock import FakeBedrockClient, LatencyProfile
+from transcript import transcripts
+from websocket_delivery import MessageDelivery
+from websocket_handler import WebSocketProcessor
+
+
+class RecordingClient:
+    """Management API client that keeps what was posted"""
+
+    def __init__(self):
+        self.messages = []
+
+    def post_to_connection(self, ConnectionId, Data):
+        self.messages.append((ConnectionId, json.loads(Data)))
+
+
+@pytest.fixture
+def unparseable_model():
+    saved = list(gateway.endpoints)
+    profile = LatencyProfile(latency=0.0, reply='I cannot tell what this sign is')
+    gateway.endpoints[:] = [Endpoint('fake', client=FakeBedrockClient(profile))]
+    yield
+    gateway.endpoints[:] = saved
+
+
+def test_raw_model_response_stays_out_of_transcript(unparseable_model, frame_data):
+    client = RecordingClient()
+    processor = WebSocketProcessor('https://example.test/prod', MessageDelivery(client_factory=lambda url: client))
+    state = connections.connect('raw-signer', updates=UPDATES_DELTA)
+
+    for sequence in range(3):
+        result = processor.process_frame_realtime(frame_data, 'raw-signer', state=state, sequence=sequence)
+        assert result['confidence'] == 0.0
+    processor.drain()
+
+    assert transcripts.peek('raw-signer') is None
+    assert not [message for _, message in client.messages if message['type'] == 'transcript_delta']
+    connections.disconnect('raw-signer')
+
+
+def test_replies_carry_a_real_timestamp(fake_model, frame_data):
+    client = RecordingClient()
+    processor = WebSocketProcessor('https://example.test/prod', MessageDelivery(client_factory=lambda url: client))
+    processor.process_frame_realtime(frame_data, 'timestamp-client', sequence=1)
+    processor.drain()
+
+    assert [message['type'] for _, message in client.messages] == ['processing_started', 'translation_result']
+    for _, message in client.messages:
+        assert message['timestamp'].endswith('Z')
+        datetime.fromisoformat(message['timestamp'][:-1])
+
+
+def test_raw_model_response_is_not_replayed_from_cache(unparseable_model, frame_data):
+    processor = WebSocketProcessor('https://example.test/prod', MessageDelivery(client_factory=lambda url: RecordingClient()))
+    for _ in range(2):
+        result = processor.process_frame_realtime(frame_data, 'raw-cache-client')
+        assert not result['cache_hit']
+    processor.drain()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Running transcripts assembled from per-frame glosses, pushed as deltas
+
+Consecutive frames of one sign mostly return the same gloss with the odd
+misread in between. Observations are grouped into segments, one per sign:
+- A segment's gloss is shown once it has been seen stability_frames times.
+- The shown gloss is the one with the highest summed confidence in the segment.
+- A different gloss starts a new segment only after stability_frames frames in a row.
+- Shorter runs fold back into the current segment, where they can revise its gloss.
+- gap_frames no-sign frames end a segment, so only a sign repeated after a pause is a new token.
+Only appends and revisions are reported, never unchanged frames.
+
+Transcripts live wherever the connection store keeps session rooms: in the
+container for the memory store, or in the shared key-value backend, so that
+every container handling a session continues the same transcript.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Callable, Union
+
+from bedrock_prompts import COMPACT_NO_SIGN, NO_SIGN_TRANSLATION
+from connection_registry import (
+    DEFAULT_CONNECTION_TTL_SECONDS, KeyValueBackend, KeyValueConnectionStore, connections
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STABILITY_FRAMES = 2
+DEFAULT_GAP_FRAMES = 2
+# Frames below this confidence are noise: neither a sign nor a pause
+DEFAULT_MIN_CONFIDENCE = 0.3
+DEFAULT_MAX_TOKENS = 500
+DEFAULT_MAX_TRANSCRIPTS = 5000
+# Idle time after which a transcript is dropped; sessions outlive any one
+# signer connection, so they are not removed on $disconnect
+DEFAULT_TRANSCRIPT_TTL_SECONDS = DEFAULT_CONNECTION_TTL_SECONDS
+# Read-modify-write attempts against a shared transcript before a frame is skipped
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+@dataclass
+class TranscriptToken:
+    """One sign in a transcript"""
+    text: str
+    confidence: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'text': self.text, 'confidence': round(self.confidence, 3)}
+
+
+class _Votes:
+    """Summed confidence and frame count per gloss"""
+
+    def __init__(self):
+        self.weights: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, gloss: str, confidence: float, count: int = 1) -> None:
+        self.weights[gloss] = self.weights.get(gloss, 0.0) + confidence
+        self.counts[gloss] = self.counts.get(gloss, 0) + count
+
+    def merge(self, other: '_Votes') -> None:
+        for gloss, weight in other.weights.items():
+            self.add(gloss, weight, other.counts[gloss])
+
+    def leader(self) -> Optional[str]:
+        return max(self.weights, key=self.weights.get) if self.weights else None
+
+    def mean_confidence(self, gloss: str) -> float:
+        return self.weights[gloss] / self.counts[gloss]
+
+    def to_state(self) -> List[Dict[str, Any]]:
+        return [self.weights, self.counts]
+
+    @classmethod
+    def from_state(cls, state: List[Dict[str, Any]]) -> '_Votes':
+        votes = cls()
+        votes.weights, votes.counts = dict(state[0]), dict(state[1])
+        return votes
+
+
+def is_no_sign(gloss: Optional[str]) -> bool:
+    return not gloss or gloss == NO_SIGN_TRANSLATION or gloss.upper() == COMPACT_NO_SIGN
+
+
+class TranscriptBuilder:
+    """
+    Transcript of one session.
+
+    observe() folds in a frame's gloss and returns the resulting update,
+    {'version': n, 'deltas': [...]}, or None when the transcript did not
+    change. Each delta is {'op': 'append' | 'revise', 'index', 'text',
+    'confidence'}; indices are absolute even after old tokens are trimmed.
+    """
+
+    def __init__(self, stability_frames: int = DEFAULT_STABILITY_FRAMES,
+                 gap_frames: int = DEFAULT_GAP_FRAMES,
+                 min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                 max_tokens: int = DEFAULT_MAX_TOKENS):
+        self.stability_frames = max(1, stability_frames)
+        self.gap_frames = max(1, gap_frames)
+        self.min_confidence = min_confidence
+        self.max_tokens = max_tokens
+
+        self.tokens: List[TranscriptToken] = []
+        self.trimmed = 0  # tokens dropped from the front to stay under max_tokens
+        self.version = 0
+        self._lock = threading.Lock()
+        self._segment = _Votes()
+        self._segment_index: Optional[int] = None  # token index once the segment is shown
+        self._run = _Votes()  # consecutive frames of a gloss other than the segment's
+        self._run_gloss: Optional[str] = None
+        self._gap = 0
+
+        self.observations = 0
+        self.ignored = 0
+        self.appends = 0
+        self.revisions = 0
+
+    def observe(self, gloss: Optional[str], confidence: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self.observations += 1
+            if is_no_sign(gloss):
+                self._end_run()
+                self._gap += 1
+                if self._gap >= self.gap_frames:
+                    self._close_segment()
+                return self._update(self._refresh())
+            if confidence < self.min_confidence:
+                self.ignored += 1
+                return None
+
+            self._gap = 0
+            leader = self._segment.leader()
+            if leader is None or gloss == leader:
+                self._end_run()
+                self._segment.add(gloss, confidence)
+                return self._update(self._refresh())
+
+            if gloss != self._run_gloss:
+                self._end_run()
+                self._run_gloss = gloss
+            self._run.add(gloss, confidence)
+            if self._run.counts[gloss] < self.stability_frames:
+                return None
+
+            # A run long enough to be its own sign starts the next segment
+            self._close_segment()
+            self._segment, self._run, self._run_gloss = self._run, _Votes(), None
+            return self._update(self._refresh())
+
+    def _end_run(self) -> None:
+        """A run too short to be a sign belongs to the current one (misreads or better readings)"""
+        if self._run_gloss is not None:
+            self._segment.merge(self._run)
+            self._run, self._run_gloss = _Votes(), None
+
+    def _close_segment(self) -> None:
+        """Finish the current segment; one that was never shown is dropped as flicker"""
+        self._segment = _Votes()
+        self._segment_index = None
+
+    def _refresh(self) -> List[Dict[str, Any]]:
+        """Show or revise the current segment's token; returns the deltas"""
+        leader = self._segment.leader()
+        if leader is None:
+            return []
+        confidence = self._segment.mean_confidence(leader)
+
+        if self._segment_index is None:
+            if self._segment.counts[leader] < self.stability_frames:
+                return []
+            self._segment_index = self.trimmed + len(self.tokens)
+            self.tokens.append(TranscriptToken(leader, confidence))
+            if len(self.tokens) > self.max_tokens:
+                del self.tokens[0]
+                self.trimmed += 1
+            self.appends += 1
+            return [{'op': 'append', 'index': self._segment_index, **self.tokens[-1].to_dict()}]
+
+        position = self._segment_index - self.trimmed
+        if position < 0:
+            return []
+        token = self.tokens[position]
+        token.confidence = confidence
+        if token.text == leader:
+            return []
+        token.text = leader
+        self.revisions += 1
+        return [{'op': 'revise', 'index': self._segment_index, **token.to_dict()}]
+
+    def _update(self, deltas: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not deltas:
+            return None
+        self.version += 1
+        return {'version': self.version, 'deltas': deltas}
+
+    def text(self) -> str:
+        with self._lock:
+            return ' '.join(token.text for token in self.tokens)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Whole transcript, for clients joining late or resynchronizing after a missed version"""
+        with self._lock:
+            return {
+                'version': self.version,
+                'start_index': self.trimmed,
+                'tokens': [token.to_dict() for token in self.tokens]
+            }
+
+    def to_state(self) -> Dict[str, Any]:
+        """Everything observe() needs to carry on, for keeping the transcript outside the process"""
+        with self._lock:
+            return {
+                'tokens': [[token.text, token.confidence] for token in self.tokens],
+                'trimmed': self.trimmed,
+                'version': self.version,
+                'segment': self._segment.to_state(),
+                'segment_index': self._segment_index,
+                'run': self._run.to_state(),
+                'run_gloss': self._run_gloss,
+                'gap': self._gap,
+                'stats': [self.observations, self.ignored, self.appends, self.revisions]
+            }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], **settings) -> 'TranscriptBuilder':
+        builder = cls(**settings)
+        builder.tokens = [TranscriptToken(text, confidence) for text, confidence in state['tokens']]
+        builder.trimmed = state['trimmed']
+        builder.version = state['version']
+        builder._segment = _Votes.from_state(state['segment'])
+        builder._segment_index = state['segment_index']
+        builder._run = _Votes.from_state(state['run'])
+        builder._run_gloss = state['run_gloss']
+        builder._gap = state['gap']
+        builder.observations, builder.ignored, builder.appends, builder.revisions = state['stats']
+        return builder
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'tokens': self.trimmed + len(self.tokens),
+                'observations': self.observations,
+                'ignored': self.ignored,
+                'appends': self.appends,
+                'revisions': self.revisions,
+                'pushes': self.version
+            }
+
+
+class TranscriptRegistry:
+    """
+    Transcripts by session (or connection) id, in this container. The least
+    recently used are evicted, and any left idle for ttl_seconds are dropped.
+    """
+
+    def __init__(self, max_transcripts: int = DEFAULT_MAX_TRANSCRIPTS,
+                 ttl_seconds: float = DEFAULT_TRANSCRIPT_TTL_SECONDS,
+                 clock: Callable[[], float] = time.time, **settings):
+        self.max_transcripts = max_transcripts
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.settings = settings
+        self._transcripts: 'OrderedDict[str, TranscriptBuilder]' = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+        self.observations = 0
+        self.pushes = 0
+
+    def _expire(self, now: float) -> None:
+        """Drop idle transcripts; least recently used first, so only the front is checked"""
+        while self._transcripts:
+            key = next(iter(self._transcripts))
+            if now - self._last_used[key] < self.ttl_seconds:
+                break
+            del self._transcripts[key], self._last_used[key]
+            self.expirations += 1
+
+    def get(self, key: str) -> TranscriptBuilder:
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            builder = self._transcripts.get(key)
+            if builder is None:
+                builder = self._transcripts[key] = TranscriptBuilder(**self.settings)
+                while len(self._transcripts) > self.max_transcripts:
+                    evicted, _ = self._transcripts.popitem(last=False)
+                    del self._last_used[evicted]
+                    self.evictions += 1
+            self._transcripts.move_to_end(key)
+            self._last_used[key] = now
+            return builder
+
+    def peek(self, key: str) -> Optional[TranscriptBuilder]:
+        with self._lock:
+            self._expire(self.clock())
+            return self._transcripts.get(key)
+
+    def observe(self, key: str, gloss: Optional[str], confidence: float) -> Optional[Dict[str, Any]]:
+        update = self.get(key).observe(gloss, confidence)
+        with self._lock:
+            self.observations += 1
+            self.pushes += update is not None
+        return update
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            if self._transcripts.pop(key, None) is not None:
+                del self._last_used[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'transcripts': len(self._transcripts),
+                'observations': self.observations,
+                'pushes': self.pushes,
+                'push_ratio': round(self.pushes / self.observations, 3) if self.observations else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class SharedTranscriptRegistry:
+    """
+    Transcripts in a key-value backend, shared by every container.
+
+    Each frame reads the transcript, folds the frame in and writes it back
+    only if no other container wrote it in between, retrying otherwise, so
+    versions and indices stay consistent for viewers whichever container
+    handled the frame. A transcript expires ttl_seconds after its last frame.
+    """
+
+    def __init__(self, backend: KeyValueBackend, ttl_seconds: float = DEFAULT_TRANSCRIPT_TTL_SECONDS,
+                 key_prefix: str = 'transcript:', max_attempts: int = DEFAULT_MAX_ATTEMPTS, **settings):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        self.max_attempts = max_attempts
+        self.settings = settings
+        self._lock = threading.Lock()
+        self.observations = 0
+        self.pushes = 0
+        self.conflicts = 0
+        self.skipped = 0
+
+    def _decode(self, value: Optional[bytes]) -> Optional[TranscriptBuilder]:
+        if value is None:
+            return None
+        try:
+            return TranscriptBuilder.from_state(json.loads(value), **self.settings)
+        except (TypeError, ValueError, KeyError, IndexError) as e:
+            logger.warning(f"Discarding unreadable transcript: {e}")
+            return None
+
+    def peek(self, key: str) -> Optional[TranscriptBuilder]:
+        """Copy of the stored transcript"""
+        return self._decode(self.backend.get(self.key_prefix + key))
+
+    def observe(self, key: str, gloss: Optional[str], confidence: float) -> Optional[Dict[str, Any]]:
+        for _ in range(self.max_attempts):
+            stored = self.backend.get(self.key_prefix + key)
+            builder = self._decode(stored) or TranscriptBuilder(**self.settings)
+            update = builder.observe(gloss, confidence)
+            value = json.dumps(builder.to_state(), separators=(',', ':')).encode('utf-8')
+            if self.backend.compare_and_put(self.key_prefix + key, value, stored, self.ttl_seconds):
+                with self._lock:
+                    self.observations += 1
+                    self.pushes += update is not None
+                return update
+            with self._lock:
+                self.conflicts += 1
+
+        # Another container keeps winning; its frames carry the transcript on
+        logger.warning(f"Transcript {key} kept changing underneath, skipping a frame")
+        with self._lock:
+            self.skipped += 1
+        return None
+
+    def forget(self, key: str) -> None:
+        self.backend.delete(self.key_prefix + key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'observations': self.observations,
+                'pushes': self.pushes,
+                'push_ratio': round(self.pushes / self.observations, 3) if self.observations else 0.0,
+                'conflicts': self.conflicts,
+                'skipped': self.skipped
+            }
+
+
+def create_registry() -> Union[TranscriptRegistry, SharedTranscriptRegistry]:
+    """Transcripts kept next to the session rooms: in the container, or in the shared backend"""
+    settings = {
+        'stability_frames': int(os.environ.get('TRANSCRIPT_STABILITY_FRAMES', DEFAULT_STABILITY_FRAMES)),
+        'gap_frames': int(os.environ.get('TRANSCRIPT_GAP_FRAMES', DEFAULT_GAP_FRAMES)),
+        'min_confidence': float(os.environ.get('TRANSCRIPT_MIN_CONFIDENCE', DEFAULT_MIN_CONFIDENCE))
+    }
+    store = connections.store
+    if isinstance(store, KeyValueConnectionStore):
+        return SharedTranscriptRegistry(store.backend, ttl_seconds=store.ttl_seconds, **settings)
+    return TranscriptRegistry(**settings)
+
+
+# Global transcripts shared by all handlers in the container
+transcripts = create_registry()
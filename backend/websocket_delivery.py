@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Pooled WebSocket message delivery through the API Gateway Management API:
+one client per endpoint, concurrent posts and automatic pruning of gone
+connections
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Any, Optional, Callable, List, Iterable, Union
+
+logger = logging.getLogger(__name__)
+
+# Concurrent posts per container; each holds one pooled HTTPS connection
+DEFAULT_MAX_WORKERS = 8
+
+# Posts in flight at once for one broadcast
+DEFAULT_BROADCAST_WINDOW = 64
+
+# Connection ids remembered as gone so later sends skip them
+MAX_GONE_CONNECTIONS = 4096
+
+GONE_ERROR_CODES = {'GoneException', 'ForbiddenException'}
+
+LATENCY_EWMA_ALPHA = 0.2
+
+
+def encode_message(message: Union[bytes, Dict[str, Any]]) -> bytes:
+    """Compact JSON body for a message; bytes are posted as they are"""
+    if isinstance(message, (bytes, bytearray)):
+        return bytes(message)
+    return json.dumps(message, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def is_gone_error(error: Exception) -> bool:
+    """Check whether a post failed because the connection no longer exists"""
+    if type(error).__name__ in GONE_ERROR_CODES:
+        return True
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code') in GONE_ERROR_CODES
+    return False
+
+
+class MessageDelivery:
+    """
+    Posts messages to WebSocket connections.
+
+    Clients are cached per endpoint URL for the life of the container, and
+    posts run on a bounded thread pool so several messages (and recipients)
+    are in flight at once. Connections that answer 410 Gone are remembered,
+    skipped from then on and reported to the on_gone listeners.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS,
+                 client_factory: Optional[Callable[[str], Any]] = None):
+        self.max_workers = max_workers
+        self.client_factory = client_factory or self._create_client
+        self._clients: Dict[str, Any] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._gone: 'OrderedDict[str, float]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.on_gone: List[Callable[[str], None]] = []
+
+        self.sent = 0
+        self.failed = 0
+        self.gone = 0
+        self.skipped = 0
+        self.broadcasts = 0
+        self.broadcast_recipients = 0
+        self.bytes_sent = 0
+        self.ewma_latency = 0.0
+        self.max_latency = 0.0
+
+    def _create_client(self, endpoint_url: str) -> Any:
+        import boto3
+        from botocore.config import Config
+
+        # A post is small and the caller is waiting on it, so fail fast
+        return boto3.client(
+            'apigatewaymanagementapi',
+            endpoint_url=endpoint_url,
+            config=Config(
+                connect_timeout=2,
+                read_timeout=5,
+                max_pool_connections=self.max_workers,
+                tcp_keepalive=True,
+                retries={'max_attempts': 2, 'mode': 'standard'}
+            )
+        )
+
+    def get_client(self, endpoint_url: str) -> Any:
+        """Management API client for an endpoint, created on first use"""
+        client = self._clients.get(endpoint_url)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(endpoint_url)
+                if client is None:
+                    client = self._clients[endpoint_url] = self.client_factory(endpoint_url)
+        return client
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='ws-delivery')
+        return self._executor
+
+    def is_gone(self, connection_id: str) -> bool:
+        with self._lock:
+            return connection_id in self._gone
+
+    def mark_gone(self, connection_id: str) -> None:
+        """Stop delivering to a connection and notify listeners"""
+        with self._lock:
+            if connection_id in self._gone:
+                return
+            self._gone[connection_id] = time.time()
+            while len(self._gone) > MAX_GONE_CONNECTIONS:
+                self._gone.popitem(last=False)
+            self.gone += 1
+        for listener in self.on_gone:
+            try:
+                listener(connection_id)
+            except Exception as e:
+                logger.error(f"Gone-connection listener failed for {connection_id}: {e}")
+
+    def post(self, endpoint_url: str, connection_id: str, data: bytes) -> bool:
+        """Post an encoded message and wait for it; returns whether it was delivered"""
+        if self.is_gone(connection_id):
+            with self._lock:
+                self.skipped += 1
+            return False
+
+        start_time = time.perf_counter()
+        try:
+            self.get_client(endpoint_url).post_to_connection(ConnectionId=connection_id, Data=data)
+        except Exception as e:
+            if is_gone_error(e):
+                logger.info(f"Connection {connection_id} is gone, pruning it")
+                self.mark_gone(connection_id)
+            else:
+                logger.error(f"Failed to send message to {connection_id}: {e}")
+                with self._lock:
+                    self.failed += 1
+            return False
+
+        latency = time.perf_counter() - start_time
+        with self._lock:
+            self.sent += 1
+            self.bytes_sent += len(data)
+            if self.sent == 1:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency += LATENCY_EWMA_ALPHA * (latency - self.ewma_latency)
+            self.max_latency = max(self.max_latency, latency)
+        return True
+
+    def send(self, endpoint_url: str, connection_id: str,
+             message: Union[bytes, Dict[str, Any]]) -> 'Future[bool]':
+        """Queue a message for a connection; the future resolves to whether it was delivered"""
+        return self.executor.submit(self.post, endpoint_url, connection_id, encode_message(message))
+
+    def broadcast(self, endpoint_url: str, connection_ids: Iterable[str],
+                  message: Union[bytes, Dict[str, Any]],
+                  window: int = DEFAULT_BROADCAST_WINDOW) -> int:
+        """
+        Post one message to many connections and return how many received it.
+
+        The message is serialized once. Posts run on the pool with at most
+        `window` queued at a time, so a large room neither floods the pool's
+        queue nor holds every future in memory; gone connections are pruned
+        as their posts fail.
+        """
+        data = encode_message(message)
+        recipients = iter(connection_ids)
+        in_flight = set()
+        delivered = 0
+        count = 0
+        while True:
+            for connection_id in recipients:
+                in_flight.add(self.executor.submit(self.post, endpoint_url, connection_id, data))
+                count += 1
+                if len(in_flight) >= window:
+                    break
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            delivered += sum(1 for future in done if future.exception() is None and future.result())
+
+        with self._lock:
+            self.broadcasts += 1
+            self.broadcast_recipients += count
+        return delivered
+
+    def drain(self, futures: Iterable['Future[bool]'], timeout: Optional[float] = None) -> int:
+        """
+        Wait for queued sends and return how many were delivered.
+
+        Lambda freezes the sandbox once the handler returns, so handlers
+        drain their sends before returning.
+        """
+        done, _ = wait(list(futures), timeout=timeout)
+        return sum(1 for future in done if future.exception() is None and future.result())
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'sent': self.sent,
+                'failed': self.failed,
+                'gone': self.gone,
+                'skipped': self.skipped,
+                'broadcasts': self.broadcasts,
+                'broadcast_recipients': self.broadcast_recipients,
+                'bytes_sent': self.bytes_sent,
+                'ewma_latency_ms': round(self.ewma_latency * 1000, 1),
+                'max_latency_ms': round(self.max_latency * 1000, 1),
+                'endpoints': len(self._clients),
+                'max_workers': self.max_workers
+            }
+
+
+# Global delivery pool shared by all WebSocket handlers in the container
+delivery = MessageDelivery(int(os.environ.get('WEBSOCKET_MAX_WORKERS', DEFAULT_MAX_WORKERS)))
@@ -4,129 +4,232 @@ WebSocket handler for real-time sign language processing
 """
 
 import json
-import boto3
-import base64
-import os
-from typing import Dict, Any
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Union
 import logging
 
+from bedrock_prompts import get_response_format, get_generation_params, parse_response
+from bedrock_gateway import gateway
+from deadline import RequestDeadline, start_request
+from frame import Frame
+from processing_optimizer import pipeline
+from websocket_delivery import MessageDelivery, delivery
+from connection_registry import ConnectionState, UPDATES_DELTA, UPDATE_MODES, connections
+from rate_control import rate_controller
+from frame_protocol import FrameMessage, FrameProtocolError, LatestFrameSlots, parse_websocket_frame
+from transcript import transcripts
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-bedrock_client = boto3.client('bedrock-runtime', region_name=os.environ.get('BEDROCK_REGION', 'us-east-1'))
-apigateway_client = boto3.client('apigatewaymanagementapi')
+# Forget connections as soon as a post finds them gone
+delivery.on_gone.append(connections.disconnect)
+
+# Frames waiting behind the one being processed, per connection. Only frames
+# arriving concurrently in this process are coalesced (the standalone server);
+# on Lambda each invocation gets its own container and begin_sequence alone
+# drops stale frames
+frame_slots = LatestFrameSlots()
+
+def utc_timestamp() -> str:
+    """Server time as ISO 8601 UTC, e.g. 2025-06-21T12:00:00.123Z"""
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
 
 class WebSocketProcessor:
     """Handles WebSocket connections and real-time processing"""
     
-    def __init__(self, endpoint_url: str):
+    def __init__(self, endpoint_url: str, message_delivery: MessageDelivery = delivery):
         self.endpoint_url = endpoint_url
-        self.apigateway_client = boto3.client(
-            'apigatewaymanagementapi',
-            endpoint_url=endpoint_url
-        )
+        self.delivery = message_delivery
+        self.pending: List[Future] = []
     
-    async def send_message(self, connection_id: str, message: Dict[str, Any]) -> bool:
-        """Send message to WebSocket client"""
-        try:
-            self.apigateway_client.post_to_connection(
-                ConnectionId=connection_id,
-                Data=json.dumps(message)
-            )
-            return True
-        except Exception as e:
-            logger.error(f"Failed to send message to {connection_id}: {e}")
+    def send_message(self, connection_id: str, message: Dict[str, Any]) -> Future:
+        """Queue a message for a WebSocket client; sends run concurrently with processing"""
+        future = self.delivery.send(self.endpoint_url, connection_id, message)
+        self.pending.append(future)
+        return future
+    
+    def broadcast(self, session_id: str, message: Dict[str, Any]) -> int:
+        """Send a message to every viewer of a session; returns how many received it"""
+        viewers = connections.subscribers(session_id)
+        if not viewers:
+            return 0
+        delivered = self.delivery.broadcast(self.endpoint_url, viewers, message)
+        # Gone viewers whose record already expired cannot be found by disconnect
+        connections.prune(session_id, [viewer for viewer in viewers if self.delivery.is_gone(viewer)])
+        return delivered
+    
+    def send_rate_hint(self, state: ConnectionState) -> bool:
+        """Tell the client to change its capture settings if backend load has changed them"""
+        hint = rate_controller.current()
+        if state.frame_interval_ms == hint.frame_interval_ms:
             return False
+        state.frame_interval_ms = hint.frame_interval_ms
+        connections.save(state)
+        self.send_message(state.connection_id, {'type': 'rate_control', **hint.to_dict()})
+        return True
+    
+    def push_transcript(self, state: Optional[ConnectionState], translation: Optional[str],
+                        confidence: float, tag: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Fold a frame's translation into the session transcript and push only
+        what changed: to the signer if it asked for deltas, and to viewers.
+        """
+        if state is None or not (state.session_id or state.updates == UPDATES_DELTA):
+            return None
+        update = transcripts.observe(state.session_id or state.connection_id, translation, confidence)
+        if update is None:
+            return None
+        
+        message = {'type': 'transcript_delta', **update, **tag}
+        if state.updates == UPDATES_DELTA:
+            self.send_message(state.connection_id, message)
+        if state.session_id:
+            self.broadcast(state.session_id, {**message, 'session_id': state.session_id})
+        return update
+    
+    def drain(self, deadline: Optional[RequestDeadline] = None) -> int:
+        """Wait for queued messages before the invocation ends; returns how many were delivered"""
+        pending, self.pending = self.pending, []
+        timeout = deadline.remaining() if deadline is not None else None
+        return self.delivery.drain(pending, timeout=timeout)
+    
+    def process_latest(self, message: FrameMessage, state: ConnectionState,
+                       deadline: Optional[RequestDeadline] = None) -> int:
+        """
+        Process a frame message latest-wins; returns how many frames were processed.
+        
+        Frames that arrive while the connection is busy wait in its single
+        slot, where each replaces the last, and frames older than one already
+        started are dropped.
+        """
+        connection_id = state.connection_id
+        process_now, _ = frame_slots.offer(connection_id, message)
+        if not process_now:
+            return 0
+        
+        processed = 0
+        try:
+            while message is not None:
+                if connections.begin_sequence(state, message.sequence, message.reset):
+                    self.process_frame_realtime(message.frame, connection_id, deadline, state,
+                                                message.sequence)
+                    processed += 1
+                message = frame_slots.next(connection_id)
+        except Exception:
+            frame_slots.discard(connection_id)
+            raise
+        return processed
     
-    def process_frame_realtime(self, frame_data: str, connection_id: str) -> Dict[str, Any]:
+    def infer(self, frame: Frame, metadata: Dict[str, Any], connection_id: str,
+              response_format: Optional[str] = None,
+              deadline: Optional[RequestDeadline] = None) -> Dict[str, Any]:
+        """Translate one frame with the pipeline's prompt through the shared gateway"""
+        response_format = get_response_format(response_format)
+        prompt = pipeline.optimize_prompt(metadata, response_format)
+        
+        reply = gateway.complete(
+            prompt, frame, get_generation_params(response_format, 150),
+            fallback_key=connection_id,
+            deadline=deadline
+        )
+        content = reply.text
+        
+        # Parse response in the requested format
+        try:
+            bedrock_result = parse_response(content, response_format)
+        except ValueError:
+            # Unparseable text is shown to the signer but never enters a transcript
+            bedrock_result = {
+                "translation": content[:50] + "..." if len(content) > 50 else content,
+                "confidence": 0.0,
+                "description": "Raw model response",
+                "raw_response": True
+            }
+        bedrock_result['degraded'] = reply.degraded
+        return bedrock_result
+    
+    def process_frame_realtime(self, frame_data: Union[Frame, str], connection_id: str,
+                               deadline: Optional[RequestDeadline] = None,
+                               state: Optional[ConnectionState] = None,
+                               sequence: Optional[int] = None) -> Dict[str, Any]:
         """Process frame and send real-time updates"""
         
-        # Send processing started message
-        self.send_message(connection_id, {
-            'type': 'processing_started',
-            'timestamp': json.dumps(None, default=str)
-        })
+        # Replies carry the frame's sequence number so clients can match them
+        tag = {'sequence': sequence} if sequence is not None else {}
+        
+        # Delta clients are only told when their transcript changes
+        deltas_only = state is not None and state.updates == UPDATES_DELTA
+        
+        # Processing started goes out while the frame is being processed
+        if not deltas_only:
+            self.send_message(connection_id, {
+                'type': 'processing_started',
+                'timestamp': utc_timestamp(),
+                **tag
+            })
         
         try:
-            # Quick frame validation
-            if not frame_data or len(frame_data) < 100:
+            frame = Frame.coerce(frame_data)
+            
+            # An unchanged frame gets the connection's last translation again
+            if (state is not None and state.last_translation is not None
+                    and state.last_frame_key == frame.cache_key):
                 result = {
                     'type': 'translation_result',
-                    'translation': 'Invalid frame data',
-                    'confidence': 0.0,
-                    'error': 'Frame too small or empty'
+                    'translation': state.last_translation,
+                    'confidence': state.last_confidence,
+                    'description': 'Unchanged frame',
+                    'repeated': True,
+                    'timestamp': utc_timestamp(),
+                    **tag
                 }
-                self.send_message(connection_id, result)
+                connections.record_frame(state, frame.cache_key)
+                # A held sign still counts towards the transcript's stability window
+                self.push_transcript(state, state.last_translation, state.last_confidence, tag)
+                if not deltas_only:
+                    self.send_message(connection_id, result)
                 return result
             
-            # Process with Bedrock (simplified for demo)
-            prompt = """
-            You are a sign language interpreter. Analyze this image for American Sign Language (ASL) signs.
-            
-            Respond in this exact JSON format:
-            {
-                "translation": "the interpreted text or 'No signs detected'",
-                "confidence": 0.0-1.0,
-                "description": "brief description of what you see"
-            }
-            
-            Keep responses concise and focus on common ASL signs.
-            """
-            
-            request_body = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 150,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text", 
-                                "text": prompt
-                            },
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/jpeg",
-                                    "data": frame_data
-                                }
-                            }
-                        ]
-                    }
-                ]
-            }
-            
-            # Call Bedrock
-            response = bedrock_client.invoke_model(
-                modelId="anthropic.claude-3-5-sonnet-20240620-v1:0",
-                body=json.dumps(request_body)
+            # Same stages as the HTTP path: validation, rate limiting and
+            # caching (keyed per connection), then the model on a miss
+            response_format = state.response_format if state is not None else None
+            outcome = pipeline.process_frame(
+                frame,
+                lambda image, metadata: self.infer(image, metadata, connection_id, response_format, deadline),
+                client_id=connection_id
             )
             
-            response_body = json.loads(response['body'].read())
-            content = response_body['content'][0]['text']
-            
-            # Parse JSON response
-            try:
-                bedrock_result = json.loads(content)
-            except json.JSONDecodeError:
-                bedrock_result = {
-                    "translation": content[:50] + "..." if len(content) > 50 else content,
-                    "confidence": 0.3,
-                    "description": "Raw model response"
-                }
-            
-            # Send final result
             result = {
                 'type': 'translation_result',
-                'translation': bedrock_result.get('translation', 'Processing error'),
-                'confidence': bedrock_result.get('confidence', 0.0),
-                'description': bedrock_result.get('description', ''),
-                'timestamp': json.dumps(None, default=str)
+                'translation': outcome.get('translation', 'Processing error'),
+                'confidence': outcome.get('confidence', 0.0),
+                'description': outcome.get('description', ''),
+                'hand_detected': outcome.get('hand_detected', False),
+                'cache_hit': outcome.get('cache_hit', False),
+                'timestamp': utc_timestamp(),
+                **tag
             }
+            if outcome.get('error'):
+                result['error'] = outcome['error']
+                self.send_message(connection_id, result)
+                return result
+            
+            if outcome.get('raw_response'):
+                if state is not None:
+                    connections.record_frame(state, frame.cache_key)
+                if not deltas_only:
+                    self.send_message(connection_id, result)
+                return result
+            
+            if state is not None:
+                connections.record_frame(state, frame.cache_key, result['translation'], result['confidence'])
+            if not deltas_only:
+                self.send_message(connection_id, result)
             
-            self.send_message(connection_id, result)
+            # Viewers of the signer's session get the transcript changes
+            self.push_transcript(state, result['translation'], result['confidence'], tag)
             return result
             
         except Exception as e:
@@ -135,7 +238,8 @@ class WebSocketProcessor:
                 'translation': 'Processing failed',
                 'confidence': 0.0,
                 'error': str(e),
-                'timestamp': json.dumps(None, default=str)
+                'timestamp': utc_timestamp(),
+                **tag
             }
             self.send_message(connection_id, error_result)
             return error_result
@@ -155,28 +259,82 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     try:
         if route_key == '$connect':
+            # Session settings are negotiated in the connection URL query string
+            query = event.get('queryStringParameters') or {}
+            response_format = query.get('format')
+            if response_format:
+                try:
+                    response_format = get_response_format(response_format)
+                except ValueError as e:
+                    logger.warning(f"Rejecting connection {connection_id}: {e}")
+                    return {'statusCode': 400}
+            updates = query.get('updates', 'full')
+            if updates not in UPDATE_MODES:
+                logger.warning(f"Rejecting connection {connection_id}: unknown updates mode {updates!r}")
+                return {'statusCode': 400}
+            
+            connections.connect(connection_id, query.get('device_id', 'default'), response_format,
+                                session_id=query.get('session'), updates=updates)
+            if query.get('watch'):
+                connections.subscribe(connection_id, query['watch'])
             logger.info(f"Client connected: {connection_id}")
             return {'statusCode': 200}
             
         elif route_key == '$disconnect':
+            connections.disconnect(connection_id)
+            pipeline.forget_client(connection_id)
+            transcripts.forget(connection_id)
             logger.info(f"Client disconnected: {connection_id}")
             return {'statusCode': 200}
             
-        elif route_key == 'process_frame':
-            # Parse message body
-            body = json.loads(event.get('body', '{}'))
-            frame_data = body.get('frame_data')
-            
-            if not frame_data:
+        elif route_key in ('process_frame', '$default'):
+            # JSON frames use the process_frame route; binary frames cannot be
+            # routed by action and arrive on $default
+            try:
+                message = parse_websocket_frame(event)
+            except FrameProtocolError as e:
                 processor.send_message(connection_id, {
                     'type': 'error',
-                    'message': 'No frame data provided'
+                    'message': str(e)
                 })
                 return {'statusCode': 400}
             
             # Process frame in real-time
-            result = processor.process_frame_realtime(frame_data, connection_id)
+            state = connections.get_or_connect(connection_id)
+            processor.process_latest(message, state, start_request(context))
+            processor.send_rate_hint(state)
+            
+            return {'statusCode': 200}
+            
+        elif route_key in ('subscribe', 'unsubscribe'):
+            # Viewers join or leave a signer's session room
+            body = json.loads(event.get('body') or '{}')
+            session_id = body.get('session_id')
+            if route_key == 'unsubscribe':
+                session_id = connections.unsubscribe(connection_id)
+            elif not session_id:
+                processor.send_message(connection_id, {
+                    'type': 'error',
+                    'message': 'No session_id provided'
+                })
+                return {'statusCode': 400}
+            else:
+                connections.subscribe(connection_id, session_id)
+            
+            processor.send_message(connection_id, {
+                'type': f"{route_key}d",
+                'session_id': session_id,
+                'viewers': len(connections.subscribers(session_id)) if session_id else 0
+            })
             
+            # New viewers start from the transcript so far, then get deltas
+            transcript = transcripts.peek(session_id) if route_key == 'subscribe' else None
+            if transcript is not None:
+                processor.send_message(connection_id, {
+                    'type': 'transcript',
+                    'session_id': session_id,
+                    **transcript.snapshot()
+                })
             return {'statusCode': 200}
             
         else:
@@ -185,11 +343,12 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
     except Exception as e:
         logger.error(f"WebSocket handler error: {e}")
-        try:
-            processor.send_message(connection_id, {
-                'type': 'error',
-                'message': f'Server error: {str(e)}'
-            })
-        except:
-            pass
-        return {'statusCode': 500}
\ No newline at end of file
+        processor.send_message(connection_id, {
+            'type': 'error',
+            'message': f'Server error: {str(e)}'
+        })
+        return {'statusCode': 500}
+    
+    finally:
+        # Messages must be posted before the sandbox is frozen
+        processor.drain(RequestDeadline.from_context(context))
\ No newline at end of file
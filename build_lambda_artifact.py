@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Build a minimal, precompiled Lambda deployment artifact for the backend
+
+Only the local modules reachable from the handler entry points are packaged,
+packages provided by the Lambda Python runtime (boto3, botocore, ...) are left
+out, and Pillow/NumPy go into an optional layer. Sources are precompiled to
+.pyc for the target Python so the first import skips compilation, and the
+script reports artifact size and the measured import time of each handler.
+"""
+
+import argparse
+import ast
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import zipfile
+from typing import Dict, List, Optional, Set, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(ROOT_DIR, 'backend')
+LAMBDA_DIR = os.path.join(BACKEND_DIR, 'lambda')
+DIST_DIR = os.path.join(ROOT_DIR, 'dist')
+
+# Handler modules deployed as Lambda entry points
+ENTRY_POINTS = [
+    os.path.join(LAMBDA_DIR, 'handler.py'),
+    os.path.join(LAMBDA_DIR, 'optimized_handler.py'),
+    os.path.join(BACKEND_DIR, 'websocket_handler.py'),
+]
+
+# Directories searched for local modules, in import order
+SOURCE_PATH = [LAMBDA_DIR, BACKEND_DIR]
+
+# Packages already present in the AWS Lambda Python runtime
+RUNTIME_PROVIDED = {'boto3', 'botocore', 's3transfer', 'jmespath', 'dateutil', 'urllib3', 'six'}
+
+# Heavy native packages shipped as a separate, optional layer
+LAYER_PACKAGES = {'PIL': 'Pillow', 'numpy': 'numpy'}
+
+# Matches the runtime in infrastructure/cdk-stack.ts
+DEFAULT_TARGET_PYTHON = '3.9'
+
+# Fixed timestamp so identical sources produce identical archives
+ZIP_DATE_TIME = (2020, 1, 1, 0, 0, 0)
+
+
+def is_stdlib(name: str) -> bool:
+    if name in sys.builtin_module_names:
+        return True
+    stdlib_names = getattr(sys, 'stdlib_module_names', None)
+    if stdlib_names is not None:
+        return name in stdlib_names
+
+    # Python < 3.10 has no list: a module is stdlib if it is found in the
+    # interpreter's standard library directories and not in site-packages
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return False
+    if spec is None:
+        return False
+    if spec.origin in ('built-in', 'frozen'):
+        return True
+    locations = [spec.origin] if spec.origin else list(spec.submodule_search_locations or [])
+    if not locations:
+        return False
+
+    paths = sysconfig.get_paths()
+    stdlib_dirs = {os.path.realpath(paths[key]) for key in ('stdlib', 'platstdlib')}
+    site_dirs = {os.path.realpath(paths[key]) for key in ('purelib', 'platlib')}
+
+    def under(path: str, directories: Set[str]) -> bool:
+        return any(path == directory or path.startswith(directory + os.sep) for directory in directories)
+
+    location = os.path.realpath(locations[0])
+    return (under(location, stdlib_dirs) and not under(location, site_dirs)
+            and 'site-packages' not in location.split(os.sep))
+
+
+def local_module_path(name: str) -> Optional[str]:
+    """Source file of a local backend module, if there is one"""
+    for directory in SOURCE_PATH:
+        path = os.path.join(directory, f"{name}.py")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def module_imports(path: str) -> Set[str]:
+    """Top-level names of all absolute imports in a file, including deferred ones"""
+    with open(path, 'r', encoding='utf-8') as source:
+        tree = ast.parse(source.read(), filename=path)
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split('.')[0])
+    return names
+
+
+def find_imports(entry_points: List[str]) -> Tuple[Dict[str, Set[str]], Dict[str, str]]:
+    """
+    Follow imports from the entry points, including imports deferred inside
+    functions, grouping them as local / runtime / layer / unresolved.
+
+    Also returns the source file of every local module.
+    """
+    groups: Dict[str, Set[str]] = {'local': set(), 'runtime': set(), 'layer': set(), 'unresolved': set()}
+    local_files = {os.path.splitext(os.path.basename(path))[0]: path for path in entry_points}
+    pending = list(local_files.values())
+
+    while pending:
+        for name in module_imports(pending.pop()):
+            path = local_module_path(name)
+            if path:
+                if name not in local_files:
+                    local_files[name] = path
+                    pending.append(path)
+            elif is_stdlib(name):
+                continue
+            elif name in RUNTIME_PROVIDED:
+                groups['runtime'].add(name)
+            elif name in LAYER_PACKAGES:
+                groups['layer'].add(name)
+            else:
+                groups['unresolved'].add(name)
+
+    groups['local'] = set(local_files)
+    return groups, local_files
+
+
+def target_python_matches(python: str, target: str) -> bool:
+    """Check whether the interpreter used for compiling is the target version"""
+    completed = subprocess.run(
+        [python, '-c', 'import sys; print("%d.%d" % sys.version_info[:2])'],
+        capture_output=True, text=True
+    )
+    return completed.returncode == 0 and completed.stdout.strip() == target
+
+
+def precompile(staging_dir: str, python: str) -> int:
+    """Compile staged sources to __pycache__ with unchecked-hash pycs"""
+    script = (
+        "import compileall, py_compile, sys; "
+        "ok = compileall.compile_dir(sys.argv[1], quiet=1, optimize=0, "
+        "invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH); "
+        "sys.exit(0 if ok else 1)"
+    )
+    subprocess.run([python, '-c', script, staging_dir], check=True)
+    return sum(
+        1 for _, _, files in os.walk(staging_dir) for name in files if name.endswith('.pyc')
+    )
+
+
+def write_zip(source_dir: str, zip_path: str) -> int:
+    """Write a deterministic zip of a directory and return its size in bytes"""
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as zip_file:
+        for directory, dirnames, filenames in os.walk(source_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(directory, filename)
+                info = zipfile.ZipInfo(os.path.relpath(path, source_dir), ZIP_DATE_TIME)
+                info.external_attr = 0o644 << 16
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(path, 'rb') as source:
+                    zip_file.writestr(info, source.read())
+    return os.path.getsize(zip_path)
+
+
+def measure_import_ms(staging_dir: str, module: str, python: str, repeats: int = 3) -> float:
+    """Median time to import a handler from the staged artifact in a fresh interpreter"""
+    snippet = (
+        "import sys, time; sys.dont_write_bytecode = True; start = time.perf_counter(); "
+        f"import {module}; print((time.perf_counter() - start) * 1000)"
+    )
+    timings = []
+    for _ in range(repeats):
+        completed = subprocess.run(
+            [python, '-c', snippet], cwd=staging_dir, capture_output=True, text=True,
+            env={**os.environ, 'PYTHONPATH': staging_dir}
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Importing {module} from artifact failed:\n{completed.stderr[-2000:]}")
+        timings.append(float(completed.stdout.strip().splitlines()[-1]))
+    return round(sorted(timings)[len(timings) // 2], 2)
+
+
+def build_layer(packages: Set[str], output_zip: str, target_python: str) -> int:
+    """Install layer packages for the Lambda platform and zip them under python/"""
+    with tempfile.TemporaryDirectory() as layer_dir:
+        subprocess.run([
+            sys.executable, '-m', 'pip', 'install', '--quiet',
+            '--target', os.path.join(layer_dir, 'python'),
+            '--platform', 'manylinux2014_x86_64', '--only-binary=:all:',
+            '--python-version', target_python,
+            *sorted(LAYER_PACKAGES[name] for name in packages)
+        ], check=True)
+        return write_zip(layer_dir, output_zip)
+
+
+def build_artifact(output_dir: str = DIST_DIR, target_python: str = DEFAULT_TARGET_PYTHON,
+                   python: str = sys.executable, with_layer: bool = False) -> Dict[str, object]:
+    """Assemble dist/lambda/ and dist/lambda.zip and return a build report"""
+    groups, local_files = find_imports(ENTRY_POINTS)
+    if groups['unresolved']:
+        raise RuntimeError(
+            f"Third-party imports not provided by the runtime or layer: {sorted(groups['unresolved'])}"
+        )
+
+    staging_dir = os.path.join(output_dir, 'lambda')
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    for name in sorted(groups['local']):
+        shutil.copy2(local_files[name], os.path.join(staging_dir, f"{name}.py"))
+
+    report: Dict[str, object] = {
+        'modules': sorted(groups['local']),
+        'excluded_runtime_packages': sorted(groups['runtime']),
+        'layer_packages': sorted(groups['layer']),
+    }
+
+    if target_python_matches(python, target_python):
+        report['precompiled_files'] = precompile(staging_dir, python)
+    else:
+        report['precompiled_files'] = 0
+        print(f"⚠️  {python} is not Python {target_python}; skipping .pyc precompilation "
+              f"(pass --python with a {target_python} interpreter)")
+
+    zip_path = os.path.join(output_dir, 'lambda.zip')
+    report['artifact'] = zip_path
+    report['artifact_bytes'] = write_zip(staging_dir, zip_path)
+    report['import_ms'] = {
+        os.path.splitext(os.path.basename(entry_point))[0]:
+            measure_import_ms(staging_dir, os.path.splitext(os.path.basename(entry_point))[0], python)
+        for entry_point in ENTRY_POINTS
+    }
+
+    if with_layer:
+        layer_zip = os.path.join(output_dir, 'lambda-layer.zip')
+        report['layer'] = layer_zip
+        report['layer_bytes'] = build_layer(set(LAYER_PACKAGES), layer_zip, target_python)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output-dir', default=DIST_DIR)
+    parser.add_argument('--target-python', default=DEFAULT_TARGET_PYTHON)
+    parser.add_argument('--python', default=sys.executable,
+                        help='Interpreter matching the target version, used to precompile')
+    parser.add_argument('--with-layer', action='store_true',
+                        help='Also build the optional Pillow/NumPy layer (needs pip and network)')
+    args = parser.parse_args()
+
+    report = build_artifact(args.output_dir, args.target_python, args.python, args.with_layer)
+    print(json.dumps(report, indent=2))
+    print(f"\n✅ Built {report['artifact']} ({report['artifact_bytes'] / 1024:.1f} KB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
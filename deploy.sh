@@ -49,6 +49,16 @@ print_status "Prerequisites check passed"
 # Set AWS environment
 export AWS_CA_BUNDLE=/etc/ssl/certs/ca-certificates.crt
 
+# Build the Lambda deployment artifact
+echo ""
+echo "📦 Building Lambda artifact..."
+if python3 build_lambda_artifact.py; then
+    print_status "Lambda artifact built"
+else
+    print_error "Lambda artifact build failed"
+    exit 1
+fi
+
 # Deploy backend infrastructure
 echo ""
 echo "📡 Deploying backend infrastructure..."
@@ -67,6 +67,11 @@ cd ..
 echo ""
 echo "📡 Deploying backend infrastructure..."
 
+if ! python3 build_lambda_artifact.py; then
+    log_error "Lambda artifact build failed"
+    exit 1
+fi
+
 if npx cdk deploy --require-approval never; then
     log_info "Backend infrastructure deployed"
 else
@@ -9,6 +9,7 @@ import base64
 import json
 import time
 import threading
+from collections import deque
 from datetime import datetime
 import logging
 import os
@@ -32,17 +33,137 @@ PROCESSING_INTERVAL = float(os.environ.get('PROCESSING_INTERVAL', '0.5'))
 MQTT_TOPIC = os.environ.get('MQTT_TOPIC', 'signtome/frames')
 AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
 DEVICE_ID = os.environ.get('DEVICE_ID', 'edge-device-001')
+# Frames each stage may queue for the next; when full the oldest is dropped
+RING_BUFFER_SIZE = int(os.environ.get('RING_BUFFER_SIZE', '2'))
+STATS_INTERVAL = float(os.environ.get('STATS_INTERVAL', '60'))
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class RingBuffer:
+    """
+    Small bounded buffer between two pipeline stages.
+    
+    put() never blocks: when the buffer is full the oldest item is dropped,
+    so a slow consumer only ever sees the latest frames and the producer
+    keeps its own timing.
+    """
+    
+    def __init__(self, name, capacity=RING_BUFFER_SIZE):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self._items = deque()
+        self._condition = threading.Condition()
+        self.closed = False
+        self.puts = 0
+        self.dropped = 0
+        self.max_depth = 0
+    
+    def put(self, item):
+        """Add an item; returns True if an older item was dropped to make room"""
+        with self._condition:
+            dropped = len(self._items) >= self.capacity
+            if dropped:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self.puts += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._condition.notify()
+            return dropped
+    
+    def get(self, timeout=None):
+        """Oldest queued item, or None once closed (or after timeout)"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._items or self.closed, timeout):
+                return None
+            return self._items.popleft() if self._items else None
+    
+    def close(self):
+        """Wake consumers; items still queued are discarded"""
+        with self._condition:
+            self.closed = True
+            self._items.clear()
+            self._condition.notify_all()
+    
+    def get_stats(self):
+        with self._condition:
+            return {
+                'depth': len(self._items),
+                'capacity': self.capacity,
+                'max_depth': self.max_depth,
+                'queued': self.puts,
+                'dropped': self.dropped
+            }
+
+
+class CaptureScheduler:
+    """
+    Fixed-rate deadlines on the monotonic clock.
+    
+    wait() sleeps until the next deadline instead of polling, so wall-clock
+    changes (NTP steps, timezone updates) cannot stretch or shrink the
+    interval and deadlines never drift. When a capture overruns, it runs
+    again at once only if it is within one interval of its deadline; whole
+    intervals that were missed are skipped rather than made up in a burst.
+    """
+    
+    def __init__(self, interval, stop_event=None, clock=time.monotonic, window=256):
+        self.interval = interval
+        self.stop_event = stop_event or threading.Event()
+        self.clock = clock
+        self.deadline = None
+        self.ticks = 0
+        self.skipped = 0
+        self.jitter = deque(maxlen=window)  # seconds each wake-up came after its deadline
+    
+    def wait(self):
+        """Sleep until the next deadline; returns False if stopped meanwhile"""
+        now = self.clock()
+        if self.deadline is None:
+            self.deadline = now
+        else:
+            self.deadline += self.interval
+            missed = int((now - self.deadline) // self.interval)
+            if missed > 0:
+                self.skipped += missed
+                self.deadline += missed * self.interval
+        
+        if self.stop_event.wait(max(0.0, self.deadline - now)):
+            return False
+        self.jitter.append(max(0.0, self.clock() - self.deadline))
+        self.ticks += 1
+        return True
+    
+    def get_stats(self):
+        samples = sorted(self.jitter)
+        return {
+            'interval_ms': round(self.interval * 1000, 1),
+            'ticks': self.ticks,
+            'skipped': self.skipped,
+            'jitter_ms_mean': round(sum(samples) / len(samples) * 1000, 2) if samples else 0.0,
+            'jitter_ms_p95': round(samples[int(len(samples) * 0.95)] * 1000, 2) if samples else 0.0,
+            'jitter_ms_max': round(samples[-1] * 1000, 2) if samples else 0.0
+        }
+
+
 class VideoProcessor:
     def __init__(self):
         self.camera = None
         self.mqtt_connection = None
         self.running = False
-        self.last_process_time = 0
+        self.stop_event = threading.Event()
+        self.scheduler = CaptureScheduler(PROCESSING_INTERVAL, self.stop_event)
+        self.threads = []
+        
+        # capture -> encode -> publish, each stage on its own thread
+        self.encode_queue = RingBuffer('encode')
+        self.publish_queue = RingBuffer('publish')
+        self.captured = 0
+        self.encoded = 0
+        self.published = 0
+        self.errors = {'capture': 0, 'encode': 0, 'publish': 0}
         
     def initialize_camera(self):
         """Initialize camera connection"""
@@ -111,12 +232,12 @@ class VideoProcessor:
             logger.error(f"Failed to encode frame: {e}")
             return None
     
-    def send_frame_to_cloud(self, frame_data):
-        """Send frame data to AWS IoT Core"""
+    def send_frame_to_cloud(self, frame_data, timestamp=None):
+        """Send frame data to AWS IoT Core; returns True once published"""
         try:
             message = {
                 'device_id': DEVICE_ID,
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': timestamp or datetime.now().isoformat(),
                 'frame_data': frame_data,
                 'metadata': {
                     'resolution': '640x480',
@@ -137,40 +258,64 @@ class VideoProcessor:
                 # Simulation mode - log message
                 logger.info(f"[SIMULATION] Would send frame to {MQTT_TOPIC}")
                 logger.info(f"[SIMULATION] Frame size: {len(frame_data)} bytes")
+            return True
                 
         except Exception as e:
             logger.error(f"Failed to send frame: {e}")
+            return False
     
     def process_video_stream(self):
-        """Main video processing loop"""
+        """Capture stage: grab a frame every PROCESSING_INTERVAL and hand it to the encoder"""
         logger.info("Starting video processing...")
         
-        while self.running:
+        # Encoding and publishing happen on their own threads, so only the
+        # capture itself can push a frame past its deadline
+        while self.running and self.scheduler.wait():
             try:
-                current_time = time.time()
-                
-                # Check if it's time to process a frame
-                if current_time - self.last_process_time >= PROCESSING_INTERVAL:
-                    # Capture frame
-                    frame = self.capture_frame()
-                    if frame is not None:
-                        # Encode frame
-                        frame_data = self.encode_frame(frame)
-                        if frame_data:
-                            # Send to cloud
-                            self.send_frame_to_cloud(frame_data)
-                    
-                    self.last_process_time = current_time
-                
-                # Small delay to prevent CPU overload
-                time.sleep(0.01)
-                
-            except KeyboardInterrupt:
-                logger.info("Received interrupt signal")
-                break
+                frame = self.capture_frame()
+                if frame is not None:
+                    self.captured += 1
+                    self.encode_queue.put((frame, datetime.now().isoformat()))
             except Exception as e:
-                logger.error(f"Error in processing loop: {e}")
-                time.sleep(1)  # Brief pause on error
+                self.errors['capture'] += 1
+                logger.error(f"Error capturing frame: {e}")
+    
+    def encode_stream(self):
+        """Encode stage: JPEG-encode the latest captured frames"""
+        while self.running:
+            item = self.encode_queue.get()
+            if item is None:
+                continue
+            frame, timestamp = item
+            frame_data = self.encode_frame(frame)
+            if frame_data is None:
+                self.errors['encode'] += 1
+                continue
+            self.encoded += 1
+            self.publish_queue.put((frame_data, timestamp))
+    
+    def publish_stream(self):
+        """Publish stage: send the latest encoded frames to the cloud"""
+        while self.running:
+            item = self.publish_queue.get()
+            if item is None:
+                continue
+            frame_data, timestamp = item
+            if self.send_frame_to_cloud(frame_data, timestamp):
+                self.published += 1
+            else:
+                self.errors['publish'] += 1
+    
+    def get_stats(self):
+        """Per-stage throughput, queue depth and drops, capture timing and process CPU time"""
+        return {
+            'capture': {'frames': self.captured, 'errors': self.errors['capture'],
+                        **self.scheduler.get_stats()},
+            'encode': {'frames': self.encoded, 'errors': self.errors['encode'], **self.encode_queue.get_stats()},
+            'publish': {'frames': self.published, 'errors': self.errors['publish'],
+                        **self.publish_queue.get_stats()},
+            'cpu_seconds': round(time.process_time(), 2)
+        }
     
     def start(self):
         """Start the video processor"""
@@ -183,17 +328,23 @@ class VideoProcessor:
         if not camera_ok and not mqtt_ok:
             logger.warning("Running in full simulation mode")
         
-        # Start processing in separate thread
-        processing_thread = threading.Thread(target=self.process_video_stream)
-        processing_thread.daemon = True
-        processing_thread.start()
+        # Capture, encode and publish run as separate stages
+        self.threads = [
+            threading.Thread(target=self.process_video_stream, name='capture', daemon=True),
+            threading.Thread(target=self.encode_stream, name='encode', daemon=True),
+            threading.Thread(target=self.publish_stream, name='publish', daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
         
         logger.info("Video processor started. Press Ctrl+C to stop.")
         
         try:
-            # Keep main thread alive
+            # Keep main thread alive, reporting pipeline stats periodically
             while self.running:
-                time.sleep(1)
+                if self.stop_event.wait(STATS_INTERVAL):
+                    break
+                logger.info(f"Pipeline stats: {json.dumps(self.get_stats())}")
         except KeyboardInterrupt:
             logger.info("Shutting down...")
             self.stop()
@@ -201,6 +352,12 @@ class VideoProcessor:
     def stop(self):
         """Stop the video processor"""
         self.running = False
+        self.stop_event.set()
+        self.encode_queue.close()
+        self.publish_queue.close()
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=5)
         
         if self.camera:
             self.camera.release()
@@ -13,6 +13,17 @@ interface PerformanceData {
   success: boolean
   timestamp: string
   cacheHit?: boolean
+  rateHint?: ServerRateHint // from the response's X-Rate-Hint header
+}
+
+// Capture settings recommended by the backend from its own load. Build one
+// with parseRateHint (X-Rate-Hint header) or parseRateControlMessage
+// (WebSocket rate_control message) from utils/api
+export interface ServerRateHint {
+  level: string
+  frameIntervalMs: number
+  jpegQuality: number
+  maxWidth: number
 }
 
 interface OptimizationSettings {
@@ -42,9 +53,44 @@ export const useRealtimeOptimization = (settings: Partial<OptimizationSettings>
   
   const performanceHistory = useRef<PerformanceData[]>([])
   const lastOptimizationTime = useRef<number>(Date.now())
+  const serverHint = useRef<ServerRateHint | null>(null)
+  
+  // Limits from the latest server hint, tighter than the local settings
+  const getLimits = useCallback(() => {
+    const hint = serverHint.current
+    return {
+      maxFrameRate: hint ? Math.min(config.maxFrameRate, 1000 / hint.frameIntervalMs) : config.maxFrameRate,
+      maxQuality: hint ? Math.min(0.9, hint.jpegQuality) : 0.9
+    }
+  }, [config.maxFrameRate])
+  
+  // Apply a backend hint: back off at once, and cap later increases at the hint
+  const applyServerHint = useCallback((hint: ServerRateHint) => {
+    if (!(hint.frameIntervalMs > 0)) return
+    serverHint.current = hint
+    const limits = getLimits()
+    
+    setMetrics(prev => {
+      const frameRate = Math.max(config.minFrameRate, Math.min(prev.frameRate, limits.maxFrameRate))
+      const qualityLevel = Math.min(prev.qualityLevel, limits.maxQuality)
+      if (frameRate === prev.frameRate && qualityLevel === prev.qualityLevel) {
+        return prev
+      }
+      return {
+        ...prev,
+        frameRate,
+        processingInterval: Math.round(1000 / frameRate),
+        qualityLevel,
+        lastOptimization: new Date().toISOString()
+      }
+    })
+  }, [config.minFrameRate, getLimits])
   
-  // Add performance data point
+  // Add performance data point; a response's rate hint is applied right away
   const addPerformanceData = useCallback((data: PerformanceData) => {
+    if (data.rateHint) {
+      applyServerHint(data.rateHint)
+    }
     performanceHistory.current.unshift(data)
     
     // Keep only last 20 data points
@@ -54,7 +100,7 @@ export const useRealtimeOptimization = (settings: Partial<OptimizationSettings>
     
     // Trigger optimization check after adding data
     optimizeSettings()
-  }, [])
+  }, [applyServerHint])
   
   // Calculate recent performance metrics
   const getRecentMetrics = useCallback(() => {
@@ -92,6 +138,7 @@ export const useRealtimeOptimization = (settings: Partial<OptimizationSettings>
     }
     
     const { avgLatency, successRate } = recentMetrics
+    const limits = getLimits()
     
     let newFrameRate = metrics.frameRate
     let newQualityLevel = metrics.qualityLevel
@@ -108,7 +155,7 @@ export const useRealtimeOptimization = (settings: Partial<OptimizationSettings>
     } else if (avgLatency < config.targetLatency * 0.7 && successRate > 0.9) {
       // Latency good and success rate high - can increase frame rate
       newFrameRate = Math.min(
-        config.maxFrameRate,
+        limits.maxFrameRate,
         metrics.frameRate * 1.2
       )
       optimizationMade = true
@@ -122,7 +169,7 @@ export const useRealtimeOptimization = (settings: Partial<OptimizationSettings>
         optimizationMade = true
       } else if (avgLatency < config.targetLatency * 0.5 && successRate > 0.95) {
         // Very good performance - can increase quality
-        newQualityLevel = Math.min(0.9, metrics.qualityLevel + 0.05)
+        newQualityLevel = Math.min(limits.maxQuality, metrics.qualityLevel + 0.05)
         optimizationMade = true
       }
     }
@@ -146,7 +193,7 @@ export const useRealtimeOptimization = (settings: Partial<OptimizationSettings>
         trigger: { avgLatency, successRate }
       })
     }
-  }, [metrics, config, getRecentMetrics])
+  }, [metrics, config, getRecentMetrics, getLimits])
   
   // Manual optimization trigger
   const forceOptimization = useCallback(() => {
@@ -166,6 +213,7 @@ export const useRealtimeOptimization = (settings: Partial<OptimizationSettings>
     
     performanceHistory.current = []
     lastOptimizationTime.current = Date.now()
+    serverHint.current = null
   }, [])
   
   // Get optimization recommendations
@@ -222,6 +270,7 @@ export const useRealtimeOptimization = (settings: Partial<OptimizationSettings>
   return {
     metrics,
     addPerformanceData,
+    applyServerHint,
     getRecentMetrics,
     forceOptimization,
     resetOptimization,
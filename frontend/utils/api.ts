@@ -1,3 +1,5 @@
+import type { ServerRateHint } from '../hooks/useRealtimeOptimization'
+
 const API_ENDPOINT = process.env.NEXT_PUBLIC_API_ENDPOINT || 'https://your-api-gateway-endpoint.amazonaws.com/prod/process'
 
 export interface TranslationRequest {
@@ -11,6 +13,16 @@ export interface TranslationResponse {
   confidence: number
   timestamp: string
   device_id: string
+  rate_hint?: ServerRateHint
+}
+
+// WebSocket rate_control message, as sent by the backend (snake_case)
+export interface RateControlMessage {
+  type: 'rate_control'
+  level: string
+  frame_interval_ms: number
+  jpeg_quality: number
+  max_width: number
 }
 
 export interface ApiError {
@@ -18,6 +30,39 @@ export interface ApiError {
   message?: string
 }
 
+// Parse "level=elevated, interval-ms=2000, quality=0.7, max-width=480"
+export const parseRateHint = (header: string | null): ServerRateHint | undefined => {
+  if (!header) return undefined
+  const fields: Record<string, string> = {}
+  header.split(',').forEach(part => {
+    const [name, value] = part.split('=').map(s => s.trim())
+    if (name && value) fields[name] = value
+  })
+  const frameIntervalMs = Number(fields['interval-ms'])
+  if (!frameIntervalMs) return undefined
+  return {
+    level: fields.level || 'normal',
+    frameIntervalMs,
+    jpegQuality: Number(fields.quality) || 0.8,
+    maxWidth: Number(fields['max-width']) || 640
+  }
+}
+
+// Convert a WebSocket rate_control message to the hint the optimization hook takes
+export const parseRateControlMessage = (message: unknown): ServerRateHint | undefined => {
+  if (!message || typeof message !== 'object') return undefined
+  const fields = message as Partial<RateControlMessage>
+  if (fields.type !== 'rate_control') return undefined
+  const frameIntervalMs = Number(fields.frame_interval_ms)
+  if (!frameIntervalMs || frameIntervalMs <= 0) return undefined
+  return {
+    level: fields.level || 'normal',
+    frameIntervalMs,
+    jpegQuality: Number(fields.jpeg_quality) || 0.8,
+    maxWidth: Number(fields.max_width) || 640
+  }
+}
+
 export class SignToMeAPI {
   private static instance: SignToMeAPI
   private requestCount = 0
@@ -56,6 +101,7 @@ export class SignToMeAPI {
         throw new Error('Invalid response format from API')
       }
 
+      result.rate_hint = parseRateHint(response.headers.get('X-Rate-Hint'))
       return result
     } catch (error) {
       if (error instanceof TypeError && error.message.includes('fetch')) {
@@ -56,7 +56,21 @@ export class SignToMeStack extends cdk.Stack {
     const signProcessorFunction = new lambda.Function(this, 'SignProcessorFunction', {
       runtime: lambda.Runtime.PYTHON_3_9,
       handler: 'handler.process_sign',
-      code: lambda.Code.fromAsset('./backend/lambda'),
+      // Built by build_lambda_artifact.py: handlers plus the shared backend modules
+      code: lambda.Code.fromAsset('./dist/lambda'),
+      role: lambdaRole,
+      timeout: cdk.Duration.seconds(30),
+      environment: {
+        BEDROCK_REGION: this.region,
+        DATA_BUCKET: dataBucket.bucketName
+      }
+    });
+
+    // Batch endpoint: many frames per request, misses sent to Bedrock concurrently
+    const batchProcessorFunction = new lambda.Function(this, 'BatchProcessorFunction', {
+      runtime: lambda.Runtime.PYTHON_3_9,
+      handler: 'optimized_handler.process_batch',
+      code: lambda.Code.fromAsset('./dist/lambda'),
       role: lambdaRole,
       timeout: cdk.Duration.seconds(30),
       environment: {
@@ -69,10 +83,12 @@ export class SignToMeStack extends cdk.Stack {
     const api = new apigateway.RestApi(this, 'SignToMeApi', {
       restApiName: 'SignToMe API',
       description: 'API for SignToMe sign language interpreter',
+      // Raw frame uploads reach the handler base64-encoded instead of as text
+      binaryMediaTypes: ['image/jpeg', 'image/png', 'multipart/form-data'],
       defaultCorsPreflightOptions: {
         allowOrigins: apigateway.Cors.ALL_ORIGINS,
         allowMethods: apigateway.Cors.ALL_METHODS,
-        allowHeaders: ['Content-Type', 'Authorization']
+        allowHeaders: ['Content-Type', 'Authorization', 'X-Device-Id', 'X-Timestamp', 'Idempotency-Key']
       }
     });
 
@@ -81,6 +97,7 @@ export class SignToMeStack extends cdk.Stack {
     
     const processResource = api.root.addResource('process');
     processResource.addMethod('POST', signProcessorIntegration);
+    processResource.addResource('batch').addMethod('POST', new apigateway.LambdaIntegration(batchProcessorFunction));
 
     // Note: WebSocket API will be added in Phase 5 for real-time communication
 